@@ -1,4 +1,5 @@
 import os
+import sys
 
 
 class Settings:
@@ -11,6 +12,39 @@ class Settings:
     PACS_URL_2 = "http://localhost:8052"
     PACS_AUTH_2 = ("orthanc", "orthanc")
 
+    # HTTP settings (one keep-alive session per PACS host)
+    HTTP_CONNECT_TIMEOUT = 5
+    HTTP_READ_TIMEOUT = 30
+    # Arhivele de studiu: Orthanc raspunde abia dupa ce a construit / a stocat intreaga arhiva
+    HTTP_ARCHIVE_READ_TIMEOUT = 3600
+    HTTP_POOL_SIZE = 16
+
+    # Cache in memorie pentru metadatele si lista de instante ale studiilor din PACS
+    PACS_CACHE_MAX_ENTRIES = 512
+    PACS_CACHE_TTL_SECONDS = 60
+
+    # Study transfer settings (parallel instance uploads per target PACS)
+    UPLOAD_MAX_WORKERS = 8
+    # Memorie maxima pentru instantele aflate in transfer; ce depaseste ajunge in fisiere temporare
+    TRANSFER_MEMORY_BUDGET = 256 * 1024 * 1024
+
+    # Studiile noi pentru PACS-ul tinta, cu cel putin atatea instante, se transfera ca o singura arhiva ZIP
+    ARCHIVE_TRANSFER_MIN_INSTANCES = 200
+    # Arhiva este tinuta in memorie pana la aceasta dimensiune, apoi intr-un fisier temporar
+    ARCHIVE_SPOOL_MAX_MEMORY = 64 * 1024 * 1024
+
+    # "client": instantele sunt transformate local; "server": PACS-ul sursa le modifica prin /modify
+    # si le trimite direct la TARGET_PEER_NAME (peer configurat in Orthanc-ul sursa)
+    TRANSFER_MODE = "client"
+    TARGET_PEER_NAME = ""
+    # Trebuie sa corespunda optiunii OverwriteInstances din Orthanc-ul tinta; fara ea, instantele modificate
+    # nu sunt inlocuite in modul "server"
+    TARGET_OVERWRITES_INSTANCES = False
+    # Joburile asincrone din Orthanc (/modify, /peers/.../store) sunt verificate la acest interval (s),
+    # iar dupa PACS_JOB_TIMEOUT (s) sunt anulate
+    PACS_JOB_POLL_INTERVAL = 1
+    PACS_JOB_TIMEOUT = 3600
+
     # File paths
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     STYLE_PATH = os.path.join(BASE_DIR, "app", "presentation", "styles", "style.qss")
@@ -21,9 +55,58 @@ class Settings:
     PDF_OUTPUT_DIR = "generated_pdfs"
     PDF_PREVIEW_DIR = "tmp_pdfs"
 
+    # User data (SQLite caches, indexes)
+    APP_DATA_DIR_NAME = "MedicalPacs"
+    STUDY_METADATA_DB = "study_metadata.sqlite3"
+    PACS_CHANGES_PAGE_SIZE = 1000
+    # Metadatele studiilor modificate sunt descarcate in paralel, cu cel mult atatea cereri simultane
+    PACS_METADATA_FETCH_WORKERS = 8
+    SEND_QUEUE_DB = "send_queue.sqlite3"
+    TRANSFER_JOURNAL_DB = "transfer_journal.sqlite3"
+    LOCAL_STUDY_INDEX_DB = "local_studies.sqlite3"
+
+    # Instantele descarcate din PACS raman pe disc pana la aceasta dimensiune totala; 0 dezactiveaza cache-ul
+    INSTANCE_CACHE_DIR = "instance_cache"
+    INSTANCE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+    # Send queue worker (seconds between checks when the queue is empty)
+    SEND_QUEUE_POLL_INTERVAL = 5
+    # La inchiderea aplicatiei workerul de trimitere este asteptat cel mult atatea secunde
+    TRANSFER_WORKER_STOP_TIMEOUT = 10
+
+    # Study list settings
+    STUDY_LIST_PAGE_SIZE = 200
+
     # Local DICOM file settings
+    # Folderul vechiului cache JSON; este citit doar pentru migrarea in LOCAL_STUDY_INDEX_DB
     LOCAL_STUDIES_CACHE_DIR = "local_studies_cache"
     SUPPORTED_DICOM_EXTENSIONS = ['.dcm', '.dicom', '.dic']
+    # Import de foldere: header-ele sunt citite in procese separate, iar indexul este salvat o data pe lot
+    INGEST_MAX_WORKERS = max(1, min(8, (os.cpu_count() or 2) - 1))
+    INGEST_BATCH_SIZE = 200
+    # Foldere urmarite: evenimentele sunt grupate (ms), un fisier este importat dupa ce nu se mai modifica (s),
+    # iar folderele sunt rescanate periodic si fara evenimente (share-uri de retea fara notificari)
+    WATCH_FOLDER_DEBOUNCE_MS = 2000
+    WATCH_FOLDER_STABLE_SECONDS = 5
+    WATCH_FOLDER_POLL_INTERVAL = 60
+
+    @classmethod
+    def get_transfer_spool_size(cls) -> int:
+        # Fiecare upload in paralel tine cel mult doua fisiere: instanta sursa si cea transformata
+        return max(cls.TRANSFER_MEMORY_BUDGET // (max(1, cls.UPLOAD_MAX_WORKERS) * 2), 1024 * 1024)
+
+    @classmethod
+    def get_user_data_dir(cls) -> str:
+        if sys.platform == "win32":
+            base_dir = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            base_dir = os.path.join(os.path.expanduser("~"), "Library", "Application Support")
+        else:
+            base_dir = os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share")
+
+        data_dir = os.path.join(base_dir, cls.APP_DATA_DIR_NAME)
+        os.makedirs(data_dir, exist_ok=True)
+        return data_dir
 
     @classmethod
     def get_source_pacs_config(cls):
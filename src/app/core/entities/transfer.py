@@ -0,0 +1,56 @@
+from dataclasses import dataclass, field
+from typing import List, Optional, NamedTuple
+
+
+class InstanceFingerprint(NamedTuple):
+    sop_instance_uid: str
+    content_hash: str
+
+
+@dataclass
+class InstanceTransferResult:
+    instance_id: str
+    success: bool
+    error: Optional[str] = None
+    skipped: bool = False
+
+
+@dataclass
+class StudyTransferResult:
+    study_id: str
+    instances: List[InstanceTransferResult] = field(default_factory=list)
+
+    @property
+    def sent_count(self) -> int:
+        return sum(1 for instance in self.instances if instance.success)
+
+    @property
+    def skipped_count(self) -> int:
+        return sum(1 for instance in self.instances if instance.skipped)
+
+    @property
+    def failed_instances(self) -> List[InstanceTransferResult]:
+        return [instance for instance in self.instances if not instance.success]
+
+    def is_complete(self) -> bool:
+        return bool(self.instances) and not self.failed_instances
+
+
+class QueueState:
+    STAGED = "staged"
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class QueuedStudy(NamedTuple):
+    study_id: str
+    display_text: str
+    examination_result: str
+    patient_name: str
+    study_date: str
+    description: str
+    queue_id: Optional[int] = None
+    state: str = QueueState.STAGED
+    error: Optional[str] = None
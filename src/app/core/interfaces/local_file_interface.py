@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional, Callable
 
 
 class ILocalFileService(ABC):
@@ -9,7 +9,20 @@ class ILocalFileService(ABC):
         pass
 
     @abstractmethod
-    def load_dicom_folder(self, folder_path: str) -> List[Dict[str, Any]]:
+    def load_dicom_folder(self, folder_path: str,
+                          progress_callback: Optional[Callable[[int, int], None]] = None,
+                          is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def load_dicom_files(self, file_paths: List[str],
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def load_dicom_archive(self, archive_path: str,
+                           is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
         pass
 
     @abstractmethod
@@ -7,6 +7,18 @@ class IPacsService(ABC):
     def get_all_studies(self) -> List[str]:
         pass
 
+    @abstractmethod
+    def get_all_studies_with_metadata(self) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def get_studies_page(self, since: Any, limit: int) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    def get_study_changes(self) -> Dict[str, Any]:
+        pass
+
     @abstractmethod
     def get_study_metadata(self, study_id: str) -> Dict[str, Any]:
         pass
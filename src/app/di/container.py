@@ -1,9 +1,16 @@
+import os
+
 from app.config.settings import Settings
 from app.config.database import DatabaseConfig
 
 # Infrastructure
 from app.infrastructure.http_client import HttpClient
 from app.infrastructure.pdf_generator import PdfGenerator
+from app.infrastructure.study_metadata_store import StudyMetadataStore
+from app.infrastructure.send_queue_store import SendQueueStore
+from app.infrastructure.transfer_journal_store import TransferJournalStore
+from app.infrastructure.local_study_store import LocalStudyStore
+from app.infrastructure.instance_file_cache import InstanceFileCache
 from app.repositories.report_title_repository import ReportTitleRepository
 from app.repositories.settings_repository import SettingsRepository
 
@@ -18,9 +25,12 @@ from app.services.pacs_url_service import PacsUrlService
 from app.services.report_title_service import ReportTitleService
 from app.services.session_service import SessionService
 from app.services.pacs_service import PacsService
+from app.services.caching_pacs_service import CachingPacsService
 from app.services.local_file_service import LocalFileService
 from app.services.hybrid_pacs_service import HybridPacsService
 from app.services.pdf_service import PdfService
+from app.services.study_transfer_service import StudyTransferService
+from app.services.send_queue_service import SendQueueService
 from app.services.settings_service import SettingsService
 
 # Controllers
@@ -45,13 +55,44 @@ class Container:
     # Infrastructure
     @classmethod
     def get_http_client(cls) -> HttpClient:
-        return cls._get_or_create('http_client', lambda: HttpClient(timeout=30))
+        return cls._get_or_create('http_client', lambda: HttpClient(
+            timeout=Settings.HTTP_READ_TIMEOUT,
+            connect_timeout=Settings.HTTP_CONNECT_TIMEOUT,
+            pool_size=Settings.HTTP_POOL_SIZE
+        ))
 
     @classmethod
     def get_pdf_generator(cls) -> PdfGenerator:
         settings = Settings()
         return cls._get_or_create('pdf_generator', lambda: PdfGenerator(settings.PDF_CSS_PATH))
 
+    @classmethod
+    def get_study_metadata_store(cls) -> StudyMetadataStore:
+        db_path = os.path.join(Settings.get_user_data_dir(), Settings.STUDY_METADATA_DB)
+        return cls._get_or_create('study_metadata_store', lambda: StudyMetadataStore(db_path))
+
+    @classmethod
+    def get_send_queue_store(cls) -> SendQueueStore:
+        db_path = os.path.join(Settings.get_user_data_dir(), Settings.SEND_QUEUE_DB)
+        return cls._get_or_create('send_queue_store', lambda: SendQueueStore(db_path))
+
+    @classmethod
+    def get_transfer_journal_store(cls) -> TransferJournalStore:
+        db_path = os.path.join(Settings.get_user_data_dir(), Settings.TRANSFER_JOURNAL_DB)
+        return cls._get_or_create('transfer_journal_store', lambda: TransferJournalStore(db_path))
+
+    @classmethod
+    def get_local_study_store(cls) -> LocalStudyStore:
+        db_path = os.path.join(Settings.get_user_data_dir(), Settings.LOCAL_STUDY_INDEX_DB)
+        return cls._get_or_create('local_study_store', lambda: LocalStudyStore(db_path))
+
+    @classmethod
+    def get_instance_file_cache(cls) -> InstanceFileCache:
+        cache_dir = os.path.join(Settings.get_user_data_dir(), Settings.INSTANCE_CACHE_DIR)
+        return cls._get_or_create('instance_file_cache', lambda: InstanceFileCache(
+            cache_dir, Settings.INSTANCE_CACHE_MAX_BYTES
+        ))
+
     # Repositories
     @classmethod
     def get_user_repository(cls) -> UserRepository:
@@ -84,16 +125,33 @@ class Container:
         return cls._get_or_create('session_service', SessionService)
 
     @classmethod
-    def get_pacs_service(cls) -> PacsService:
+    def get_pacs_service(cls) -> CachingPacsService:
         http_client = cls.get_http_client()
         settings = Settings()
 
         pacs_url, pacs_auth = settings.get_source_pacs_config()
 
-        return cls._get_or_create('pacs_service', lambda: PacsService(
-            http_client, pacs_url, pacs_auth
+        return cls._get_or_create('pacs_service', lambda: CachingPacsService(
+            PacsService(http_client, pacs_url, pacs_auth),
+            max_entries=Settings.PACS_CACHE_MAX_ENTRIES,
+            ttl_seconds=Settings.PACS_CACHE_TTL_SECONDS
         ))
 
+    @classmethod
+    def get_study_transfer_service(cls) -> StudyTransferService:
+        http_client = cls.get_http_client()
+        journal = cls.get_transfer_journal_store()
+        return cls._get_or_create('study_transfer_service', lambda: StudyTransferService(
+            http_client, journal, max_workers=Settings.UPLOAD_MAX_WORKERS,
+            job_poll_interval=Settings.PACS_JOB_POLL_INTERVAL, job_timeout=Settings.PACS_JOB_TIMEOUT,
+            archive_timeout=Settings.HTTP_ARCHIVE_READ_TIMEOUT
+        ))
+
+    @classmethod
+    def get_send_queue_service(cls) -> SendQueueService:
+        store = cls.get_send_queue_store()
+        return cls._get_or_create('send_queue_service', lambda: SendQueueService(store))
+
     @classmethod
     def get_local_file_service(cls) -> LocalFileService:
         settings = Settings()
@@ -143,6 +201,7 @@ class Container:
     def get_pacs_controller(cls) -> HybridPacsController:
         hybrid_pacs_service = cls.get_hybrid_pacs_service()
         pdf_service = cls.get_pdf_service()
+        send_queue_service = cls.get_send_queue_service()
         return cls._get_or_create('hybrid_pacs_controller', lambda: HybridPacsController(
-            hybrid_pacs_service, pdf_service
+            hybrid_pacs_service, pdf_service, send_queue_service
         ))
@@ -1,23 +1,93 @@
+import io
+import threading
 import requests
-from typing import Optional, Dict, Any
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from typing import Optional, Dict, Any, BinaryIO
 from app.core.exceptions.pacs_exceptions import PacsConnectionError
 
 
+class ResponseStream(io.RawIOBase):
+    # Corpul unui raspuns HTTP citit direct de pe socket, pe masura ce este consumat
+    def __init__(self, response: requests.Response):
+        super().__init__()
+        self._response = response
+        content_length = response.headers.get("Content-Length")
+        self.length = int(content_length) if content_length else None
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._response.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._response.close()
+        super().close()
+
+
 class HttpClient:
-    def __init__(self, timeout: int = 30):
+    def __init__(self, timeout: int = 30, connect_timeout: Optional[float] = None, pool_size: int = 10):
         self.timeout = timeout
+        self.connect_timeout = connect_timeout or timeout
+        self.pool_size = pool_size
+
+        # O sesiune keep-alive per host (scheme://host:port), refolosita de toate cererile catre acel PACS
+        self._sessions: Dict[str, requests.Session] = {}
+        self._sessions_lock = threading.Lock()
 
     def get(self, url: str, auth: Optional[tuple] = None, headers: Optional[Dict[str, str]] = None):
         try:
-            response = requests.get(url, auth=auth, headers=headers, timeout=self.timeout)
+            response = self._get_session(url).get(url, auth=auth, headers=headers, timeout=self._get_timeout())
             self._validate_response(response)
             return response
         except requests.exceptions.RequestException as e:
             raise PacsConnectionError(f"HTTP GET failed: {e}")
 
-    def post(self, url: str, data: Any = None, auth: Optional[tuple] = None, headers: Optional[Dict[str, str]] = None):
+    def open_stream(self, url: str, auth: Optional[tuple] = None,
+                    headers: Optional[Dict[str, str]] = None) -> ResponseStream:
+        # Fara compresie, ca Content-Length sa corespunda exact octetilor cititi
+        request_headers = {"Accept-Encoding": "identity", **(headers or {})}
+        try:
+            response = self._get_session(url).get(url, auth=auth, headers=request_headers,
+                                                  timeout=self._get_timeout(), stream=True)
+        except requests.exceptions.RequestException as e:
+            raise PacsConnectionError(f"HTTP GET failed: {e}")
+
         try:
-            response = requests.post(url, data=data, auth=auth, headers=headers, timeout=self.timeout)
+            self._validate_response(response)
+        except Exception:
+            response.close()
+            raise
+
+        return ResponseStream(response)
+
+    def download_to(self, url: str, destination: BinaryIO, auth: Optional[tuple] = None,
+                    headers: Optional[Dict[str, str]] = None, chunk_size: int = 1024 * 1024,
+                    read_timeout: Optional[float] = None) -> int:
+        # Raspunsul este scris pe bucati in destination, fara sa fie tinut integral in memorie
+        try:
+            size = 0
+            with self._get_session(url).get(url, auth=auth, headers=headers, timeout=self._get_timeout(read_timeout),
+                                            stream=True) as response:
+                self._validate_response(response)
+                for chunk in response.iter_content(chunk_size):
+                    destination.write(chunk)
+                    size += len(chunk)
+
+            destination.seek(0)
+            return size
+        except requests.exceptions.RequestException as e:
+            raise PacsConnectionError(f"HTTP GET failed: {e}")
+
+    def post(self, url: str, data: Any = None, auth: Optional[tuple] = None, headers: Optional[Dict[str, str]] = None,
+             read_timeout: Optional[float] = None):
+        try:
+            response = self._get_session(url).post(
+                url, data=data, auth=auth, headers=headers, timeout=self._get_timeout(read_timeout)
+            )
             self._validate_response(response)
             return response
         except requests.exceptions.RequestException as e:
@@ -25,12 +95,37 @@ class HttpClient:
 
     def delete(self, url: str, auth: Optional[tuple] = None, headers: Optional[Dict[str, str]] = None):
         try:
-            response = requests.delete(url, auth=auth, headers=headers, timeout=self.timeout)
+            response = self._get_session(url).delete(url, auth=auth, headers=headers, timeout=self._get_timeout())
             self._validate_response(response)
             return response
         except requests.exceptions.RequestException as e:
             raise PacsConnectionError(f"HTTP DELETE failed: {e}")
 
+    def close(self):
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _get_session(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        host_key = f"{parts.scheme}://{parts.netloc}"
+
+        with self._sessions_lock:
+            session = self._sessions.get(host_key)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({"Connection": "keep-alive"})
+                self._sessions[host_key] = session
+            return session
+
+    def _get_timeout(self, read_timeout: Optional[float] = None) -> tuple:
+        # read_timeout inlocuieste timeout-ul implicit pentru cererile la care PACS-ul raspunde abia dupa procesare
+        return self.connect_timeout, read_timeout or self.timeout
+
     def _validate_response(self, response):
         if response.status_code == 200:
             return
@@ -47,4 +142,4 @@ class HttpClient:
         elif response.status_code == 503:
             raise RuntimeError("Service Unavailable (503)")
         else:
-            raise RuntimeError(f"Unexpected error: {response.status_code}")
\ No newline at end of file
+            raise RuntimeError(f"Unexpected error: {response.status_code}")
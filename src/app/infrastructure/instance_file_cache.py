@@ -0,0 +1,266 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Callable, Any, BinaryIO
+
+from app.infrastructure.sqlite_store import SqliteStore
+
+
+class _HashingWriter:
+    def __init__(self, destination: BinaryIO):
+        self._destination = destination
+        self._md5 = hashlib.md5()
+        self.size = 0
+
+    def write(self, chunk: bytes) -> int:
+        self._md5.update(chunk)
+        self.size += len(chunk)
+        return self._destination.write(chunk)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._destination.seek(offset, whence)
+
+    def hexdigest(self) -> str:
+        return self._md5.hexdigest()
+
+
+class _CachingReader:
+    # Fluxul sursa este retransmis si copiat in acelasi timp in fisierul partial din cache;
+    # fisierul intra in cache doar daca fluxul a fost citit complet
+    def __init__(self, cache: "InstanceFileCache", pacs_url: str, instance_id: str, source: BinaryIO):
+        self._cache = cache
+        self._pacs_url = pacs_url
+        self._instance_id = instance_id
+        self._source = source
+        self.length = getattr(source, "length", None)
+
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        fd, self._partial_path = tempfile.mkstemp(dir=cache.cache_dir, suffix=cache._PARTIAL_SUFFIX)
+        self._partial_file = os.fdopen(fd, 'w+b')
+        self._writer = _HashingWriter(self._partial_file)
+        self._exhausted = False
+        self.closed = False
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._source.read(size)
+        if chunk:
+            self._writer.write(chunk)
+        elif size != 0:
+            self._exhausted = True
+        return chunk
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+
+        try:
+            self._source.close()
+            complete = self._exhausted and (self.length is None or self._writer.size == self.length)
+            if complete:
+                self._partial_file.flush()
+                os.fsync(self._partial_file.fileno())
+            self._partial_file.close()
+
+            if complete:
+                self._cache._commit(self._partial_path, self._writer, self._pacs_url, self._instance_id)
+                self._cache._evict(keep_md5=self._writer.hexdigest())
+        except Exception as e:
+            print(f"Warning: Could not cache instance {self._instance_id}: {e}")
+        finally:
+            if os.path.exists(self._partial_path):
+                os.remove(self._partial_path)
+
+
+class InstanceFileCache(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cached_files (
+            md5 TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            last_access REAL NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_cached_files_access ON cached_files (last_access);
+
+        CREATE TABLE IF NOT EXISTS cached_instances (
+            pacs_url TEXT NOT NULL,
+            instance_id TEXT NOT NULL,
+            md5 TEXT NOT NULL,
+            PRIMARY KEY (pacs_url, instance_id)
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_cached_instances_md5 ON cached_instances (md5);
+    """
+
+    _PARTIAL_SUFFIX = ".partial"
+    _FILE_SUFFIX = ".dcm"
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._evict_lock = threading.Lock()
+        super().__init__(os.path.join(cache_dir, "index.sqlite3"))
+        self._remove_orphan_files()
+
+    def is_enabled(self) -> bool:
+        return self._max_bytes > 0
+
+    def contains(self, pacs_url: str, instance_id: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM cached_instances WHERE pacs_url = ? AND instance_id = ?", (pacs_url, instance_id)
+        ).fetchone()
+        return row is not None
+
+    def open(self, pacs_url: str, instance_id: str, expected_md5: Optional[str] = None) -> Optional[BinaryIO]:
+        connection = self._connect()
+        row = connection.execute(
+            """SELECT f.md5, f.file_size FROM cached_instances i JOIN cached_files f ON f.md5 = i.md5
+               WHERE i.pacs_url = ? AND i.instance_id = ?""",
+            (pacs_url, instance_id)
+        ).fetchone()
+
+        if row is None and expected_md5:
+            # Acelasi continut poate fi deja in cache sub alt ID (alt PACS sau o copie a studiului)
+            row = connection.execute(
+                "SELECT md5, file_size FROM cached_files WHERE md5 = ?", (expected_md5,)
+            ).fetchone()
+            if row is not None:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO cached_instances (pacs_url, instance_id, md5) VALUES (?, ?, ?)",
+                        (pacs_url, instance_id, expected_md5)
+                    )
+        if row is None:
+            return None
+
+        # Instanta a fost inlocuita in PACS (stearsa si trimisa din nou cu alt continut)
+        if expected_md5 and expected_md5 != row["md5"]:
+            with connection:
+                connection.execute(
+                    "DELETE FROM cached_instances WHERE pacs_url = ? AND instance_id = ?", (pacs_url, instance_id)
+                )
+            return None
+
+        try:
+            cached_file = open(self._file_path(row["md5"]), 'rb')
+        except OSError:
+            self._forget_files(connection, [row["md5"]])
+            return None
+
+        if os.fstat(cached_file.fileno()).st_size != row["file_size"]:
+            cached_file.close()
+            self._forget_files(connection, [row["md5"]])
+            return None
+
+        with connection:
+            connection.execute("UPDATE cached_files SET last_access = ? WHERE md5 = ?", (time.time(), row["md5"]))
+        return cached_file
+
+    def store(self, pacs_url: str, instance_id: str, download: Callable[[BinaryIO], Any]) -> BinaryIO:
+        # Fisierul este descarcat sub un nume temporar si mutat atomic; un fisier partial nu ajunge in index
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, partial_path = tempfile.mkstemp(dir=self.cache_dir, suffix=self._PARTIAL_SUFFIX)
+        try:
+            with os.fdopen(fd, 'w+b') as partial_file:
+                writer = _HashingWriter(partial_file)
+                download(writer)
+                partial_file.flush()
+                os.fsync(partial_file.fileno())
+
+            file_path = self._commit(partial_path, writer, pacs_url, instance_id)
+        except BaseException:
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+
+        cached_file = open(file_path, 'rb')
+        self._evict(keep_md5=writer.hexdigest())
+        return cached_file
+
+    def open_relay(self, pacs_url: str, instance_id: str, source: BinaryIO) -> BinaryIO:
+        return _CachingReader(self, pacs_url, instance_id, source)
+
+    def _commit(self, partial_path: str, writer: _HashingWriter, pacs_url: str, instance_id: str) -> str:
+        md5 = writer.hexdigest()
+        file_path = self._file_path(md5)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+        # Continutul identic este deja in cache (alt PACS sau o descarcare paralela)
+        if os.path.exists(file_path) and os.path.getsize(file_path) == writer.size:
+            os.remove(partial_path)
+        else:
+            os.replace(partial_path, file_path)
+
+        with self._connect() as connection:
+            connection.execute(
+                """INSERT INTO cached_files (md5, file_size, last_access) VALUES (?, ?, ?)
+                   ON CONFLICT (md5) DO UPDATE SET last_access = excluded.last_access""",
+                (md5, writer.size, time.time())
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO cached_instances (pacs_url, instance_id, md5) VALUES (?, ?, ?)",
+                (pacs_url, instance_id, md5)
+            )
+        return file_path
+
+    def _evict(self, keep_md5: str):
+        # Cele mai vechi fisiere sunt sterse pana cand cache-ul incape din nou in buget
+        with self._evict_lock:
+            connection = self._connect()
+            total = connection.execute("SELECT COALESCE(SUM(file_size), 0) FROM cached_files").fetchone()[0]
+            if total <= self._max_bytes:
+                return
+
+            evicted = []
+            for row in connection.execute(
+                    "SELECT md5, file_size FROM cached_files WHERE md5 != ? ORDER BY last_access", (keep_md5,)
+            ).fetchall():
+                if total <= self._max_bytes:
+                    break
+                try:
+                    os.remove(self._file_path(row["md5"]))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # Pe Windows un fisier deschis pentru trimitere nu poate fi sters; ramane pentru data viitoare
+                    continue
+                evicted.append(row["md5"])
+                total -= row["file_size"]
+
+            self._forget_files(connection, evicted)
+
+    def _forget_files(self, connection, md5_values):
+        with connection:
+            connection.executemany("DELETE FROM cached_instances WHERE md5 = ?", [(md5,) for md5 in md5_values])
+            connection.executemany("DELETE FROM cached_files WHERE md5 = ?", [(md5,) for md5 in md5_values])
+
+    def _remove_orphan_files(self):
+        # Descarcarile intrerupte si fisierele mutate inainte ca indexul sa fie actualizat
+        indexed = {row["md5"] for row in self._connect().execute("SELECT md5 FROM cached_files").fetchall()}
+        for root, _, files in os.walk(self.cache_dir):
+            for file_name in files:
+                is_partial = file_name.endswith(self._PARTIAL_SUFFIX)
+                is_orphan = file_name.endswith(self._FILE_SUFFIX) and \
+                    file_name[:-len(self._FILE_SUFFIX)] not in indexed
+                if is_partial or is_orphan:
+                    try:
+                        os.remove(os.path.join(root, file_name))
+                    except OSError:
+                        pass
+
+    def _file_path(self, md5: str) -> str:
+        return os.path.join(self.cache_dir, md5[:2], md5 + self._FILE_SUFFIX)
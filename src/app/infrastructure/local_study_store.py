@@ -0,0 +1,376 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Set, Tuple
+
+import sqlite3
+
+from app.infrastructure.sqlite_store import SqliteStore
+
+
+class LocalStudyStore(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS local_studies (
+            study_id TEXT PRIMARY KEY,
+            metadata TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS local_instances (
+            instance_id TEXT PRIMARY KEY,
+            study_id TEXT NOT NULL REFERENCES local_studies (study_id) ON DELETE CASCADE,
+            file_path TEXT NOT NULL,
+            sop_instance_uid TEXT,
+            series_instance_uid TEXT,
+            instance_number,
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_local_instances_study ON local_instances (study_id);
+
+        CREATE INDEX IF NOT EXISTS idx_local_instances_file ON local_instances (file_path);
+
+        CREATE TABLE IF NOT EXISTS local_files (
+            file_path TEXT PRIMARY KEY,
+            file_size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            instance_id TEXT,
+            ignored INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS local_archive_members (
+            file_path TEXT PRIMARY KEY,
+            archive_path TEXT NOT NULL,
+            data_offset INTEGER,
+            data_size INTEGER
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_local_archive_members_archive ON local_archive_members (archive_path);
+
+        CREATE TABLE IF NOT EXISTS watch_folders (
+            folder_path TEXT PRIMARY KEY,
+            created_at TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS local_examination_results (
+            study_id TEXT PRIMARY KEY,
+            examination_result TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+    """
+
+    # SQLite limiteaza numarul de parametri dintr-un query
+    _BATCH_SIZE = 500
+
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+
+        # Indexurile create de versiunile anterioare nu au coloana ignored
+        with self._connect() as connection:
+            columns = {row["name"] for row in connection.execute("PRAGMA table_info(local_files)").fetchall()}
+            if "ignored" not in columns:
+                connection.execute("ALTER TABLE local_files ADD COLUMN ignored INTEGER NOT NULL DEFAULT 0")
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = super()._connect()
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def add_instances(self, studies: Dict[str, Dict[str, Any]], instances: Iterable[Dict[str, Any]],
+                      files: Iterable[Tuple[str, int, int, Optional[str]]] = (),
+                      archive_members: Iterable[Tuple[str, str, Optional[int], Optional[int]]] = ()):
+        # Un lot intreg intr-o singura tranzactie; studiile existente isi pastreaza ordinea (rowid)
+        now = datetime.now().isoformat()
+        instances = list(instances)
+        files = list(files)
+        archive_members = list(archive_members)
+        with self._connect() as connection:
+            # Studiile din care pot disparea instante: cele noi si cele ale instantelor / fisierelor rescrise
+            touched_study_ids = set(studies)
+            touched_study_ids |= self._get_study_ids(connection, "instance_id", [instance["ID"] for instance in instances])
+            touched_study_ids |= self._get_study_ids(
+                connection, "file_path", [file[0] for file in files] + [member[0] for member in archive_members]
+            )
+
+            connection.executemany(
+                """INSERT INTO local_studies (study_id, metadata, created_at, updated_at) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (study_id) DO UPDATE SET metadata = excluded.metadata, updated_at = excluded.updated_at""",
+                [(study_id, json.dumps(metadata, ensure_ascii=False), now, now)
+                 for study_id, metadata in studies.items()]
+            )
+            connection.executemany(
+                """INSERT INTO local_instances (instance_id, study_id, file_path, sop_instance_uid,
+                                                series_instance_uid, instance_number, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (instance_id) DO UPDATE SET
+                       study_id = excluded.study_id, file_path = excluded.file_path,
+                       sop_instance_uid = excluded.sop_instance_uid,
+                       series_instance_uid = excluded.series_instance_uid,
+                       instance_number = excluded.instance_number, updated_at = excluded.updated_at""",
+                [(instance["ID"], instance["StudyID"], instance["FilePath"], instance.get("SOPInstanceUID"),
+                  instance.get("SeriesInstanceUID"), instance.get("InstanceNumber"), now)
+                 for instance in instances]
+            )
+
+            # files: (file_path, file_size, mtime_ns, instance_id); instance_id este None pentru fisiere non-DICOM
+            connection.executemany(
+                "INSERT OR REPLACE INTO local_files (file_path, file_size, mtime_ns, instance_id, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(file_path, file_size, mtime_ns, instance_id, now)
+                 for file_path, file_size, mtime_ns, instance_id in files]
+            )
+
+            # archive_members: (cale membru, cale arhiva, offset, dimensiune); offset-ul este None pentru ZIP
+            connection.executemany(
+                "INSERT OR REPLACE INTO local_archive_members (file_path, archive_path, data_offset, data_size) "
+                "VALUES (?, ?, ?, ?)",
+                archive_members
+            )
+
+            # Un membru inlocuit intr-o arhiva modificata poate contine acum alta instanta
+            member_instance_ids = {instance["FilePath"]: instance["ID"] for instance in instances}
+            connection.executemany(
+                "DELETE FROM local_instances WHERE file_path = ? AND instance_id IS NOT ?",
+                [(file_path, member_instance_ids.get(file_path)) for file_path, _, _, _ in archive_members]
+            )
+
+            # Un fisier modificat poate contine acum alta instanta (sau niciuna)
+            connection.executemany(
+                "DELETE FROM local_instances WHERE file_path = ? AND instance_id IS NOT ?",
+                [(file_path, instance_id) for file_path, _, _, instance_id in files]
+            )
+            self._delete_empty_studies(connection, touched_study_ids)
+
+    def get_files(self, file_paths: List[str]) -> Dict[str, sqlite3.Row]:
+        connection = self._connect()
+        found = {}
+
+        for i in range(0, len(file_paths), self._BATCH_SIZE):
+            batch = file_paths[i:i + self._BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"""SELECT f.file_path, f.file_size, f.mtime_ns, f.instance_id, f.ignored, i.study_id
+                    FROM local_files f LEFT JOIN local_instances i
+                        ON i.instance_id = f.instance_id AND i.file_path = f.file_path
+                    WHERE f.file_path IN ({placeholders})""",
+                batch
+            ).fetchall()
+            for row in rows:
+                found[row["file_path"]] = row
+
+        return found
+
+    def remove_missing_files(self, folder_path: str, existing_paths: Set[str]) -> int:
+        prefix = folder_path.rstrip("/\\") + os.sep
+        connection = self._connect()
+        indexed_paths = [row["file_path"] for row in connection.execute(
+            "SELECT file_path FROM local_files WHERE substr(file_path, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()]
+        missing = [(file_path,) for file_path in indexed_paths if file_path not in existing_paths]
+        if not missing:
+            return 0
+
+        with connection:
+            touched_study_ids = self._get_study_ids(connection, "file_path", [file_path for (file_path,) in missing])
+            connection.executemany("DELETE FROM local_files WHERE file_path = ?", missing)
+            connection.executemany("DELETE FROM local_instances WHERE file_path = ?", missing)
+            for (file_path,) in missing:
+                touched_study_ids |= self._delete_archive_members(connection, file_path)
+            self._delete_empty_studies(connection, touched_study_ids)
+
+        return len(missing)
+
+    def get_archive_member(self, file_path: str) -> Optional[sqlite3.Row]:
+        return self._connect().execute(
+            "SELECT * FROM local_archive_members WHERE file_path = ?", (file_path,)
+        ).fetchone()
+
+    def get_archive_study_ids(self, archive_path: str) -> List[Optional[str]]:
+        # Un ID de studiu pentru fiecare membru din arhiva; None daca instanta a fost scoasa din index
+        rows = self._connect().execute(
+            """SELECT i.study_id FROM local_archive_members m LEFT JOIN local_instances i ON i.file_path = m.file_path
+               WHERE m.archive_path = ?""",
+            (archive_path,)
+        ).fetchall()
+        return [row["study_id"] for row in rows]
+
+    def remove_archive_members(self, archive_path: str, existing_paths: Set[str]) -> int:
+        connection = self._connect()
+        indexed_paths = [row["file_path"] for row in connection.execute(
+            "SELECT file_path FROM local_archive_members WHERE archive_path = ?", (archive_path,)
+        ).fetchall()]
+        missing = [(file_path,) for file_path in indexed_paths if file_path not in existing_paths]
+        if not missing:
+            return 0
+
+        with connection:
+            touched_study_ids = self._get_study_ids(connection, "file_path", [file_path for (file_path,) in missing])
+            connection.executemany("DELETE FROM local_archive_members WHERE file_path = ?", missing)
+            connection.executemany("DELETE FROM local_instances WHERE file_path = ?", missing)
+            self._delete_empty_studies(connection, touched_study_ids)
+
+        return len(missing)
+
+    def get_study_ids(self) -> List[str]:
+        rows = self._connect().execute("SELECT study_id FROM local_studies ORDER BY rowid").fetchall()
+        return [row["study_id"] for row in rows]
+
+    def get_studies_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT study_id, metadata FROM local_studies ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset)
+        ).fetchall()
+        return [{"study_id": row["study_id"], "metadata": json.loads(row["metadata"])} for row in rows]
+
+    def count_studies(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM local_studies").fetchone()[0]
+
+    def get_study_metadata(self, study_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT metadata FROM local_studies WHERE study_id = ?", (study_id,)
+        ).fetchone()
+        return json.loads(row["metadata"]) if row else None
+
+    def get_instances(self, study_id: str) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            "SELECT * FROM local_instances WHERE study_id = ? ORDER BY rowid", (study_id,)
+        ).fetchall()
+        return [{
+            "ID": row["instance_id"],
+            "StudyID": row["study_id"],
+            "FilePath": row["file_path"],
+            "SOPInstanceUID": row["sop_instance_uid"],
+            "SeriesInstanceUID": row["series_instance_uid"],
+            "InstanceNumber": row["instance_number"]
+        } for row in rows]
+
+    def get_instance_file(self, instance_id: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT file_path FROM local_instances WHERE instance_id = ?", (instance_id,)
+        ).fetchone()
+        return row["file_path"] if row else None
+
+    def get_study_id_for_instance(self, instance_id: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT study_id FROM local_instances WHERE instance_id = ?", (instance_id,)
+        ).fetchone()
+        return row["study_id"] if row else None
+
+    def get_examination_result(self, study_id: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT examination_result FROM local_examination_results WHERE study_id = ?", (study_id,)
+        ).fetchone()
+        return row["examination_result"] if row else None
+
+    def set_examination_result(self, study_id: str, examination_result: str):
+        with self._connect() as connection:
+            connection.execute(
+                """INSERT OR REPLACE INTO local_examination_results (study_id, examination_result, updated_at)
+                   VALUES (?, ?, ?)""",
+                (study_id, examination_result, datetime.now().isoformat())
+            )
+
+    def remove_study(self, study_id: str):
+        connection = self._connect()
+        # Fisierele studiului si arhiva care il continea trebuie citite din nou la urmatorul import
+        file_paths = [row["file_path"] for row in connection.execute(
+            """SELECT file_path FROM local_files
+               WHERE instance_id IN (SELECT instance_id FROM local_instances WHERE study_id = ?)
+               UNION
+               SELECT m.archive_path FROM local_archive_members m
+               JOIN local_instances i ON i.file_path = m.file_path WHERE i.study_id = ?""",
+            (study_id, study_id)
+        ).fetchall()]
+
+        # In folderele urmarite amprentele raman, marcate ca ignorate, altfel scanarea ar readuce studiul
+        watch_prefixes = tuple(folder_path.rstrip("/\\") + os.sep for folder_path in self.get_watch_folders())
+        ignored = [(file_path,) for file_path in file_paths if file_path.startswith(watch_prefixes)]
+        removed = [(file_path,) for file_path in file_paths if not file_path.startswith(watch_prefixes)]
+
+        with connection:
+            connection.executemany("UPDATE local_files SET ignored = 1 WHERE file_path = ?", ignored)
+            connection.executemany("DELETE FROM local_files WHERE file_path = ?", removed)
+            connection.execute("DELETE FROM local_studies WHERE study_id = ?", (study_id,))
+            connection.execute("DELETE FROM local_examination_results WHERE study_id = ?", (study_id,))
+
+    def rename_ids(self, study_ids: Dict[str, str], instance_ids: Dict[str, str]):
+        # Doua ID-uri vechi pot ajunge la acelasi ID nou (acelasi studiu incarcat de doua ori); se combina
+        with self._connect() as connection:
+            for old_id, new_id in study_ids.items():
+                if old_id == new_id:
+                    continue
+                connection.execute(
+                    """INSERT OR IGNORE INTO local_studies (study_id, metadata, created_at, updated_at)
+                       SELECT ?, metadata, created_at, updated_at FROM local_studies WHERE study_id = ?""",
+                    (new_id, old_id)
+                )
+                connection.execute("UPDATE local_instances SET study_id = ? WHERE study_id = ?", (new_id, old_id))
+                connection.execute(
+                    "UPDATE OR IGNORE local_examination_results SET study_id = ? WHERE study_id = ?", (new_id, old_id)
+                )
+                connection.execute("DELETE FROM local_examination_results WHERE study_id = ?", (old_id,))
+                connection.execute("DELETE FROM local_studies WHERE study_id = ?", (old_id,))
+
+            renamed_instances = [(new_id, old_id) for old_id, new_id in instance_ids.items() if old_id != new_id]
+            connection.executemany(
+                "UPDATE OR REPLACE local_instances SET instance_id = ? WHERE instance_id = ?", renamed_instances
+            )
+            connection.executemany("UPDATE local_files SET instance_id = ? WHERE instance_id = ?", renamed_instances)
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM local_files")
+            connection.execute("DELETE FROM local_archive_members")
+            connection.execute("DELETE FROM local_instances")
+            connection.execute("DELETE FROM local_studies")
+            connection.execute("DELETE FROM local_examination_results")
+
+    def get_watch_folders(self) -> List[str]:
+        rows = self._connect().execute("SELECT folder_path FROM watch_folders ORDER BY rowid").fetchall()
+        return [row["folder_path"] for row in rows]
+
+    def add_watch_folder(self, folder_path: str):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO watch_folders (folder_path, created_at) VALUES (?, ?)",
+                (folder_path, datetime.now().isoformat())
+            )
+
+    def remove_watch_folder(self, folder_path: str):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM watch_folders WHERE folder_path = ?", (folder_path,))
+
+    def _delete_archive_members(self, connection: sqlite3.Connection, archive_path: str) -> Set[str]:
+        study_ids = {row["study_id"] for row in connection.execute(
+            """SELECT DISTINCT i.study_id FROM local_archive_members m JOIN local_instances i ON i.file_path = m.file_path
+               WHERE m.archive_path = ?""",
+            (archive_path,)
+        ).fetchall()}
+        connection.execute(
+            "DELETE FROM local_instances WHERE file_path IN "
+            "(SELECT file_path FROM local_archive_members WHERE archive_path = ?)",
+            (archive_path,)
+        )
+        connection.execute("DELETE FROM local_archive_members WHERE archive_path = ?", (archive_path,))
+        return study_ids
+
+    def _get_study_ids(self, connection: sqlite3.Connection, column: str, values: List[str]) -> Set[str]:
+        # column este instance_id sau file_path, ambele indexate in local_instances
+        study_ids = set()
+        for i in range(0, len(values), self._BATCH_SIZE):
+            batch = values[i:i + self._BATCH_SIZE]
+            rows = connection.execute(
+                f"SELECT DISTINCT study_id FROM local_instances WHERE {column} IN ({','.join('?' * len(batch))})",
+                batch
+            ).fetchall()
+            study_ids.update(row["study_id"] for row in rows)
+        return study_ids
+
+    def _delete_empty_studies(self, connection: sqlite3.Connection, study_ids: Iterable[str]):
+        # Doar studiile atinse in tranzactia curenta; rezultatul explorarii dispare odata cu studiul
+        empty = [(study_id,) for study_id in study_ids if connection.execute(
+            "SELECT 1 FROM local_instances WHERE study_id = ? LIMIT 1", (study_id,)
+        ).fetchone() is None]
+        connection.executemany("DELETE FROM local_studies WHERE study_id = ?", empty)
+        connection.executemany("DELETE FROM local_examination_results WHERE study_id = ?", empty)
@@ -0,0 +1,146 @@
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Iterable
+
+import sqlite3
+
+from app.infrastructure.sqlite_store import SqliteStore
+
+
+class SendQueueStore(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS queued_studies (
+            queue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            study_id TEXT NOT NULL,
+            display_text TEXT NOT NULL,
+            examination_result TEXT NOT NULL DEFAULT '',
+            patient_name TEXT NOT NULL DEFAULT '',
+            study_date TEXT NOT NULL DEFAULT '',
+            description TEXT NOT NULL DEFAULT '',
+            state TEXT NOT NULL,
+            error TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+
+        CREATE INDEX IF NOT EXISTS idx_queued_studies_state ON queued_studies (state, queue_id);
+
+        CREATE TABLE IF NOT EXISTS queued_instances (
+            queue_id INTEGER NOT NULL REFERENCES queued_studies (queue_id) ON DELETE CASCADE,
+            instance_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (queue_id, instance_id)
+        );
+    """
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = super()._connect()
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def add_study(self, study_id: str, display_text: str, examination_result: str, patient_name: str,
+                  study_date: str, description: str, state: str) -> int:
+        now = datetime.now().isoformat()
+        with self._connect() as connection:
+            cursor = connection.execute(
+                """INSERT INTO queued_studies (study_id, display_text, examination_result, patient_name,
+                                               study_date, description, state, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (study_id, display_text, examination_result, patient_name, study_date, description, state, now, now)
+            )
+            return cursor.lastrowid
+
+    def get_studies(self, states: Optional[Iterable[str]] = None) -> List[sqlite3.Row]:
+        if states is None:
+            return self._connect().execute("SELECT * FROM queued_studies ORDER BY queue_id").fetchall()
+
+        states = list(states)
+        placeholders = ",".join("?" * len(states))
+        return self._connect().execute(
+            f"SELECT * FROM queued_studies WHERE state IN ({placeholders}) ORDER BY queue_id", states
+        ).fetchall()
+
+    def find_study(self, study_id: str, states: Iterable[str]) -> Optional[sqlite3.Row]:
+        states = list(states)
+        placeholders = ",".join("?" * len(states))
+        return self._connect().execute(
+            f"SELECT * FROM queued_studies WHERE study_id = ? AND state IN ({placeholders}) ORDER BY queue_id",
+            (study_id, *states)
+        ).fetchone()
+
+    def claim_next(self, from_state: str, to_state: str) -> Optional[sqlite3.Row]:
+        connection = self._connect()
+        with connection:
+            # BEGIN IMMEDIATE: un singur worker poate prelua un studiu
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT * FROM queued_studies WHERE state = ? ORDER BY queue_id LIMIT 1", (from_state,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            connection.execute(
+                "UPDATE queued_studies SET state = ?, error = NULL, updated_at = ? WHERE queue_id = ?",
+                (to_state, datetime.now().isoformat(), row["queue_id"])
+            )
+
+        return self._connect().execute(
+            "SELECT * FROM queued_studies WHERE queue_id = ?", (row["queue_id"],)
+        ).fetchone()
+
+    def set_state(self, queue_id: int, state: str, error: Optional[str] = None):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE queued_studies SET state = ?, error = ?, updated_at = ? WHERE queue_id = ?",
+                (state, error, datetime.now().isoformat(), queue_id)
+            )
+
+    def move_state(self, from_states: Iterable[str], to_state: str) -> int:
+        from_states = list(from_states)
+        placeholders = ",".join("?" * len(from_states))
+        with self._connect() as connection:
+            cursor = connection.execute(
+                f"UPDATE queued_studies SET state = ?, updated_at = ? WHERE state IN ({placeholders})",
+                (to_state, datetime.now().isoformat(), *from_states)
+            )
+            return cursor.rowcount
+
+    def remove_studies(self, study_id: Optional[str] = None, states: Optional[Iterable[str]] = None):
+        query = "DELETE FROM queued_studies WHERE 1 = 1"
+        params = []
+        if study_id is not None:
+            query += " AND study_id = ?"
+            params.append(study_id)
+        if states is not None:
+            states = list(states)
+            query += f" AND state IN ({','.join('?' * len(states))})"
+            params.extend(states)
+
+        with self._connect() as connection:
+            connection.execute(query, params)
+
+    def record_instance(self, queue_id: int, instance_id: str, state: str, error: Optional[str] = None):
+        with self._connect() as connection:
+            connection.execute(
+                """INSERT OR REPLACE INTO queued_instances (queue_id, instance_id, state, error, updated_at)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (queue_id, instance_id, state, error, datetime.now().isoformat())
+            )
+
+    def get_instance_ids(self, queue_id: int, state: str) -> Set[str]:
+        rows = self._connect().execute(
+            "SELECT instance_id FROM queued_instances WHERE queue_id = ? AND state = ?", (queue_id, state)
+        ).fetchall()
+        return {row["instance_id"] for row in rows}
+
+    def rename_ids(self, study_ids: Dict[str, str], instance_ids: Dict[str, str]):
+        with self._connect() as connection:
+            connection.executemany(
+                "UPDATE queued_studies SET study_id = ? WHERE study_id = ?",
+                [(new_id, old_id) for old_id, new_id in study_ids.items()]
+            )
+            connection.executemany(
+                "UPDATE OR REPLACE queued_instances SET instance_id = ? WHERE instance_id = ?",
+                [(new_id, old_id) for old_id, new_id in instance_ids.items()]
+            )
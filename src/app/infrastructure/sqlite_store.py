@@ -0,0 +1,29 @@
+import os
+import sqlite3
+import threading
+
+
+class SqliteStore:
+    SCHEMA = ""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Conexiunile sqlite3 nu pot fi partajate intre thread-uri (workerii Qt ruleaza in paralel)
+        self._local = threading.local()
+
+        with self._connect() as connection:
+            connection.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
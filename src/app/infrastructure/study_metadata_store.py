@@ -0,0 +1,81 @@
+import json
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+from app.infrastructure.sqlite_store import SqliteStore
+
+
+class StudyMetadataStore(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS study_metadata (
+            pacs_url TEXT NOT NULL,
+            study_id TEXT NOT NULL,
+            data TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (pacs_url, study_id)
+        );
+
+        CREATE TABLE IF NOT EXISTS change_cursor (
+            pacs_url TEXT PRIMARY KEY,
+            last_seq INTEGER NOT NULL
+        );
+    """
+
+    # SQLite limiteaza numarul de parametri dintr-un query
+    _BATCH_SIZE = 500
+
+    def get(self, pacs_url: str, study_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT data FROM study_metadata WHERE pacs_url = ? AND study_id = ?",
+            (pacs_url, study_id)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def get_many(self, pacs_url: str, study_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        connection = self._connect()
+        found = {}
+
+        for i in range(0, len(study_ids), self._BATCH_SIZE):
+            batch = study_ids[i:i + self._BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT study_id, data FROM study_metadata WHERE pacs_url = ? AND study_id IN ({placeholders})",
+                (pacs_url, *batch)
+            ).fetchall()
+            for row in rows:
+                found[row["study_id"]] = json.loads(row["data"])
+
+        return found
+
+    def put_many(self, pacs_url: str, studies: Iterable[Tuple[str, Dict[str, Any]]]):
+        updated_at = datetime.now().isoformat()
+        with self._connect() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO study_metadata (pacs_url, study_id, data, updated_at) VALUES (?, ?, ?, ?)",
+                [(pacs_url, study_id, json.dumps(data), updated_at) for study_id, data in studies]
+            )
+
+    def delete_many(self, pacs_url: str, study_ids: Iterable[str]):
+        with self._connect() as connection:
+            connection.executemany(
+                "DELETE FROM study_metadata WHERE pacs_url = ? AND study_id = ?",
+                [(pacs_url, study_id) for study_id in study_ids]
+            )
+
+    def clear(self, pacs_url: str):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM study_metadata WHERE pacs_url = ?", (pacs_url,))
+            connection.execute("DELETE FROM change_cursor WHERE pacs_url = ?", (pacs_url,))
+
+    def get_last_seq(self, pacs_url: str) -> Optional[int]:
+        row = self._connect().execute(
+            "SELECT last_seq FROM change_cursor WHERE pacs_url = ?", (pacs_url,)
+        ).fetchone()
+        return row["last_seq"] if row else None
+
+    def set_last_seq(self, pacs_url: str, last_seq: int):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO change_cursor (pacs_url, last_seq) VALUES (?, ?)",
+                (pacs_url, last_seq)
+            )
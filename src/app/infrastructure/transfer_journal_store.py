@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Optional
+
+import sqlite3
+
+from app.infrastructure.sqlite_store import SqliteStore
+
+
+class TransferJournalStore(SqliteStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS instance_transfers (
+            target_url TEXT NOT NULL,
+            sop_instance_uid TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            target_instance_id TEXT NOT NULL,
+            target_md5 TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (target_url, sop_instance_uid)
+        );
+    """
+
+    def get(self, target_url: str, sop_instance_uid: str) -> Optional[sqlite3.Row]:
+        return self._connect().execute(
+            "SELECT * FROM instance_transfers WHERE target_url = ? AND sop_instance_uid = ?",
+            (target_url, sop_instance_uid)
+        ).fetchone()
+
+    def record(self, target_url: str, sop_instance_uid: str, content_hash: str,
+               target_instance_id: str, target_md5: str):
+        with self._connect() as connection:
+            connection.execute(
+                """INSERT OR REPLACE INTO instance_transfers
+                   (target_url, sop_instance_uid, content_hash, target_instance_id, target_md5, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (target_url, sop_instance_uid, content_hash, target_instance_id, target_md5,
+                 datetime.now().isoformat())
+            )
+
+    def forget(self, target_url: str, sop_instance_uid: str):
+        with self._connect() as connection:
+            connection.execute(
+                "DELETE FROM instance_transfers WHERE target_url = ? AND sop_instance_uid = ?",
+                (target_url, sop_instance_uid)
+            )
@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 
 from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
@@ -65,4 +66,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Necesar pentru ProcessPoolExecutor in executabilele impachetate pe Windows
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
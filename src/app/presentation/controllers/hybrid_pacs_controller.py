@@ -1,31 +1,81 @@
 import re
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
-from PyQt6.QtCore import pyqtSignal, QObject
+from PyQt6.QtCore import pyqtSignal, QObject, QThread, QTimer, QFileSystemWatcher
+from PyQt6.QtWidgets import QApplication
 
 from app.core.interfaces.pacs_interface import IPacsService
 from app.core.interfaces.pdf_interface import IPdfService
 from app.services.notification_service import NotificationService
+from app.services.send_queue_service import SendQueueService
+from app.core.entities.transfer import QueuedStudy
 from app.core.exceptions.pacs_exceptions import PacsConnectionError, PacsDataError
 from app.core.exceptions.pdf_exceptions import PdfGenerationError
 from app.config.settings import Settings
+from app.utils.formatters import Formatters
 
 
 class HybridPacsController:
-    def __init__(self, hybrid_pacs_service: IPacsService, pdf_service: IPdfService):
+    def __init__(self, hybrid_pacs_service: IPacsService, pdf_service: IPdfService,
+                 send_queue_service: SendQueueService):
         self._pacs_service = hybrid_pacs_service
         self._pdf_service = pdf_service
+        self._send_queue_service = send_queue_service
+        self._transfer_thread: Optional[QThread] = None
+        self._transfer_worker: Optional["TransferQueueWorker"] = None
+        self._watch_thread: Optional[QThread] = None
+        self._watch_worker: Optional["WatchFolderWorker"] = None
+        self._folder_watcher: Optional[QFileSystemWatcher] = None
+        self._watch_debounce: Optional[QTimer] = None
         self._notification_service = NotificationService()
         self._settings = Settings()
         self._last_generated_pdf_path: Optional[str] = None
 
-    def load_studies(self) -> List[str]:
+    def load_studies(self) -> List[Dict[str, Any]]:
         try:
-            return self._pacs_service.get_all_studies()
+            return self._pacs_service.get_all_studies_with_metadata()
         except PacsConnectionError as e:
             raise e
 
+    def load_studies_page(self, since: Any, limit: int) -> Dict[str, Any]:
+        try:
+            return self._pacs_service.get_studies_page(since, limit)
+        except PacsConnectionError as e:
+            raise e
+
+    def load_study_changes(self) -> Dict[str, Any]:
+        try:
+            changes = self._pacs_service.get_study_changes()
+        except PacsConnectionError as e:
+            raise e
+
+        return {
+            "new": self.build_study_list(changes.get("new", [])),
+            "updated": self.build_study_list(changes.get("updated", [])),
+            "deleted": changes.get("deleted", [])
+        }
+
+    def build_study_list(self, studies: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        study_list = []
+
+        for study in studies:
+            study_id = study["study_id"]
+            metadata = study["metadata"]
+            display_text = Formatters.format_study_display_text(
+                metadata.get('Patient Name', 'N/A'),
+                metadata.get('Study Date', 'N/A'),
+                metadata.get('Description', 'N/A')
+            )
+
+            if self._is_local_study(study_id):
+                display_text = f"[LOCAL]{display_text}"
+
+            study_list.append((study_id, display_text))
+
+        return study_list
+
     def get_study_metadata(self, study_id: str) -> Dict[str, Any]:
         try:
             return self._pacs_service.get_study_metadata(study_id)
@@ -132,109 +182,133 @@ class HybridPacsController:
             self._notification_service.show_error(parent_widget, "Eroare", f"Eroare la adăugarea în queue: {e}")
             return False, None
 
-    def send_queued_studies_to_pacs(self, queued_studies: List, target_url: str, parent_widget) -> bool:
-        try:
-            if not queued_studies:
-                self._notification_service.show_warning(parent_widget, "Atenție", "Nu sunt studii în queue.")
-                return False
-
-            settings = Settings()
-            target_url, target_auth = settings.get_target_pacs_config()
-
-            study_count = len(queued_studies)
-            studies_with_results = sum(1 for qs in queued_studies if qs.examination_result.strip())
-            local_studies_count = sum(1 for qs in queued_studies if self._is_local_study(qs.study_id))
-            pacs_studies_count = study_count - local_studies_count
-
-            confirm_message = f"Trimiți {study_count} studii la PACS?\n\n"
-            confirm_message += f"• {studies_with_results} studii cu rezultate explorări\n"
-            confirm_message += f"• {study_count - studies_with_results} studii fără rezultate\n"
-            if local_studies_count > 0:
-                confirm_message += f"• {local_studies_count} studii locale (din computer)\n"
-            if pacs_studies_count > 0:
-                confirm_message += f"• {pacs_studies_count} studii PACS (remote)\n"
-            confirm_message += f"\nTarget PACS: {target_url}\n"
-            confirm_message += "Toate rezultatele vor fi incluse în metadata DICOM."
-
-            if not self._notification_service.ask_confirmation(parent_widget, "Confirmare trimitere", confirm_message):
-                return False
-
-            # Send studies
-            success_count = 0
-            failed_studies = []
-
-            for i, queued_study in enumerate(queued_studies):
-                try:
-                    # Update progress
-                    study_type = "LOCAL" if self._is_local_study(queued_study.study_id) else "PACS"
-
-                    success = self._send_study_to_target_pacs(
-                        queued_study.study_id,
-                        target_url,
-                        target_auth,
-                        queued_study.examination_result if queued_study.examination_result.strip() else None
-                    )
-
-                    if success:
-                        success_count += 1
-                    else:
-                        failed_studies.append(f"{queued_study.patient_name} ({queued_study.study_date}) [{study_type}]")
-
-                except Exception as e:
-                    study_type = "LOCAL" if self._is_local_study(queued_study.study_id) else "PACS"
-                    failed_studies.append(
-                        f"{queued_study.patient_name} ({queued_study.study_date}) [{study_type}] - {str(e)}")
-            if success_count == study_count:
-                message = f"Toate {study_count} studiile au fost trimise cu succes la PACS.\n"
-                message += f"Rezultatele explorărilor au fost incluse în metadata DICOM."
-                if local_studies_count > 0:
-                    message += f"\n\n✨ {local_studies_count} studii locale au fost încărcate cu succes în PACS!"
-
-                self._notification_service.show_info(parent_widget, "Succes complet", message)
-                return True
-            elif success_count > 0:
-                message = f"Trimise cu succes: {success_count}/{study_count} studii.\n\n"
-                if failed_studies:
-                    message += "Studii cu erori:\n" + "\n".join(failed_studies[:5])
-                    if len(failed_studies) > 5:
-                        message += f"\n... și încă {len(failed_studies) - 5} studii"
-
-                self._notification_service.show_warning(parent_widget, "Succes parțial", message)
-                return True
-            else:
-                message = "Niciun studiu nu a putut fi trimis la PACS.\n\n"
-                if failed_studies:
-                    message += "Erori:\n" + "\n".join(failed_studies[:3])
-
-                self._notification_service.show_error(parent_widget, "Eșec complet", message)
-                return False
-
-        except Exception as e:
-            self._notification_service.show_error(parent_widget, "Eroare", f"Eroare la trimiterea studiilor: {e}")
-            return False
-
-    def _send_study_to_target_pacs(self, study_id: str, target_url: str, target_auth: tuple,
-                                   examination_result: str = None) -> bool:
-        try:
-            study_type = "LOCAL" if self._is_local_study(study_id) else "PACS"
-
-            success = self._pacs_service.send_study_to_pacs(
-                study_id,
-                target_url,
-                target_auth,
-                examination_result
-            )
-
-            if success:
-                print(f"{study_type} study {study_id} sent successfully")
-            else:
-                print(f"Failed to send {study_type} study {study_id}")
-
-            return success
-
-        except Exception as e:
-            print(f"Error sending study {study_id}: {e}")
-            return False
+    def get_send_queue_service(self) -> SendQueueService:
+        return self._send_queue_service
+
+    def start_transfer_worker(self) -> "TransferQueueWorker":
+        # Un singur worker per aplicatie; view-urile doar se conecteaza la semnalele lui
+        if self._transfer_worker is not None:
+            return self._transfer_worker
+
+        self._transfer_thread = QThread()
+        self._transfer_worker = TransferQueueWorker(self, self._send_queue_service)
+        self._transfer_worker.moveToThread(self._transfer_thread)
+        self._transfer_thread.started.connect(self._transfer_worker.run)
+
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop_transfer_worker)
+
+        self._transfer_thread.start()
+        return self._transfer_worker
+
+    def stop_transfer_worker(self):
+        if self._transfer_worker is None:
+            return
+
+        # Instantele aflate deja in upload se termina; studiul ramane in queue si este reluat la urmatoarea pornire
+        self._transfer_worker.stop()
+        self._transfer_thread.quit()
+        if not self._transfer_thread.wait(Settings.TRANSFER_WORKER_STOP_TIMEOUT * 1000):
+            # O cerere HTTP blocata (ex. arhiva ZIP) nu poate fi intrerupta; inchiderea nu o mai asteapta
+            print("Warning: Transfer worker did not stop in time; the study is resumed at the next start")
+            return
+        self._transfer_worker = None
+        self._transfer_thread = None
+
+    def wake_transfer_worker(self):
+        if self._transfer_worker is not None:
+            self._transfer_worker.wake()
+
+    def start_watch_folder_worker(self) -> "WatchFolderWorker":
+        if self._watch_worker is not None:
+            return self._watch_worker
+
+        self._watch_thread = QThread()
+        self._watch_worker = WatchFolderWorker(self)
+        self._watch_worker.moveToThread(self._watch_thread)
+        self._watch_thread.started.connect(self._watch_worker.run)
+
+        # QFileSystemWatcher (inotify / ReadDirectoryChangesW) doar trezeste worker-ul; rafalele de evenimente
+        # de la un export sunt grupate, iar rescanarea periodica acopera share-urile fara notificari
+        self._folder_watcher = QFileSystemWatcher()
+        self._watch_debounce = QTimer()
+        self._watch_debounce.setSingleShot(True)
+        self._watch_debounce.setInterval(Settings.WATCH_FOLDER_DEBOUNCE_MS)
+        self._watch_debounce.timeout.connect(self.wake_watch_folder_worker)
+        self._folder_watcher.directoryChanged.connect(lambda _: self._watch_debounce.start())
+        self._watch_worker.directories_scanned.connect(self._update_watched_directories)
+
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.stop_watch_folder_worker)
+
+        self._watch_thread.start()
+        return self._watch_worker
+
+    def stop_watch_folder_worker(self):
+        if self._watch_worker is None:
+            return
+
+        self._watch_debounce.stop()
+        self._watch_worker.stop()
+        self._watch_thread.quit()
+        self._watch_thread.wait()
+        self._watch_worker = None
+        self._watch_thread = None
+
+    def wake_watch_folder_worker(self):
+        if self._watch_worker is not None:
+            self._watch_worker.wake()
+
+    def get_watch_folders(self) -> List[str]:
+        return self._pacs_service.get_watch_folders()
+
+    def scan_watch_folders(self, is_cancelled=None) -> Dict[str, Any]:
+        changes = self._pacs_service.scan_watch_folders(is_cancelled)
+        return {
+            "new": self.build_study_list(changes["new"]),
+            "updated": self.build_study_list(changes["updated"]),
+            "deleted": changes["deleted"],
+            "directories": changes["directories"],
+            "pending": changes["pending"]
+        }
+
+    def _update_watched_directories(self, directories: List[str]):
+        watched = set(self._folder_watcher.directories())
+        directories = set(directories)
+
+        if watched - directories:
+            self._folder_watcher.removePaths(list(watched - directories))
+        if directories - watched:
+            self._folder_watcher.addPaths(list(directories - watched))
+
+    def send_queued_study(self, queued_study: QueuedStudy, target_url: str, target_auth: tuple,
+                          is_cancelled=None) -> bool:
+        queue_id = queued_study.queue_id
+        sent_instance_ids = self._send_queue_service.get_sent_instance_ids(queue_id)
+
+        def on_instance_done(result):
+            self._send_queue_service.record_instance(queue_id, result)
+            if is_cancelled and is_cancelled():
+                raise InterruptedError("Trimiterea a fost oprita")
+
+        if sent_instance_ids:
+            print(f"Resuming study {queued_study.study_id}: {len(sent_instance_ids)} instances already sent")
+
+        return self._pacs_service.send_study_to_pacs(
+            queued_study.study_id,
+            target_url,
+            target_auth,
+            queued_study.examination_result if queued_study.examination_result.strip() else None,
+            skip_instance_ids=sent_instance_ids,
+            on_instance_done=on_instance_done,
+            is_cancelled=is_cancelled
+        )
+
+    def begin_transfer_session(self):
+        if hasattr(self._pacs_service, 'begin_transfer_session'):
+            self._pacs_service.begin_transfer_session()
 
     def get_examination_result_from_study(self, study_id: str) -> str:
         try:
@@ -328,90 +402,189 @@ class HybridPacsController:
 
 
 class StudiesWorker(QObject):
-    studies_loaded = pyqtSignal(list)
+    # (since, studii, since pentru pagina urmatoare, mai sunt pagini)
+    studies_loaded = pyqtSignal(object, list, object, bool)
+    changes_loaded = pyqtSignal(dict)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, pacs_controller):
+    def __init__(self, pacs_controller, since: Any = 0, limit: Optional[int] = None, incremental: bool = False):
         super().__init__()
         self._pacs_controller = pacs_controller
+        self._since = since
+        self._limit = limit
+        self._incremental = incremental
 
     def run(self):
         try:
-            studies = self._pacs_controller.load_studies()
-            self.studies_loaded.emit(studies)
+            if self._incremental:
+                self.changes_loaded.emit(self._pacs_controller.load_study_changes())
+            else:
+                if self._limit:
+                    page = self._pacs_controller.load_studies_page(self._since, self._limit)
+                    self.studies_loaded.emit(self._since, self._pacs_controller.build_study_list(page["studies"]),
+                                             page["next_since"], page["has_more"])
+                else:
+                    studies = self._pacs_controller.load_studies()
+                    self.studies_loaded.emit(self._since, self._pacs_controller.build_study_list(studies), None, False)
         except Exception as e:
             self.error_occurred.emit(str(e))
 
 
-class QueueSenderWorker(QObject):
+class WatchFolderWorker(QObject):
+    studies_changed = pyqtSignal(dict)
+    directories_scanned = pyqtSignal(list)
+
+    def __init__(self, pacs_controller):
+        super().__init__()
+        self._pacs_controller = pacs_controller
+        self._stop_requested = False
+        self._wake_event = threading.Event()
+
+    def stop(self):
+        self._stop_requested = True
+        self._wake_event.set()
+
+    def wake(self):
+        self._wake_event.set()
+
+    def is_stop_requested(self) -> bool:
+        return self._stop_requested
+
+    def run(self):
+        while not self._stop_requested:
+            pending = 0
+
+            try:
+                if self._pacs_controller.get_watch_folders():
+                    changes = self._pacs_controller.scan_watch_folders(self.is_stop_requested)
+                    pending = changes["pending"]
+
+                    self.directories_scanned.emit(changes["directories"])
+                    if changes["new"] or changes["updated"] or changes["deleted"]:
+                        self.studies_changed.emit(changes)
+                else:
+                    self.directories_scanned.emit([])
+            except Exception as e:
+                print(f"Watch folder error: {e}")
+
+            # Fisierele care inca se scriu sunt verificate din nou dupa intervalul de stabilitate
+            self._wake_event.wait(
+                Settings.WATCH_FOLDER_STABLE_SECONDS if pending else Settings.WATCH_FOLDER_POLL_INTERVAL
+            )
+            self._wake_event.clear()
+
+
+class TransferQueueWorker(QObject):
     progress_updated = pyqtSignal(int, str)
+    queue_changed = pyqtSignal()
     sending_completed = pyqtSignal(bool, str)
 
-    def __init__(self, pacs_controller, queued_studies: List):
+    def __init__(self, pacs_controller, send_queue_service: SendQueueService):
         super().__init__()
         self._pacs_controller = pacs_controller
-        self._queued_studies = queued_studies
+        self._send_queue_service = send_queue_service
+        self._stop_requested = False
+        self._wake_event = threading.Event()
 
-    def run(self):
-        try:
-            settings = Settings()
-            target_url, target_auth = settings.get_target_pacs_config()
-
-            if not target_url or not target_auth:
-                self.sending_completed.emit(False, "Target PACS is not correctly configured by the Admin.")
-
-            success_count = 0
-            failed_studies = []
-            total_studies = len(self._queued_studies)
-            local_studies_sent = 0
-            pacs_studies_sent = 0
-
-            for i, queued_study in enumerate(self._queued_studies):
-                # Emit progress
-                progress = int((i / total_studies) * 100)
-                study_type = "LOCAL" if self._pacs_controller._is_local_study(queued_study.study_id) else "PACS"
-                self.progress_updated.emit(progress, f"[{study_type}] {queued_study.patient_name}")
-
-                try:
-                    success = self._pacs_controller._send_study_to_target_pacs(
-                        queued_study.study_id,
-                        target_url,
-                        target_auth,
-                        queued_study.examination_result if queued_study.examination_result.strip() else None
-                    )
+    def stop(self):
+        self._stop_requested = True
+        self._wake_event.set()
 
-                    if success:
-                        success_count += 1
-                        if self._pacs_controller._is_local_study(queued_study.study_id):
-                            local_studies_sent += 1
-                        else:
-                            pacs_studies_sent += 1
-                    else:
-                        failed_studies.append(f"{queued_study.patient_name} [{study_type}]")
-
-                except Exception as e:
-                    failed_studies.append(f"{queued_study.patient_name} [{study_type}] - {str(e)}")
-
-            self.progress_updated.emit(100, "Finalizat")
-
-            if success_count == total_studies:
-                message = f"Toate {total_studies} studiile au fost trimise cu succes!"
-                if local_studies_sent > 0:
-                    message += f"\n✨ {local_studies_sent} studii locale încărcate în PACS"
-                if pacs_studies_sent > 0:
-                    message += f"\n📡 {pacs_studies_sent} studii PACS transferate"
-                self.sending_completed.emit(True, message)
-            elif success_count > 0:
-                message = f"Trimise: {success_count}/{total_studies} studii."
-                if local_studies_sent > 0:
-                    message += f"\n✨ {local_studies_sent} studii locale încărcate"
-                if pacs_studies_sent > 0:
-                    message += f"\n📡 {pacs_studies_sent} studii PACS transferate"
-                message += f"\nEșecuri: {', '.join(failed_studies[:3])}"
-                self.sending_completed.emit(True, message)
-            else:
-                message = f"Niciun studiu nu a putut fi trimis.\nErori: {', '.join(failed_studies[:3])}"
-                self.sending_completed.emit(False, message)
+    def wake(self):
+        self._wake_event.set()
+
+    def is_stop_requested(self) -> bool:
+        return self._stop_requested
+
+    def run(self):
+        if self._send_queue_service.recover_interrupted():
+            self.queue_changed.emit()
+
+        sent = []
+        failed_studies = []
+
+        while not self._stop_requested:
+            try:
+                queued_study = self._send_queue_service.claim_next()
+            except Exception as e:
+                print(f"Send queue error: {e}")
+                queued_study = None
+
+            if queued_study is None:
+                if sent or failed_studies:
+                    self._emit_summary(sent, failed_studies)
+                    sent, failed_studies = [], []
+
+                self._wake_event.wait(Settings.SEND_QUEUE_POLL_INTERVAL)
+                self._wake_event.clear()
+                continue
+
+            if not sent and not failed_studies:
+                self._pacs_controller.begin_transfer_session()
+
+            self.queue_changed.emit()
+            study_type = "LOCAL" if self._pacs_controller._is_local_study(queued_study.study_id) else "PACS"
+            done_count = len(sent) + len(failed_studies)
+            total_count = done_count + 1 + self._send_queue_service.pending_count()
+            self.progress_updated.emit(int(done_count / total_count * 100), f"[{study_type}] {queued_study.patient_name}")
+
+            self._send(queued_study, study_type, sent, failed_studies)
+            self.queue_changed.emit()
+
+    def _send(self, queued_study: QueuedStudy, study_type: str, sent: List, failed_studies: List[str]):
+        target_url, target_auth = Settings().get_target_pacs_config()
+        if not target_url or not target_auth:
+            error = "Target PACS is not correctly configured by the Admin."
+            self._send_queue_service.mark_failed(queued_study.queue_id, error)
+            failed_studies.append(f"{queued_study.patient_name} [{study_type}] - {error}")
+            return
 
+        try:
+            success = self._pacs_controller.send_queued_study(
+                queued_study, target_url, target_auth, self.is_stop_requested
+            )
+            error = None
         except Exception as e:
-            self.sending_completed.emit(False, f"Eroare critică: {str(e)}")
\ No newline at end of file
+            success = False
+            error = str(e)
+
+        if self._stop_requested and not success:
+            # Oprire la inchiderea aplicatiei: studiul se reia de unde a ramas
+            self._send_queue_service.release(queued_study.queue_id)
+            return
+
+        if success:
+            self._send_queue_service.mark_sent(queued_study.queue_id)
+            sent.append(study_type)
+        else:
+            self._send_queue_service.mark_failed(queued_study.queue_id, error or "Trimitere incompleta")
+            failed_studies.append(
+                f"{queued_study.patient_name} [{study_type}]" + (f" - {error}" if error else "")
+            )
+
+    def _emit_summary(self, sent: List[str], failed_studies: List[str]):
+        self.progress_updated.emit(100, "Finalizat")
+
+        total_studies = len(sent) + len(failed_studies)
+        local_studies_sent = sent.count("LOCAL")
+        pacs_studies_sent = sent.count("PACS")
+
+        if not failed_studies:
+            message = f"Toate {total_studies} studiile au fost trimise cu succes!"
+            if local_studies_sent > 0:
+                message += f"\n✨ {local_studies_sent} studii locale încărcate în PACS"
+            if pacs_studies_sent > 0:
+                message += f"\n📡 {pacs_studies_sent} studii PACS transferate"
+            self.sending_completed.emit(True, message)
+        elif sent:
+            message = f"Trimise: {len(sent)}/{total_studies} studii."
+            if local_studies_sent > 0:
+                message += f"\n✨ {local_studies_sent} studii locale încărcate"
+            if pacs_studies_sent > 0:
+                message += f"\n📡 {pacs_studies_sent} studii PACS transferate"
+            message += f"\nEșecuri: {', '.join(failed_studies[:3])}"
+            message += "\nStudiile eșuate au rămas în queue."
+            self.sending_completed.emit(True, message)
+        else:
+            message = f"Niciun studiu nu a putut fi trimis.\nErori: {', '.join(failed_studies[:3])}"
+            self.sending_completed.emit(False, message)
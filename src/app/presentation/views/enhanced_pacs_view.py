@@ -11,7 +11,7 @@ from PyQt6.QtCore import QThread, Qt
 from PyQt6.QtGui import QKeySequence, QShortcut
 
 from app.presentation.controllers.auth_controller import AuthController
-from app.presentation.controllers.hybrid_pacs_controller import HybridPacsController, StudiesWorker, QueueSenderWorker
+from app.presentation.controllers.hybrid_pacs_controller import HybridPacsController, StudiesWorker
 from app.presentation.views.base_view import CenteredView
 from app.presentation.widgets.study_list_widget import SearchableStudyListWidget, StudyQueueWidget
 from app.presentation.widgets.metadata_widget import MetadataWidget, ResultWidget
@@ -29,11 +29,16 @@ class EnhancedPacsView(CenteredView):
         self._notification_service = NotificationService()
         self._settings = Settings()
         self.last_generated_pdf_path = None
+        self._studies_loading = False
+        self._studies_initialized = False
+        self._page_requested = False
         self.setWindowTitle("Enhanced PACS Viewer")
         self.setGeometry(100, 100, 1800, 900)
         self._setup_ui()
         self._setup_shortcuts()
         load_style(self)
+        self._start_transfer_worker()
+        self._start_watch_folder_worker()
         self._load_studies()
         self._last_save_directory = None
 
@@ -52,7 +57,7 @@ class EnhancedPacsView(CenteredView):
         self.refresh_button = QPushButton("Refresh")
         self.refresh_button.setMaximumWidth(100)
         self.refresh_button.setFixedHeight(30)
-        self.refresh_button.clicked.connect(self._load_studies)
+        self.refresh_button.clicked.connect(self._refresh_studies)
 
         header_layout.addWidget(title_label)
         header_layout.addStretch()
@@ -107,6 +112,7 @@ class EnhancedPacsView(CenteredView):
 
         self.study_list = SearchableStudyListWidget()
         self.study_list.study_selected.connect(self._on_study_selected)
+        self.study_list.more_studies_requested.connect(self._load_studies_page)
         self.study_list.setMinimumHeight(400)
         self.study_list.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
         scroll_layout.addWidget(self.study_list)
@@ -134,7 +140,7 @@ class EnhancedPacsView(CenteredView):
         queue_label.setObjectName("SectionTitle")
         queue_layout.addWidget(queue_label)
 
-        self.queue_widget = StudyQueueWidget()
+        self.queue_widget = StudyQueueWidget(self._pacs_controller.get_send_queue_service())
         self.queue_widget.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
         queue_layout.addWidget(self.queue_widget)
 
@@ -216,6 +222,7 @@ class EnhancedPacsView(CenteredView):
             # Local file manager
             self.local_file_manager = LocalFileManagerWidget(local_file_service)
             self.local_file_manager.studies_updated.connect(self._on_local_studies_updated)
+            self.local_file_manager.watch_folders_changed.connect(self._pacs_controller.wake_watch_folder_worker)
             tab_layout.addWidget(self.local_file_manager)
 
             # Drag and drop area
@@ -241,9 +248,13 @@ class EnhancedPacsView(CenteredView):
         clear_shortcut = QShortcut(QKeySequence("Escape"), self)
         clear_shortcut.activated.connect(self._clear_search_if_focused)
 
-        # F5 to refresh
+        # F5 to refresh (only the changes since the last refresh)
         refresh_shortcut = QShortcut(QKeySequence("F5"), self)
-        refresh_shortcut.activated.connect(self._load_studies)
+        refresh_shortcut.activated.connect(self._refresh_studies)
+
+        # Ctrl+F5 to reload the whole list
+        reload_shortcut = QShortcut(QKeySequence("Ctrl+F5"), self)
+        reload_shortcut.activated.connect(self._load_studies)
 
         # Ctrl+Q to add to queue
         queue_shortcut = QShortcut(QKeySequence("Ctrl+Q"), self)
@@ -262,58 +273,98 @@ class EnhancedPacsView(CenteredView):
             self.study_list._clear_search()
 
     def _load_studies(self):
+        if self._studies_loading:
+            return
+
+        self._studies_initialized = False
         self.study_list.set_loading(True)
-        self.refresh_button.setEnabled(False)
-        self.refresh_button.setText("⏳ Loading...")
+        self._set_refreshing(True)
+
+        self._start_studies_worker(StudiesWorker(
+            self._pacs_controller, since=0, limit=self._settings.STUDY_LIST_PAGE_SIZE
+        ))
+
+    def _refresh_studies(self):
+        if not self._studies_initialized:
+            self._load_studies()
+            return
+
+        if self._studies_loading:
+            return
+
+        self._set_refreshing(True)
+        self._start_studies_worker(StudiesWorker(self._pacs_controller, incremental=True))
+
+    def _load_studies_page(self, since):
+        if self._studies_loading:
+            # Pagina este ceruta din nou, de la cursorul actualizat, dupa ce workerul curent termina
+            self._page_requested = True
+            self.study_list.cancel_fetch()
+            return
+
+        self._start_studies_worker(StudiesWorker(
+            self._pacs_controller, since=since, limit=self._settings.STUDY_LIST_PAGE_SIZE
+        ))
+
+    def _start_studies_worker(self, worker: StudiesWorker):
+        self._studies_loading = True
 
         self.study_thread = QThread()
-        self.worker = StudiesWorker(self._pacs_controller)
+        self.worker = worker
         self.worker.moveToThread(self.study_thread)
 
         self.study_thread.started.connect(self.worker.run)
         self.worker.studies_loaded.connect(self._on_studies_loaded)
+        self.worker.changes_loaded.connect(self._on_study_changes_loaded)
         self.worker.error_occurred.connect(self._on_studies_error)
 
         self.worker.studies_loaded.connect(self.study_thread.quit)
         self.worker.studies_loaded.connect(self.worker.deleteLater)
+        self.worker.changes_loaded.connect(self.study_thread.quit)
+        self.worker.changes_loaded.connect(self.worker.deleteLater)
         self.worker.error_occurred.connect(self.study_thread.quit)
         self.worker.error_occurred.connect(self.worker.deleteLater)
         self.study_thread.finished.connect(self.study_thread.deleteLater)
 
         self.study_thread.start()
 
-    def _on_studies_loaded(self, study_ids):
-        self.study_list.clear_studies()
-        self.study_list.set_loading(False)
-        self.refresh_button.setEnabled(True)
-        self.refresh_button.setText("Refresh")
+    def _set_refreshing(self, is_refreshing: bool):
+        self.refresh_button.setEnabled(not is_refreshing)
+        self.refresh_button.setText("⏳ Loading..." if is_refreshing else "Refresh")
 
-        pacs_count = 0
-        local_count = 0
+    def _on_studies_loaded(self, since, studies: list, next_since, has_more: bool):
+        self._studies_loading = False
 
-        for study_id in study_ids:
-            try:
-                metadata = self._pacs_controller.get_study_metadata(study_id)
+        if since == 0:
+            self._studies_initialized = True
+            self.study_list.clear_studies()
+            self.study_list.set_loading(False)
+            self._set_refreshing(False)
 
-                # Count study types
-                if study_id.startswith("local_"):
-                    local_count += 1
-                    display_text = f"[LOCAL]{metadata['Patient Name']} - {metadata['Study Date']} - {metadata['Description']}"
-                else:
-                    pacs_count += 1
-                    display_text = f"{metadata['Patient Name']} - {metadata['Study Date']} - {metadata['Description']}"
+        self.study_list.append_page(studies, next_since, has_more)
+        self._load_requested_page()
 
-                self.study_list.add_study(study_id, display_text)
+    def _on_study_changes_loaded(self, changes: dict):
+        self._studies_loading = False
+        self._set_refreshing(False)
 
-            except Exception as e:
-                print(f"Error loading metadata for study {study_id}: {e}")
+        self.study_list.apply_study_changes(changes["new"], changes["updated"], changes["deleted"])
+        self._load_requested_page()
 
     def _on_studies_error(self, error_message):
-        self.study_list.set_loading(False)
-        self.refresh_button.setEnabled(True)
-        self.refresh_button.setText("Refresh")
+        self._studies_loading = False
+        self._page_requested = False
+        self.study_list.cancel_fetch()
+        if not self._studies_initialized:
+            self.study_list.set_loading(False)
+        self._set_refreshing(False)
         self._notification_service.show_error(self, "Error", f"Error loading studies:\n{error_message}")
 
+    def _load_requested_page(self):
+        if self._page_requested:
+            self._page_requested = False
+            self.study_list.fetch_more()
+
     def _on_study_selected(self, study_id: str):
         try:
             metadata = self._pacs_controller.get_study_metadata(study_id)
@@ -508,52 +559,55 @@ class EnhancedPacsView(CenteredView):
             self._notification_service.show_info(self, "Studiu adăugat", message)
 
     def _send_queue_to_pacs(self):
-        queued_studies = self.queue_widget.get_queued_studies()
-
-        if not queued_studies:
+        if not self.queue_widget.get_unsent_count():
             self._notification_service.show_warning(self, "Queue gol", "Nu sunt studii în queue pentru trimitere.")
             return
 
-        self._show_sending_progress(queued_studies)
+        # Studiile sunt doar marcate pentru trimitere; worker-ul de transfer le preia din queue-ul persistent
+        self._pacs_controller.get_send_queue_service().submit()
+        self._pacs_controller.wake_transfer_worker()
+        self.queue_widget.reload()
+        self._show_sending_progress()
 
-    def _show_sending_progress(self, queued_studies):
-        self.progress_bar.setVisible(True)
-        self.progress_bar.setValue(0)
-        self.send_queue_button.setEnabled(False)
-        self.send_queue_button.setText("⏳ Trimitere...")
+    def _start_transfer_worker(self):
+        self.transfer_worker = self._pacs_controller.start_transfer_worker()
+        self.transfer_worker.progress_updated.connect(self._update_sending_progress)
+        self.transfer_worker.queue_changed.connect(self.queue_widget.reload)
+        self.transfer_worker.sending_completed.connect(self._on_sending_completed)
 
-        self.sender_thread = QThread()
-        self.sender_worker = QueueSenderWorker(
-            self._pacs_controller,
-            queued_studies
-        )
-        self.sender_worker.moveToThread(self.sender_thread)
+    def _start_watch_folder_worker(self):
+        self.watch_folder_worker = self._pacs_controller.start_watch_folder_worker()
+        self.watch_folder_worker.studies_changed.connect(self._on_watched_studies_changed)
 
-        # Connect signals
-        self.sender_thread.started.connect(self.sender_worker.run)
-        self.sender_worker.progress_updated.connect(self._update_sending_progress)
-        self.sender_worker.sending_completed.connect(self._on_sending_completed)
+    def _on_watched_studies_changed(self, changes: dict):
+        # Studiile importate automat sunt adaugate in lista fara reincarcarea completa
+        if self._studies_initialized:
+            self.study_list.add_studies(changes["new"])
+            self.study_list.apply_study_changes([], changes["updated"], changes["deleted"])
 
-        # Cleanup
-        self.sender_worker.sending_completed.connect(self.sender_thread.quit)
-        self.sender_worker.sending_completed.connect(self.sender_worker.deleteLater)
-        self.sender_thread.finished.connect(self.sender_thread.deleteLater)
+        if hasattr(self, 'local_file_manager'):
+            self.local_file_manager.refresh_display()
 
-        self.sender_thread.start()
+    def _show_sending_progress(self):
+        self.progress_bar.setVisible(True)
+        self.send_queue_button.setText("⏳ Trimitere...")
 
     def _update_sending_progress(self, progress: int, current_study: str):
-        self.progress_bar.setValue(progress)
         if progress < 100:
+            self._show_sending_progress()
+            self.progress_bar.setValue(progress)
             self.send_queue_button.setText(f"⏳ Trimitere... {current_study}")
 
     def _on_sending_completed(self, success: bool, message: str):
         self.progress_bar.setVisible(False)
-        self.send_queue_button.setEnabled(True)
+        self.progress_bar.setValue(0)
         self.send_queue_button.setText("🚀 Send Queue to PACS")
 
+        # Worker-ul este comun; doar fereastra activa afiseaza rezultatul
+        if not self.isVisible():
+            return
+
         if success:
-            # Clear queue on success
-            self.queue_widget.clear_queue()
             self._notification_service.show_info(self, "Trimitere finalizată", message)
         else:
             self._notification_service.show_error(self, "Eroare trimitere", message)
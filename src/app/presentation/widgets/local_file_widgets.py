@@ -1,4 +1,5 @@
 import os
+import threading
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
     QFileDialog, QProgressBar, QListWidget, QListWidgetItem,
@@ -12,7 +13,7 @@ from app.services.notification_service import NotificationService
 
 class LocalFileLoaderWorker(QObject):
     progress_updated = pyqtSignal(int, str)
-    file_loaded = pyqtSignal(dict)
+    files_loaded = pyqtSignal(list)
     folder_loaded = pyqtSignal(list)
     error_occurred = pyqtSignal(str)
     finished = pyqtSignal()
@@ -22,6 +23,14 @@ class LocalFileLoaderWorker(QObject):
         self._local_file_service = local_file_service
         self._file_paths = file_paths or []
         self._folder_path = folder_path
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        # Apelat direct din UI; importul se opreste dupa lotul curent
+        self._cancelled.set()
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
 
     def run(self):
         try:
@@ -38,32 +47,41 @@ class LocalFileLoaderWorker(QObject):
         self.progress_updated.emit(0, f"Scanning folder: {self._folder_path}")
 
         try:
-            studies = self._local_file_service.load_dicom_folder(self._folder_path)
+            studies = self._local_file_service.load_dicom_folder(
+                self._folder_path, self._on_progress, self.is_cancelled
+            )
             self.folder_loaded.emit(studies)
-            self.progress_updated.emit(100, f"Loaded {len(studies)} studies from folder")
+            self.progress_updated.emit(100, self._summary(studies))
         except Exception as e:
             self.error_occurred.emit(f"Error loading folder: {e}")
 
     def _load_files(self):
-        total_files = len(self._file_paths)
+        self.progress_updated.emit(0, f"Loading {len(self._file_paths)} files...")
 
-        for i, file_path in enumerate(self._file_paths):
-            try:
-                progress = int((i / total_files) * 100)
-                filename = os.path.basename(file_path)
-                self.progress_updated.emit(progress, f"Loading: {filename}")
-
-                file_data = self._local_file_service.load_dicom_file(file_path)
-                self.file_loaded.emit(file_data)
+        try:
+            studies = self._local_file_service.load_dicom_files(
+                self._file_paths, self._on_progress, self.is_cancelled
+            )
+            self.files_loaded.emit(studies)
+            self.progress_updated.emit(100, self._summary(studies))
+        except Exception as e:
+            self.error_occurred.emit(f"Error loading files: {e}")
 
-            except Exception as e:
-                self.error_occurred.emit(f"Error loading {file_path}: {e}")
+    def _on_progress(self, processed: int, total: int):
+        progress = int((processed / total) * 100) if total else 100
+        self.progress_updated.emit(progress, f"Processed {processed}/{total} files")
 
-        self.progress_updated.emit(100, f"Loaded {total_files} files")
+    def _summary(self, studies: List[Dict[str, Any]]) -> str:
+        file_count = sum(study.get("file_count", 0) for study in studies)
+        message = f"Loaded {len(studies)} studies ({file_count} files)"
+        if self.is_cancelled():
+            message += " - cancelled"
+        return message
 
 
 class LocalFileManagerWidget(QWidget):
     studies_updated = pyqtSignal()
+    watch_folders_changed = pyqtSignal()
 
     def __init__(self, local_file_service, parent=None):
         super().__init__(parent)
@@ -101,9 +119,15 @@ class LocalFileManagerWidget(QWidget):
         self.clear_button.setObjectName("ClearButton")
         self.clear_button.clicked.connect(self._clear_local_studies)
 
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.setObjectName("CancelLoadingButton")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self._cancel_loading)
+
         buttons_layout.addWidget(self.load_files_button)
         buttons_layout.addWidget(self.load_folder_button)
         buttons_layout.addWidget(self.clear_button)
+        buttons_layout.addWidget(self.cancel_button)
         buttons_layout.addStretch()
 
         layout.addLayout(buttons_layout)
@@ -134,14 +158,40 @@ class LocalFileManagerWidget(QWidget):
 
         layout.addWidget(self.studies_group)
 
+        # Watched folders (auto-import of new exports)
+        self.watch_group = QGroupBox("Watched Folders")
+        watch_layout = QVBoxLayout(self.watch_group)
+
+        self.watch_folders_list = QListWidget()
+        self.watch_folders_list.setMaximumHeight(80)
+        watch_layout.addWidget(self.watch_folders_list)
+
+        watch_buttons_layout = QHBoxLayout()
+
+        self.add_watch_button = QPushButton("Watch Folder...")
+        self.add_watch_button.setObjectName("AddWatchFolderButton")
+        self.add_watch_button.clicked.connect(self._add_watch_folder)
+
+        self.remove_watch_button = QPushButton("Stop Watching")
+        self.remove_watch_button.setObjectName("RemoveWatchFolderButton")
+        self.remove_watch_button.clicked.connect(self._remove_watch_folder)
+
+        watch_buttons_layout.addWidget(self.add_watch_button)
+        watch_buttons_layout.addWidget(self.remove_watch_button)
+        watch_buttons_layout.addStretch()
+        watch_layout.addLayout(watch_buttons_layout)
+
+        layout.addWidget(self.watch_group)
+
         self._update_local_studies_display()
+        self._update_watch_folders_display()
 
     def _load_dicom_files(self):
         file_paths, _ = QFileDialog.getOpenFileNames(
             self,
             "Select DICOM Files",
             "",
-            "DICOM Files (*.dcm *.dicom *.dic);;All Files (*)"
+            "DICOM Files (*.dcm *.dicom *.dic);;DICOM Archives (*.zip *.tar *.tar.gz *.tgz);;All Files (*)"
         )
 
         if file_paths:
@@ -156,6 +206,39 @@ class LocalFileManagerWidget(QWidget):
         if folder_path:
             self._load_folder_in_background(folder_path)
 
+    def _add_watch_folder(self):
+        folder_path = QFileDialog.getExistingDirectory(self, "Select Folder to Watch")
+        if not folder_path:
+            return
+
+        try:
+            self._local_file_service.add_watch_folder(folder_path)
+            self._update_watch_folders_display()
+            self.watch_folders_changed.emit()
+        except Exception as e:
+            self._notification_service.show_error(self, "Error", f"Error adding watched folder: {e}")
+
+    def _remove_watch_folder(self):
+        item = self.watch_folders_list.currentItem()
+        if not item:
+            self._notification_service.show_warning(self, "Warning", "Please select a watched folder.")
+            return
+
+        try:
+            self._local_file_service.remove_watch_folder(item.text())
+            self._update_watch_folders_display()
+            self.watch_folders_changed.emit()
+        except Exception as e:
+            self._notification_service.show_error(self, "Error", f"Error removing watched folder: {e}")
+
+    def _update_watch_folders_display(self):
+        self.watch_folders_list.clear()
+        try:
+            for folder_path in self._local_file_service.get_watch_folders():
+                self.watch_folders_list.addItem(folder_path)
+        except Exception as e:
+            print(f"Error updating watched folders display: {e}")
+
     def _load_files_in_background(self, file_paths: List[str]):
         self._show_loading_state(True, f"Loading {len(file_paths)} files...")
 
@@ -169,7 +252,7 @@ class LocalFileManagerWidget(QWidget):
         # Connect signals
         self.loader_thread.started.connect(self.loader_worker.run)
         self.loader_worker.progress_updated.connect(self._update_loading_progress)
-        self.loader_worker.file_loaded.connect(self._on_file_loaded)
+        self.loader_worker.files_loaded.connect(self._on_files_loaded)
         self.loader_worker.error_occurred.connect(self._on_loading_error)
         self.loader_worker.finished.connect(self._on_loading_finished)
 
@@ -215,12 +298,19 @@ class LocalFileManagerWidget(QWidget):
         self.load_files_button.setEnabled(not loading)
         self.load_folder_button.setEnabled(not loading)
         self.clear_button.setEnabled(not loading)
+        self.cancel_button.setVisible(loading)
+        self.cancel_button.setEnabled(loading)
+
+    def _cancel_loading(self):
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText("Cancelling...")
+        self.loader_worker.cancel()
 
     def _update_loading_progress(self, progress: int, message: str):
         self.progress_bar.setValue(progress)
         self.status_label.setText(message)
 
-    def _on_file_loaded(self, file_data: Dict[str, Any]):
+    def _on_files_loaded(self, studies: List[Dict[str, Any]]):
         self._update_local_studies_display()
 
     def _on_folder_loaded(self, studies: List[Dict[str, Any]]):
@@ -407,7 +497,7 @@ class LocalFileDropWidget(QFrame):
         layout.setAlignment(Qt.AlignmentFlag.AlignCenter)
 
         # Drop icon and text
-        drop_label = QLabel("\nDrag & Drop DICOM Files Here\n\nSupported formats: .dcm, .dicom, .dic")
+        drop_label = QLabel("\nDrag & Drop DICOM Files Here\n\nSupported formats: .dcm, .dicom, .dic, .zip, .tar.gz")
         drop_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         drop_label.setStyleSheet("""
             QLabel {
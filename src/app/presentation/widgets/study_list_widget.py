@@ -1,26 +1,148 @@
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton,
-    QListWidget, QListWidgetItem, QLabel, QSizePolicy, QScrollArea
+    QListWidget, QListWidgetItem, QListView, QLabel, QSizePolicy, QScrollArea
+)
+from PyQt6.QtCore import (
+    pyqtSignal, Qt, QTimer, QAbstractListModel, QModelIndex, QSortFilterProxyModel
 )
-from PyQt6.QtCore import pyqtSignal, Qt, QTimer
 from PyQt6.QtGui import QIcon
-from typing import Dict, List, Tuple, NamedTuple
+from typing import Dict, List, Tuple, Any
+
+from app.core.entities.transfer import QueuedStudy, QueueState
+
+
+class StudyListModel(QAbstractListModel):
+    fetch_requested = pyqtSignal(object)
+
+    LOADING_TEXT = "Se încarcă studiile..."
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._studies: List[Tuple[str, str]] = []
+        self._row_by_study_id: Dict[str, int] = {}
+        self._has_more = False
+        self._fetching = False
+        self._loading = False
+        # Pozitia paginii urmatoare in sursa; nu depinde de randurile adaugate sau sterse din lista
+        self._next_since: Any = 0
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        if self._loading and not self._studies:
+            return 1
+        return len(self._studies)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        if self._loading and not self._studies:
+            return self.LOADING_TEXT if role == Qt.ItemDataRole.DisplayRole else None
+
+        study_id, display_text = self._studies[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return display_text
+        if role == Qt.ItemDataRole.UserRole:
+            return study_id
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        return not parent.isValid() and self._has_more and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        self.fetch_requested.emit(self._next_since)
+
+    def cancel_fetch(self):
+        self._fetching = False
+
+    def append_page(self, studies: List[Tuple[str, str]], next_since: Any, has_more: bool):
+        self._next_since = next_since
+        self.append_studies(studies, has_more)
+
+    def append_studies(self, studies: List[Tuple[str, str]], has_more: bool):
+        self._fetching = False
+        self._has_more = has_more
+
+        if not studies:
+            return
+
+        # Un studiu nou primit prin refresh incremental poate aparea din nou intr-o pagina ulterioara
+        studies = [study for study in studies if study[0] not in self._row_by_study_id]
+        if not studies:
+            return
+
+        first = len(self._studies)
+        self.beginInsertRows(QModelIndex(), first, first + len(studies) - 1)
+        self._studies.extend(studies)
+        for row, (study_id, _) in enumerate(studies, first):
+            self._row_by_study_id[study_id] = row
+        self.endInsertRows()
+
+    def apply_changes(self, new: List[Tuple[str, str]], updated: List[Tuple[str, str]], deleted: List[str]):
+        appended = []
+
+        for study_id, display_text in new + updated:
+            row = self._row_by_study_id.get(study_id)
+            if row is not None:
+                self._studies[row] = (study_id, display_text)
+                index = self.index(row)
+                self.dataChanged.emit(index, index)
+            elif not self._has_more:
+                # Daca mai sunt pagini de incarcat, studiul va veni oricum la scroll
+                appended.append((study_id, display_text))
+
+        rows_to_remove = sorted(
+            (self._row_by_study_id[study_id] for study_id in deleted if study_id in self._row_by_study_id),
+            reverse=True
+        )
+        for row in rows_to_remove:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self._studies[row]
+            self.endRemoveRows()
+
+        if rows_to_remove:
+            self._row_by_study_id = {study_id: row for row, (study_id, _) in enumerate(self._studies)}
+
+        if appended:
+            self.append_studies(appended, self._has_more)
+
+    def set_loading(self, is_loading: bool):
+        self.beginResetModel()
+        self._loading = is_loading
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        self._studies = []
+        self._row_by_study_id = {}
+        self._has_more = False
+        self._fetching = False
+        self._next_since = 0
+        self.endResetModel()
+
+    def loaded_count(self) -> int:
+        return len(self._studies)
+
+    def has_more(self) -> bool:
+        return self._has_more
 
-class QueuedStudy(NamedTuple):
-    study_id: str
-    display_text: str
-    examination_result: str
-    patient_name: str
-    study_date: str
-    description: str
 
 class SearchableStudyListWidget(QWidget):
     study_selected = pyqtSignal(str)
+    more_studies_requested = pyqtSignal(object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.all_studies: List[Tuple[str, str]] = []
-        self.filtered_studies: Dict[str, str] = {}
+        self.model = StudyListModel(self)
+        self.model.fetch_requested.connect(self.more_studies_requested)
+
+        self.proxy_model = QSortFilterProxyModel(self)
+        self.proxy_model.setSourceModel(self.model)
+        self.proxy_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
 
         self.search_timer = QTimer()
         self.search_timer.setSingleShot(True)
@@ -63,11 +185,14 @@ class SearchableStudyListWidget(QWidget):
         self.results_label.setMaximumHeight(0)
         layout.addWidget(self.results_label)
 
-        # Study list
-        self.study_list = QListWidget()
+        # Study list - doar randurile vizibile sunt desenate, paginile se cer la scroll
+        self.study_list = QListView()
         self.study_list.setObjectName("StudyList")
+        self.study_list.setModel(self.proxy_model)
+        self.study_list.setUniformItemSizes(True)
+        self.study_list.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
         self.study_list.setFocusPolicy(Qt.FocusPolicy.NoFocus)
-        self.study_list.itemClicked.connect(self._on_item_clicked)
+        self.study_list.clicked.connect(self._on_item_clicked)
         self.study_list.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
 
         layout.addWidget(self.study_list)
@@ -82,35 +207,18 @@ class SearchableStudyListWidget(QWidget):
             self._clear_search()
 
     def _perform_search(self):
-        search_text = self.search_input.text().strip().lower()
+        search_text = self.search_input.text().strip()
 
         if not search_text:
             self._show_all_studies()
             return
 
-        # Filter studies based on search text
-        filtered = []
-        for study_id, display_text in self.all_studies:
-            if search_text in display_text.lower():
-                filtered.append((study_id, display_text))
-
-        self._display_filtered_studies(filtered, search_text)
-
-    def _display_filtered_studies(self, filtered_studies: List[Tuple[str, str]], search_text: str):
-        self.study_list.clear()
-        self.filtered_studies.clear()
-
-        for study_id, display_text in filtered_studies:
-            self.filtered_studies[display_text] = study_id
+        self.proxy_model.setFilterFixedString(search_text)
+        self._update_results_label(search_text)
 
-            highlighted_text = self._highlight_search_terms(display_text, search_text)
-            item = QListWidgetItem(highlighted_text)
-            item.setData(Qt.ItemDataRole.UserRole, study_id)
-            self.study_list.addItem(item)
-
-        # Update results info
-        total_studies = len(self.all_studies)
-        found_studies = len(filtered_studies)
+    def _update_results_label(self, search_text: str):
+        total_studies = f"{self.model.loaded_count()}{'+' if self.model.has_more() else ''}"
+        found_studies = self.proxy_model.rowCount()
 
         if found_studies == 0:
             self.results_label.setText(f"Nu s-au gasit studii pentru '{search_text}'")
@@ -121,19 +229,8 @@ class SearchableStudyListWidget(QWidget):
 
         self.results_label.setVisible(True)
 
-    def _highlight_search_terms(self, text: str, search_term: str) -> str:
-        return text
-
     def _show_all_studies(self):
-        self.study_list.clear()
-        self.filtered_studies.clear()
-
-        for study_id, display_text in self.all_studies:
-            self.filtered_studies[display_text] = study_id
-            item = QListWidgetItem(display_text)
-            item.setData(Qt.ItemDataRole.UserRole, study_id)
-            self.study_list.addItem(item)
-
+        self.proxy_model.setFilterFixedString("")
         self.results_label.setVisible(False)
 
     def _clear_search(self):
@@ -142,18 +239,41 @@ class SearchableStudyListWidget(QWidget):
         self._show_all_studies()
 
     def add_study(self, study_id: str, display_text: str):
-        self.all_studies.append((study_id, display_text))
+        self.model.append_studies([(study_id, display_text)], self.model.has_more())
 
-        if not self.search_input.text().strip():
-            self.filtered_studies[display_text] = study_id
-            item = QListWidgetItem(display_text)
-            item.setData(Qt.ItemDataRole.UserRole, study_id)
-            self.study_list.addItem(item)
+    def add_studies(self, studies: List[Tuple[str, str]]):
+        # Spre deosebire de apply_study_changes, studiile sunt adaugate si cand mai sunt pagini de incarcat
+        self.append_studies(studies, self.model.has_more())
+
+    def append_studies(self, studies: List[Tuple[str, str]], has_more: bool = False):
+        self.model.append_studies(studies, has_more)
+
+        search_text = self.get_search_text()
+        if search_text:
+            self._update_results_label(search_text)
+
+    def append_page(self, studies: List[Tuple[str, str]], next_since: Any, has_more: bool):
+        self.model.append_page(studies, next_since, has_more)
+
+        search_text = self.get_search_text()
+        if search_text:
+            self._update_results_label(search_text)
+
+    def cancel_fetch(self):
+        self.model.cancel_fetch()
+
+    def fetch_more(self):
+        self.model.fetchMore()
+
+    def apply_study_changes(self, new: List[Tuple[str, str]], updated: List[Tuple[str, str]], deleted: List[str]):
+        self.model.apply_changes(new, updated, deleted)
+
+        search_text = self.get_search_text()
+        if search_text:
+            self._update_results_label(search_text)
 
     def clear_studies(self):
-        self.all_studies.clear()
-        self.study_list.clear()
-        self.filtered_studies.clear()
+        self.model.clear()
         self.search_input.clear()
         self.clear_button.setVisible(False)
         self.results_label.setVisible(False)
@@ -161,39 +281,19 @@ class SearchableStudyListWidget(QWidget):
     def set_loading(self, is_loading: bool):
         if is_loading:
             self.clear_studies()
-            self.study_list.addItem("Se încarcă studiile...")
-            self.search_input.setEnabled(False)
-        else:
-            # Remove loading item if it exists
-            for i in range(self.study_list.count()):
-                item = self.study_list.item(i)
-                if item and item.text() == "Se încarcă studiile...":
-                    self.study_list.takeItem(i)
-                    break
-            self.search_input.setEnabled(True)
+        self.model.set_loading(is_loading)
+        self.search_input.setEnabled(not is_loading)
 
     def get_selected_study_id(self) -> str:
-        current_item = self.study_list.currentItem()
-        if current_item:
-            # Try to get from UserRole data first
-            study_id = current_item.data(Qt.ItemDataRole.UserRole)
-            if study_id:
-                return study_id
-
-            # Fallback to text-based lookup
-            if current_item.text() in self.filtered_studies:
-                return self.filtered_studies[current_item.text()]
+        current_index = self.study_list.currentIndex()
+        if current_index.isValid():
+            return current_index.data(Qt.ItemDataRole.UserRole) or ""
         return ""
 
-    def _on_item_clicked(self, item: QListWidgetItem):
-        study_id = item.data(Qt.ItemDataRole.UserRole)
+    def _on_item_clicked(self, index: QModelIndex):
+        study_id = index.data(Qt.ItemDataRole.UserRole)
         if study_id:
             self.study_selected.emit(study_id)
-        else:
-            # Fallback for text-based lookup
-            if item.text() in self.filtered_studies:
-                study_id = self.filtered_studies[item.text()]
-                self.study_selected.emit(study_id)
 
     def focus_search(self):
         self.search_input.setFocus()
@@ -207,10 +307,19 @@ class SearchableStudyListWidget(QWidget):
 
 class StudyQueueWidget(QWidget):
 
-    def __init__(self, parent=None):
+    _STATE_ICONS = {
+        QueueState.STAGED: "📋",
+        QueueState.PENDING: "⏳",
+        QueueState.SENDING: "📤",
+        QueueState.FAILED: "⚠️",
+    }
+
+    def __init__(self, send_queue_service, parent=None):
         super().__init__(parent)
+        self._send_queue_service = send_queue_service
         self.queued_studies: List[QueuedStudy] = []
         self._setup_ui()
+        self.reload()
 
     def _setup_ui(self):
         layout = QVBoxLayout(self)
@@ -246,63 +355,56 @@ class StudyQueueWidget(QWidget):
 
         layout.addWidget(self.queue_list)
 
-    def add_study_to_queue(self, study_id: str, display_text: str, examination_result: str,
-                           patient_name: str, study_date: str, description: str) -> bool:
+    def reload(self):
+        # Queue-ul persistent este sursa de adevar; lista vizuala doar il reflecta
+        self.queued_studies = self._send_queue_service.get_queued_studies()
+        self.queue_list.clear()
 
-        # Check if study is already in queue
         for queued_study in self.queued_studies:
-            if queued_study.study_id == study_id:
-                return False
-
-        # Create queued study object
-        queued_study = QueuedStudy(
-            study_id=study_id,
-            display_text=display_text,
-            examination_result=examination_result,
-            patient_name=patient_name,
-            study_date=study_date,
-            description=description
-        )
+            examination_result = queued_study.examination_result
+            display_text = f"{self._STATE_ICONS.get(queued_study.state, '')} {queued_study.display_text}"
+            result_preview = examination_result[:50] + "..." if len(examination_result) > 50 else examination_result
+            item_text = f"{display_text}\n📝 {result_preview}" if examination_result else f"{display_text}\n📝 (fără rezultat)"
 
-        # Add to internal list
-        self.queued_studies.append(queued_study)
+            tooltip = f"Studiu: {queued_study.display_text}\nRezultat: {examination_result}"
+            if queued_study.error:
+                tooltip += f"\nEroare: {queued_study.error}"
 
-        # Add to visual list
-        result_preview = examination_result[:50] + "..." if len(examination_result) > 50 else examination_result
-        item_text = f"{display_text}\n📝 {result_preview}" if examination_result else f"{display_text}\n📝 (fără rezultat)"
-
-        item = QListWidgetItem(item_text)
-        item.setData(Qt.ItemDataRole.UserRole, study_id)
-        item.setToolTip(f"Studiu: {display_text}\nRezultat: {examination_result}")
-        self.queue_list.addItem(item)
+            item = QListWidgetItem(item_text)
+            item.setData(Qt.ItemDataRole.UserRole, queued_study.study_id)
+            item.setToolTip(tooltip)
+            self.queue_list.addItem(item)
 
         self._update_queue_count()
-        return True
 
-    def remove_study_from_queue(self, study_id: str) -> bool:
-        # Remove from internal list
-        self.queued_studies = [qs for qs in self.queued_studies if qs.study_id != study_id]
+    def add_study_to_queue(self, study_id: str, display_text: str, examination_result: str,
+                           patient_name: str, study_date: str, description: str) -> bool:
+        queued_study = self._send_queue_service.enqueue(
+            study_id, display_text, examination_result, patient_name, study_date, description
+        )
+        if queued_study is None:
+            return False
 
-        # Remove from visual list
-        for i in range(self.queue_list.count()):
-            item = self.queue_list.item(i)
-            if item and item.data(Qt.ItemDataRole.UserRole) == study_id:
-                self.queue_list.takeItem(i)
-                break
+        self.reload()
+        return True
 
-        self._update_queue_count()
+    def remove_study_from_queue(self, study_id: str) -> bool:
+        self._send_queue_service.remove(study_id)
+        self.reload()
         return True
 
     def get_queued_studies(self) -> List[QueuedStudy]:
         return self.queued_studies.copy()
 
+    def get_unsent_count(self) -> int:
+        return sum(1 for qs in self.queued_studies if qs.state in (QueueState.STAGED, QueueState.FAILED))
+
     def clear_queue(self):
-        self.queued_studies.clear()
-        self.queue_list.clear()
-        self._update_queue_count()
+        self._send_queue_service.clear()
+        self.reload()
 
     def is_study_in_queue(self, study_id: str) -> bool:
-        return any(qs.study_id == study_id for qs in self.queued_studies)
+        return self._send_queue_service.is_queued(study_id)
 
     def get_queue_count(self) -> int:
         return len(self.queued_studies)
@@ -0,0 +1,166 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable, Hashable
+
+from app.core.interfaces.pacs_interface import IPacsService
+
+
+class _PendingLoad:
+    def __init__(self):
+        self._done = threading.Event()
+        self._value = None
+        self._error: Optional[BaseException] = None
+        self.invalidated = False
+
+    def resolve(self, value: Any = None, error: Optional[BaseException] = None):
+        self._value = value
+        self._error = error
+        self._done.set()
+
+    def wait(self) -> Any:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class _TtlLruCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._max_entries = max(1, max_entries)
+        self._ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._pending: Dict[Hashable, _PendingLoad] = {}
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                return entry[1]
+
+            # Cererile simultane pentru aceeasi cheie asteapta rezultatul primei cereri
+            pending = self._pending.get(key)
+            is_loader = pending is None
+            if is_loader:
+                pending = _PendingLoad()
+                self._pending[key] = pending
+
+        if not is_loader:
+            return pending.wait()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(key, None)
+            pending.resolve(error=e)
+            raise
+
+        with self._lock:
+            self._pending.pop(key, None)
+            # Rezultatul unei cereri pornite inainte de invalidare nu mai este retinut
+            if not pending.invalidated:
+                self._store(key, value)
+        pending.resolve(value)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._store(key, value)
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+            if key in self._pending:
+                self._pending[key].invalidated = True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for pending in self._pending.values():
+                pending.invalidated = True
+
+    def _store(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self._ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+
+class CachingPacsService(IPacsService):
+    def __init__(self, pacs_service: IPacsService, max_entries: int = 512, ttl_seconds: float = 60):
+        self._pacs_service = pacs_service
+        self._metadata_cache = _TtlLruCache(max_entries, ttl_seconds)
+        self._instances_cache = _TtlLruCache(max_entries, ttl_seconds)
+
+    def __getattr__(self, name: str) -> Any:
+        # Metodele fara cache (trimitere, rezultate, fisiere) merg direct la serviciul decorat
+        return getattr(self._pacs_service, name)
+
+    def get_all_studies(self) -> List[str]:
+        return self._pacs_service.get_all_studies()
+
+    def get_all_studies_with_metadata(self) -> List[Dict[str, Any]]:
+        return self._remember_metadata(self._pacs_service.get_all_studies_with_metadata())
+
+    def get_studies_page(self, since: Any, limit: int) -> Dict[str, Any]:
+        page = self._pacs_service.get_studies_page(since, limit)
+        self._remember_metadata(page["studies"])
+        return page
+
+    def get_study_changes(self) -> Dict[str, Any]:
+        changes = self._pacs_service.get_study_changes()
+
+        for study_id in changes.get("deleted", []):
+            self.invalidate(study_id)
+        for study in changes.get("new", []) + changes.get("updated", []):
+            self._instances_cache.invalidate(study["study_id"])
+        self._remember_metadata(changes.get("new", []) + changes.get("updated", []))
+
+        return changes
+
+    def get_study_metadata(self, study_id: str) -> Dict[str, Any]:
+        # Copie, ca apelantii sa nu modifice valoarea din cache
+        return copy.deepcopy(self._metadata_cache.get_or_load(
+            study_id, lambda: self._pacs_service.get_study_metadata(study_id)
+        ))
+
+    def get_study_instances(self, study_id: str) -> List[Dict[str, Any]]:
+        return copy.deepcopy(self._instances_cache.get_or_load(
+            study_id, lambda: self._pacs_service.get_study_instances(study_id)
+        ))
+
+    def get_dicom_file(self, instance_id: str) -> bytes:
+        return self._pacs_service.get_dicom_file(instance_id)
+
+    def send_study_to_pacs(self, study_id: str, target_url: str, target_auth: tuple,
+                           examination_result: str = None, **kwargs) -> bool:
+        try:
+            return self._pacs_service.send_study_to_pacs(study_id, target_url, target_auth, examination_result, **kwargs)
+        finally:
+            # Trimiterea poate modifica studiul (rezultat, /modify), deci il citim din nou la urmatoarea cerere
+            self.invalidate(study_id)
+
+    def get_examination_result_from_dicom(self, instance_id: str) -> str:
+        return self._pacs_service.get_examination_result_from_dicom(instance_id)
+
+    def clear_local_studies(self):
+        self._pacs_service.clear_local_studies()
+
+    def invalidate(self, study_id: Optional[str] = None):
+        if study_id is None:
+            self._metadata_cache.clear()
+            self._instances_cache.clear()
+        else:
+            self._metadata_cache.invalidate(study_id)
+            self._instances_cache.invalidate(study_id)
+
+    def _remember_metadata(self, studies: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Listele de studii aduc deja metadatele formatate; le folosim ca sa improspatam cache-ul
+        for study in studies:
+            if study.get("study_id") and study.get("metadata") is not None:
+                self._metadata_cache.put(study["study_id"], copy.deepcopy(study["metadata"]))
+        return studies
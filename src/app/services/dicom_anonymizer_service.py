@@ -1,42 +1,24 @@
 import pydicom
 from io import BytesIO
 import hashlib
+from typing import Dict, Any
 
 
 class DicomAnonymizer:
+    _REQUIRED_FIELDS = ('PatientName', 'PatientID', 'PatientBirthDate', 'PatientSex', 'PatientAge')
+
+    _PERSONAL_FIELDS = (
+        'PatientAddress', 'PatientTelephoneNumbers', 'EthnicGroup',
+        'PatientComments', 'OtherPatientIDs', 'OtherPatientNames'
+    )
+
     def __init__(self):
         pass
 
     def anonymize_dicom(self, dicom_data: bytes) -> bytes:
         try:
             dataset = pydicom.dcmread(BytesIO(dicom_data))
-
-            # Genereaza ID anonim unic
-            anonymous_id = self.generate_anonymous_id(dataset)
-
-            dataset.PatientName = f"ANONYMOUS^{anonymous_id[-6:]}"
-            dataset.PatientID = anonymous_id
-            dataset.PatientBirthDate = ""
-            dataset.PatientSex = ""
-            dataset.PatientAge = ""
-
-            if hasattr(dataset, 'InstitutionName'):
-                dataset.InstitutionName = "ANONYMOUS_HOSPITAL"
-            if hasattr(dataset, 'ReferringPhysicianName'):
-                dataset.ReferringPhysicianName = "ANONYMOUS^DOCTOR"
-            if hasattr(dataset, 'AccessionNumber'):
-                dataset.AccessionNumber = f"ACC{anonymous_id[-6:]}"
-            if hasattr(dataset, 'StudyID'):
-                dataset.StudyID = f"STUDY{anonymous_id[-6:]}"
-
-            personal_fields = [
-                'PatientAddress', 'PatientTelephoneNumbers', 'EthnicGroup',
-                'PatientComments', 'OtherPatientIDs', 'OtherPatientNames'
-            ]
-
-            for field in personal_fields:
-                if hasattr(dataset, field):
-                    setattr(dataset, field, "")
+            self.anonymize_dataset(dataset)
 
             # Salvez DICOM in memorie si retunrez datele ca bytes
             output = BytesIO()
@@ -47,16 +29,57 @@ class DicomAnonymizer:
             print(f"Error anonymizing DICOM: {e}")
             return dicom_data
 
+    def anonymize_dataset(self, dataset):
+        # Genereaza ID anonim unic
+        anonymous_id = self.generate_anonymous_id(dataset)
+
+        for keyword, value in self._get_replacements(anonymous_id).items():
+            if keyword in self._REQUIRED_FIELDS or hasattr(dataset, keyword):
+                setattr(dataset, keyword, value)
+
+        for field in self._PERSONAL_FIELDS:
+            if hasattr(dataset, field):
+                setattr(dataset, field, "")
+
+    def build_orthanc_modification(self, tags: Dict[str, str]) -> Dict[str, Any]:
+        # Aceleasi reguli ca anonymize_dataset, exprimate pentru /modify din Orthanc;
+        # tags sunt PatientMainDicomTags + MainDicomTags ale studiului
+        anonymous_id = self.generate_anonymous_id_from_values(
+            tags.get('PatientName', ''), tags.get('PatientID', ''), tags.get('PatientBirthDate', '')
+        )
+
+        replace = {
+            keyword: value for keyword, value in self._get_replacements(anonymous_id).items()
+            if keyword in self._REQUIRED_FIELDS or keyword in tags
+        }
+        return {"Replace": replace, "Remove": list(self._PERSONAL_FIELDS)}
+
     def generate_anonymous_id(self, dataset) -> str:
         try:
-            patient_name = str(getattr(dataset, 'PatientName', '')).strip()
-            patient_id = str(getattr(dataset, 'PatientID', '')).strip()
-            birth_date = str(getattr(dataset, 'PatientBirthDate', '')).strip()
-
-            unique_string = f"{patient_name}|{patient_id}|{birth_date}"
-            hash_value = hashlib.sha256(unique_string.encode('utf-8')).hexdigest()
-            return f"ANON{abs(int(hash_value[:8], 16)) % 999999:06d}"
+            return self.generate_anonymous_id_from_values(
+                str(getattr(dataset, 'PatientName', '')),
+                str(getattr(dataset, 'PatientID', '')),
+                str(getattr(dataset, 'PatientBirthDate', ''))
+            )
 
         except Exception:
             import uuid
-            return f"ANON{abs(hash(str(uuid.uuid4()))) % 999999:06d}"
\ No newline at end of file
+            return f"ANON{abs(hash(str(uuid.uuid4()))) % 999999:06d}"
+
+    def generate_anonymous_id_from_values(self, patient_name: str, patient_id: str, birth_date: str) -> str:
+        unique_string = f"{patient_name.strip()}|{patient_id.strip()}|{birth_date.strip()}"
+        hash_value = hashlib.sha256(unique_string.encode('utf-8')).hexdigest()
+        return f"ANON{abs(int(hash_value[:8], 16)) % 999999:06d}"
+
+    def _get_replacements(self, anonymous_id: str) -> Dict[str, str]:
+        return {
+            'PatientName': f"ANONYMOUS^{anonymous_id[-6:]}",
+            'PatientID': anonymous_id,
+            'PatientBirthDate': "",
+            'PatientSex': "",
+            'PatientAge': "",
+            'InstitutionName': "ANONYMOUS_HOSPITAL",
+            'ReferringPhysicianName': "ANONYMOUS^DOCTOR",
+            'AccessionNumber': f"ACC{anonymous_id[-6:]}",
+            'StudyID': f"STUDY{anonymous_id[-6:]}",
+        }
@@ -0,0 +1,173 @@
+import io
+import struct
+import tarfile
+import zipfile
+from typing import Dict, Any, Optional, Tuple, Iterator, Callable, BinaryIO
+
+import pydicom
+
+from app.services.dicom_ingest import parsed_instance
+
+# Instantele din arhive sunt indexate fara extragere; calea lor este "<arhiva>::<membru>"
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz")
+_MEMBER_SEPARATOR = "::"
+
+# Header-ul DICOM este citit pe bucati din membru, pana cand dcmread ajunge la pixel data
+_HEADER_CHUNK_SIZE = 64 * 1024
+_MAX_HEADER_SIZE = 16 * 1024 * 1024
+
+
+def is_dicom_archive(file_path: str) -> bool:
+    return file_path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def archive_member_path(archive_path: str, member_name: str) -> str:
+    return f"{archive_path}{_MEMBER_SEPARATOR}{member_name}"
+
+
+def split_archive_member_path(file_path: str) -> Tuple[str, Optional[str]]:
+    archive_path, separator, member_name = file_path.partition(_MEMBER_SEPARATOR)
+    if not separator or not is_dicom_archive(archive_path):
+        return file_path, None
+    return archive_path, member_name
+
+
+def read_dicom_header(file_path: str, stream: BinaryIO) -> Optional[Dict[str, Any]]:
+    # Membrii fara preambulul DICM sunt ignorati fara sa citim mai mult de 132 de octeti
+    preamble = stream.read(132)
+    if len(preamble) < 132 or preamble[128:132] != b"DICM":
+        return None
+
+    buffer = bytearray(preamble)
+    chunk_size = _HEADER_CHUNK_SIZE
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        exhausted = len(chunk) < chunk_size
+
+        header = io.BytesIO(buffer)
+        try:
+            dataset = pydicom.dcmread(header, stop_before_pixels=True)
+            # dcmread s-a oprit inainte de sfarsitul bufferului, deci header-ul a fost citit complet
+            if exhausted or header.tell() < len(buffer):
+                return parsed_instance(file_path, dataset)
+        except Exception:
+            if exhausted:
+                return None
+
+        if len(buffer) >= _MAX_HEADER_SIZE:
+            return None
+        chunk_size *= 2
+
+
+def iter_archive_headers(archive_path: str, is_cancelled: Optional[Callable[[], bool]] = None
+                         ) -> Iterator[Tuple[str, Optional[Dict[str, Any]], Optional[Tuple[int, int]]]]:
+    # (cale membru, header sau None, (offset, dimensiune) pentru membrii TAR)
+    if archive_path.lower().endswith(".zip"):
+        yield from _iter_zip_headers(archive_path, is_cancelled)
+    else:
+        yield from _iter_tar_headers(archive_path, is_cancelled)
+
+
+def _iter_zip_headers(archive_path: str, is_cancelled: Optional[Callable[[], bool]]):
+    with zipfile.ZipFile(archive_path) as archive:
+        for info in archive.infolist():
+            if is_cancelled and is_cancelled():
+                return
+            if info.is_dir():
+                continue
+
+            member_path = archive_member_path(archive_path, info.filename)
+            with archive.open(info) as member:
+                yield member_path, read_dicom_header(member_path, member), None
+
+
+def _iter_tar_headers(archive_path: str, is_cancelled: Optional[Callable[[], bool]]):
+    # Membrii sunt parcursi in ordine; un .tar.gz este decomprimat o singura data, fara seek inapoi
+    with tarfile.open(archive_path, "r:*") as archive:
+        for info in archive:
+            if is_cancelled and is_cancelled():
+                return
+            if not info.isfile():
+                continue
+
+            member_path = archive_member_path(archive_path, info.name)
+            with archive.extractfile(info) as member:
+                yield member_path, read_dicom_header(member_path, member), (info.offset_data, info.size)
+
+
+def open_archive_member(file_path: str, location: Optional[Tuple[int, int]] = None) -> BinaryIO:
+    archive_path, member_name = split_archive_member_path(file_path)
+    if member_name is None:
+        raise FileNotFoundError(f"Not an archive member: {file_path}")
+
+    if archive_path.lower().endswith(".zip"):
+        archive = zipfile.ZipFile(archive_path)
+        try:
+            info = archive.getinfo(member_name)
+            return _ArchiveMemberFile(archive.open(info), archive, info.file_size)
+        except Exception:
+            archive.close()
+            raise
+
+    archive = tarfile.open(archive_path, "r:*")
+    try:
+        if location is None:
+            info = archive.getmember(member_name)
+        else:
+            # Offset-ul retinut la import evita parcurgerea tuturor header-elor din arhiva
+            info = tarfile.TarInfo(member_name)
+            info.offset_data, info.size = location
+        return _ArchiveMemberFile(archive.extractfile(info), archive, info.size)
+    except Exception:
+        archive.close()
+        raise
+
+
+def archive_member_range(file_path: str, location: Optional[Tuple[int, int]] = None) -> Optional[Tuple[str, int, int]]:
+    # (arhiva, offset, dimensiune) pentru membrii stocati necomprimati; None daca datele nu sunt contigue in arhiva
+    archive_path, member_name = split_archive_member_path(file_path)
+    if member_name is None:
+        return None
+
+    lower_path = archive_path.lower()
+    if lower_path.endswith(".tar"):
+        return (archive_path, *location) if location is not None else None
+    if not lower_path.endswith(".zip"):
+        return None
+
+    with zipfile.ZipFile(archive_path) as archive:
+        info = archive.getinfo(member_name)
+        if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+            return None
+
+        # Datele incep dupa header-ul local, al carui camp extra poate diferi de cel din directorul central
+        archive.fp.seek(info.header_offset)
+        local_header = archive.fp.read(30)
+        if len(local_header) < 30 or local_header[:4] != b"PK\x03\x04":
+            return None
+        name_length, extra_length = struct.unpack("<HH", local_header[26:30])
+        return archive_path, info.header_offset + 30 + name_length + extra_length, info.file_size
+
+
+class _ArchiveMemberFile:
+    # Fluxul membrului inchide si arhiva din care a fost deschis
+    def __init__(self, member: BinaryIO, archive, length: int):
+        self._member = member
+        self._archive = archive
+        self.length = length
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._member, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        try:
+            self._member.close()
+        finally:
+            self._archive.close()
@@ -0,0 +1,179 @@
+import hashlib
+import os
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+import pydicom
+
+# Functiile din acest modul ruleaza si in procesele din ProcessPoolExecutor, deci trebuie sa ramana
+# la nivel de modul si sa nu depinda de Container sau de starea serviciilor
+
+
+def local_resource_id(uid: str) -> str:
+    # ID stabil intre sesiuni si procese; hash() din Python este randomizat la fiecare pornire
+    return "local_" + hashlib.sha256(uid.encode("utf-8")).hexdigest()[:20]
+
+
+def format_dicom_date(date_str: str) -> str:
+    if not date_str or len(date_str) < 8:
+        return "Unknown"
+
+    try:
+        return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:8]}"
+    except Exception:
+        return date_str
+
+
+def extract_study_metadata(dataset) -> Dict[str, Any]:
+    try:
+        return {
+            "Patient Name": str(getattr(dataset, 'PatientName', 'N/A')),
+            "CNP": str(getattr(dataset, 'PatientID', 'N/A')),
+            "Patient Birth Date": format_dicom_date(getattr(dataset, 'PatientBirthDate', '')),
+            "Patient Sex": str(getattr(dataset, 'PatientSex', 'N/A')),
+            "Patient Age": str(getattr(dataset, 'PatientAge', 'N/A')),
+            "Study Date": format_dicom_date(getattr(dataset, 'StudyDate', '')),
+            "Study Instance UID": str(getattr(dataset, 'StudyInstanceUID', 'N/A')),
+            "Accession Number": str(getattr(dataset, 'AccessionNumber', 'N/A')),
+            "Referring Physician Name": str(getattr(dataset, 'ReferringPhysicianName', 'N/A')),
+            "Description": str(getattr(dataset, 'StudyDescription', 'Local DICOM Study')),
+            "Series Status": "LOCAL",
+            "Source": "Local File"
+        }
+    except Exception as e:
+        print(f"Warning: Error extracting metadata: {e}")
+        return {
+            "Patient Name": "N/A",
+            "Patient Birth Date": "N/A",
+            "Patient Sex": "N/A",
+            "Patient Age": "N/A",
+            "Study Date": datetime.now().strftime("%Y-%m-%d"),
+            "Study Instance UID": "N/A",
+            "Description": "Local DICOM Study",
+            "Series Status": "LOCAL",
+            "Source": "Local File"
+        }
+
+
+def parse_dicom_header(file_path: str) -> Optional[Dict[str, Any]]:
+    # Un singur dcmread, fara pixel data; None pentru fisierele care nu sunt DICOM
+    try:
+        with open(file_path, 'rb') as f:
+            dataset = pydicom.dcmread(f, stop_before_pixels=True)
+    except Exception:
+        return None
+
+    return parsed_instance(file_path, dataset)
+
+
+def parsed_instance(file_path: str, dataset) -> Optional[Dict[str, Any]]:
+    # DICOMDIR si alte fisiere fara instanta de imagine
+    if not hasattr(dataset, 'SOPInstanceUID') and not hasattr(dataset, 'StudyInstanceUID'):
+        return None
+
+    return {
+        "file_path": file_path,
+        "metadata": extract_study_metadata(dataset),
+        "study_instance_uid": str(getattr(dataset, 'StudyInstanceUID', '')) or None,
+        "sop_instance_uid": str(getattr(dataset, 'SOPInstanceUID', '')) or None,
+        "series_instance_uid": str(getattr(dataset, 'SeriesInstanceUID', '')) or None,
+        "instance_number": _instance_number(dataset)
+    }
+
+
+def _instance_number(dataset) -> Any:
+    try:
+        return int(getattr(dataset, 'InstanceNumber', 1))
+    except (TypeError, ValueError):
+        return 1
+
+
+def find_dicomdir(folder_path: str, file_names: List[str]) -> Optional[str]:
+    # Pe CD-uri numele poate aparea cu litere mici, in functie de cum a fost montat discul
+    for file_name in file_names:
+        if file_name.upper() == "DICOMDIR":
+            return os.path.join(folder_path, file_name)
+    return None
+
+
+def parse_dicomdir(dicomdir_path: str) -> Optional[List[Dict[str, Any]]]:
+    # Indexul este construit din inregistrarile DICOMDIR (PATIENT/STUDY/SERIES/IMAGE), fara sa deschidem imaginile;
+    # None daca DICOMDIR este invalid, caz in care fisierele sunt citite unul cate unul
+    try:
+        dicomdir = pydicom.dcmread(dicomdir_path)
+        records = {record.seq_item_tell: record for record in dicomdir.DirectoryRecordSequence}
+        first_offset = dicomdir.OffsetOfTheFirstDirectoryRecordOfTheRootDirectoryEntity
+    except Exception as e:
+        print(f"Warning: Could not read DICOMDIR {dicomdir_path}: {e}")
+        return None
+
+    root = os.path.dirname(dicomdir_path)
+    parsed_instances = []
+    series_attributes: Dict[tuple, tuple] = {}
+    visited = set()
+
+    # Inregistrarile sunt legate prin offset-uri: urmatoarea de pe acelasi nivel si prima de pe nivelul inferior
+    pending = [(first_offset, ())]
+    while pending:
+        offset, parents = pending.pop()
+        record = records.get(offset)
+        if record is None or offset in visited:
+            continue
+        visited.add(offset)
+
+        lineage = parents + (record,)
+        if record.get('OffsetOfTheNextDirectoryRecord'):
+            pending.append((record.OffsetOfTheNextDirectoryRecord, parents))
+        if record.get('OffsetOfReferencedLowerLevelDirectoryEntity'):
+            pending.append((record.OffsetOfReferencedLowerLevelDirectoryEntity, lineage))
+
+        if 'ReferencedFileID' not in record or 'ReferencedSOPInstanceUIDInFile' not in record:
+            continue
+
+        try:
+            # Pacientul, studiul si seria sunt comune pentru toate imaginile din serie
+            series_key = tuple(id(parent) for parent in parents)
+            if series_key not in series_attributes:
+                series = _DirectoryRecordLineage(parents)
+                series_attributes[series_key] = (
+                    extract_study_metadata(series),
+                    str(getattr(series, 'StudyInstanceUID', '')) or None,
+                    str(getattr(series, 'SeriesInstanceUID', '')) or None
+                )
+            metadata, study_instance_uid, series_instance_uid = series_attributes[series_key]
+
+            parsed_instances.append({
+                "file_path": _resolve_referenced_file(root, record.ReferencedFileID),
+                "metadata": metadata,
+                "study_instance_uid": study_instance_uid,
+                "sop_instance_uid": str(record.ReferencedSOPInstanceUIDInFile) or None,
+                "series_instance_uid": series_instance_uid,
+                "instance_number": _instance_number(record)
+            })
+        except Exception as e:
+            print(f"Warning: Skipping DICOMDIR record: {e}")
+
+    return parsed_instances
+
+
+class _DirectoryRecordLineage:
+    # Atributele sunt cautate in inregistrarea imaginii si apoi in cele parinte (serie, studiu, pacient)
+    def __init__(self, records):
+        self._records = records
+
+    def __getattr__(self, keyword: str) -> Any:
+        for record in reversed(self._records):
+            if keyword in record:
+                return record[keyword].value
+        raise AttributeError(keyword)
+
+
+def _resolve_referenced_file(root: str, file_id) -> str:
+    components = [file_id] if isinstance(file_id, str) else list(file_id)
+    file_path = os.path.join(root, *components)
+    if os.path.exists(file_path):
+        return file_path
+
+    # ReferencedFileID este scris cu majuscule, dar sistemul de fisiere poate fi case-sensitive
+    lower_path = os.path.join(root, *[component.lower() for component in components])
+    return lower_path if os.path.exists(lower_path) else file_path
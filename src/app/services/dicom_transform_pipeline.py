@@ -0,0 +1,235 @@
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO
+from typing import Callable, List, Optional, Dict, BinaryIO, Any
+
+import pydicom
+from pydicom.dataset import Dataset
+from pydicom.tag import Tag
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+
+from app.core.exceptions.pacs_exceptions import PacsDataError
+
+
+class ExaminationResultTransform:
+    PRIVATE_CREATOR = 'MEDICAL_APP_RESULT'
+
+    # Image Comments (0020,4000) accepta maxim 10240 caractere
+    IMAGE_COMMENTS_LIMIT = 10240
+    PRIVATE_TAG_LIMIT = 65534
+    CHUNK_SIZE = 65000
+    MAX_CHUNKS = 10
+
+    def __init__(self, examination_result: str, add_study_comments: bool = True):
+        self._examination_result = examination_result
+        self._add_study_comments = add_study_comments
+
+    def __call__(self, dataset: Dataset):
+        examination_result = self._examination_result
+
+        # PRINCIPAL: Image Comments (0020,4000)
+        dataset.ImageComments = self._image_comments()
+
+        dataset.add_new(0x77770010, 'LO', self.PRIVATE_CREATOR)
+
+        chunks = self._chunks()
+        for i, chunk in enumerate(chunks):
+            dataset.add_new(Tag(0x7777, 0x1001 + i), 'LT', chunk)  # 0x77771001, 0x77771002, etc.
+
+        if len(chunks) > 1:
+            dataset.add_new(0x77770020, 'IS', str(len(chunks)))
+
+        if self._add_study_comments and not hasattr(dataset, 'StudyComments'):
+            try:
+                dataset.add_new(0x00324000, 'LT', f"EXAMINATION RESULT: {examination_result[:200]}")
+            except Exception:
+                pass
+
+    def orthanc_replacements(self) -> Dict[str, str]:
+        # Aceleasi tag-uri pentru /modify din Orthanc (cu "PrivateCreator": PRIVATE_CREATOR).
+        # StudyComments nu este inclus: /modify nu poate verifica daca exista deja in fiecare instanta
+        replacements = {"ImageComments": self._image_comments()}
+
+        chunks = self._chunks()
+        for i, chunk in enumerate(chunks):
+            replacements[f"7777,{0x1001 + i:04X}"] = chunk
+
+        if len(chunks) > 1:
+            replacements["7777,0020"] = str(len(chunks))
+
+        return replacements
+
+    def _image_comments(self) -> str:
+        if len(self._examination_result) <= self.IMAGE_COMMENTS_LIMIT:
+            return self._examination_result
+
+        # Pentru texte lungi, trunchiază și adaugă notificare
+        return self._examination_result[:10200] + "\n\n[TRUNCATED - See private tags]"
+
+    def _chunks(self) -> List[str]:
+        examination_result = self._examination_result
+        if len(examination_result) <= self.PRIVATE_TAG_LIMIT:
+            return [examination_result]
+
+        chunks = [examination_result[i:i + self.CHUNK_SIZE]
+                  for i in range(0, len(examination_result), self.CHUNK_SIZE)]
+        return chunks[:self.MAX_CHUNKS]
+
+
+class DicomTransformPipeline:
+    _COPY_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, transforms: Optional[List[Callable[[Dataset], None]]] = None):
+        self._transforms = list(transforms or [])
+
+    def add(self, transform: Callable[[Dataset], None]) -> 'DicomTransformPipeline':
+        self._transforms.append(transform)
+        return self
+
+    def is_empty(self) -> bool:
+        return not self._transforms
+
+    def apply_dataset(self, dataset: Dataset) -> Dataset:
+        for transform in self._transforms:
+            transform(dataset)
+        return dataset
+
+    def apply(self, dicom_data: bytes) -> bytes:
+        if self.is_empty():
+            return dicom_data
+
+        # Un singur parse si o singura serializare, indiferent de numarul de transformari
+        try:
+            dataset = self.apply_dataset(pydicom.dcmread(BytesIO(dicom_data)))
+
+            output = BytesIO()
+            dataset.save_as(output, write_like_original=False)
+            return output.getvalue()
+        except Exception as e:
+            raise PacsDataError(f"Nu am putut procesa fisierul DICOM: {e}")
+
+    def apply_file(self, source: BinaryIO, spool_max_memory: int) -> BinaryIO:
+        if self.is_empty():
+            return source
+
+        # Transformarile modifica doar header-ul; pixel data nu este incarcat in memorie
+        output = tempfile.SpooledTemporaryFile(max_size=spool_max_memory)
+        spliced = False
+        try:
+            dataset = pydicom.dcmread(source, stop_before_pixels=True)
+
+            if dataset.file_meta.get("TransferSyntaxUID") == DeflatedExplicitVRLittleEndian:
+                # Corpul comprimat nu poate fi copiat partial
+                source.seek(0)
+                output.write(self.apply(source.read()))
+            else:
+                # dcmread se opreste la inceputul elementului Pixel Data
+                pixel_data_offset = source.tell()
+                self.apply_dataset(dataset)
+                dataset.save_as(output, write_like_original=False)
+
+                if source.seekable():
+                    # Pixel data este citit direct din fisierul sursa in timpul trimiterii, fara copie intermediara
+                    output.seek(0)
+                    spliced = True
+                    return _SplicedDicomFile(output, source, pixel_data_offset)
+
+                source.seek(pixel_data_offset)
+                shutil.copyfileobj(source, output, self._COPY_CHUNK_SIZE)
+        except Exception as e:
+            output.close()
+            raise PacsDataError(f"Nu am putut procesa fisierul DICOM: {e}")
+        finally:
+            if not spliced:
+                source.close()
+
+        output.seek(0)
+        return output
+
+    def apply_archive(self, archive: BinaryIO, spool_max_memory: int) -> BinaryIO:
+        if self.is_empty():
+            return archive
+
+        # Fiecare membru este transformat in memorie si scris in noua arhiva, fara extragere pe disc
+        output = tempfile.SpooledTemporaryFile(max_size=spool_max_memory)
+        try:
+            with zipfile.ZipFile(archive) as source, zipfile.ZipFile(output, "w", zipfile.ZIP_STORED) as target:
+                for member in source.infolist():
+                    if member.is_dir() or os.path.basename(member.filename).upper() == "DICOMDIR":
+                        continue
+                    target.writestr(member.filename, self.apply(source.read(member)))
+        except zipfile.BadZipFile as e:
+            output.close()
+            raise PacsDataError(f"Arhiva DICOM invalida: {e}")
+
+        output.seek(0)
+        return output
+
+
+class _SplicedDicomFile:
+    # Header-ul transformat urmat de restul fisierului sursa, incepand cu elementul Pixel Data
+    def __init__(self, header: BinaryIO, source: BinaryIO, pixel_data_offset: int):
+        self._header = header
+        self._source = source
+        self._pixel_data_offset = pixel_data_offset
+
+        header.seek(0, 2)
+        self._header_length = header.tell()
+        source_length = getattr(source, "length", None)
+        if source_length is None:
+            source.seek(0, 2)
+            source_length = source.tell()
+        self.length = self._header_length + source_length - pixel_data_offset
+        self._position = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length - self._position
+
+        chunks = []
+        while size > 0 and self._position < self.length:
+            if self._position < self._header_length:
+                self._header.seek(self._position)
+                data = self._header.read(min(size, self._header_length - self._position))
+            else:
+                self._source.seek(self._pixel_data_offset + self._position - self._header_length)
+                data = self._source.read(size)
+            if not data:
+                break
+
+            chunks.append(data)
+            size -= len(data)
+            self._position += len(data)
+
+        return b"".join(chunks)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        if whence == 1:
+            offset += self._position
+        elif whence == 2:
+            offset += self.length
+        self._position = max(0, offset)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def seekable(self) -> bool:
+        return True
+
+    def readable(self) -> bool:
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info: Any):
+        self.close()
+
+    def close(self):
+        try:
+            self._header.close()
+        finally:
+            self._source.close()
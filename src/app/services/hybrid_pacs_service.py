@@ -1,4 +1,5 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Callable
+from app.core.entities.transfer import InstanceTransferResult
 from app.core.interfaces.pacs_interface import IPacsService
 from app.services.local_file_service import LocalFileService
 from app.services.pacs_service import PacsService
@@ -28,6 +29,58 @@ class HybridPacsService(IPacsService):
 
         return studies
 
+    def get_all_studies_with_metadata(self) -> List[Dict[str, Any]]:
+        studies = []
+
+        try:
+            studies.extend(self._pacs_service.get_all_studies_with_metadata())
+        except Exception as e:
+            print(f"Warning: Could not load PACS studies: {e}")
+
+        try:
+            studies.extend(self._local_file_service.get_local_studies_page(
+                0, self._local_file_service.get_local_studies_count()
+            ))
+        except Exception as e:
+            print(f"Warning: Could not load local studies: {e}")
+
+        return studies
+
+    def get_studies_page(self, since: Any, limit: int) -> Dict[str, Any]:
+        # Local studies are listed first, followed by the PACS studies
+        # since este 0 pentru prima pagina, apoi (pozitia in studiile locale, pozitia in PACS) din pagina anterioara;
+        # pozitiile separate nu se decaleaza cand studiile locale se schimba intre doua pagini
+        local_since, pacs_since = since or (0, 0)
+        local_count = self._local_file_service.get_local_studies_count()
+        studies = []
+
+        if local_since < local_count:
+            try:
+                local_studies = self._local_file_service.get_local_studies_page(local_since, limit)
+                studies.extend(local_studies)
+                local_since += len(local_studies)
+            except Exception as e:
+                print(f"Warning: Could not load local studies: {e}")
+                local_since = local_count
+
+        remaining = limit - len(studies)
+        has_more = True
+        if remaining > 0:
+            try:
+                page = self._pacs_service.get_studies_page(pacs_since, remaining)
+                studies.extend(page["studies"])
+                pacs_since = page["next_since"]
+                has_more = page["has_more"]
+            except Exception as e:
+                print(f"Warning: Could not load PACS studies: {e}")
+                has_more = False
+
+        return {"studies": studies, "next_since": (local_since, pacs_since), "has_more": has_more}
+
+    def get_study_changes(self) -> Dict[str, Any]:
+        # Studiile locale se reincarca prin LocalFileManagerWidget.studies_updated
+        return self._pacs_service.get_study_changes()
+
     def get_study_metadata(self, study_id: str) -> Dict[str, Any]:
         if self._is_local_study(study_id):
             return self._local_file_service.get_local_study_metadata(study_id)
@@ -47,20 +100,30 @@ class HybridPacsService(IPacsService):
             return self._pacs_service.get_dicom_file(instance_id)
 
     def send_study_to_pacs(self, study_id: str, target_url: str, target_auth: tuple,
-                           examination_result: str = None) -> bool:
+                           examination_result: str = None, skip_instance_ids: Optional[Set[str]] = None,
+                           on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                           is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
         if self._is_local_study(study_id):
             print(f"HybridPacsService: Sending local study {study_id} (anonymized)")
             return self._local_file_service.send_local_study_to_pacs(
                 study_id=study_id,
                 target_url=target_url,
                 target_auth=target_auth,
-                examination_result=examination_result
+                examination_result=examination_result,
+                skip_instance_ids=skip_instance_ids,
+                on_instance_done=on_instance_done,
+                is_cancelled=is_cancelled
             )
         else:
             return self._pacs_service.send_study_to_pacs(
-                study_id, target_url, target_auth, examination_result, anonymize=True
+                study_id, target_url, target_auth, examination_result, anonymize=True,
+                skip_instance_ids=skip_instance_ids, on_instance_done=on_instance_done, is_cancelled=is_cancelled
             )
 
+    def begin_transfer_session(self):
+        # Serviciul de transfer este comun pentru studiile PACS si cele locale
+        self._pacs_service.begin_transfer_session()
+
     def get_examination_result_from_dicom(self, instance_id: str) -> str:
         if self._is_local_instance(instance_id):
             # Try to read from DICOM file first, fallback to cache
@@ -78,8 +141,20 @@ class HybridPacsService(IPacsService):
     def load_local_dicom_file(self, file_path: str) -> Dict[str, Any]:
         return self._local_file_service.load_dicom_file(file_path)
 
-    def load_local_dicom_folder(self, folder_path: str) -> List[Dict[str, Any]]:
-        return self._local_file_service.load_dicom_folder(folder_path)
+    def load_local_dicom_folder(self, folder_path: str,
+                                progress_callback: Optional[Callable[[int, int], None]] = None,
+                                is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        return self._local_file_service.load_dicom_folder(folder_path, progress_callback, is_cancelled)
+
+    def load_local_dicom_archive(self, archive_path: str,
+                                 is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        return self._local_file_service.load_dicom_archive(archive_path, is_cancelled)
+
+    def get_watch_folders(self) -> List[str]:
+        return self._local_file_service.get_watch_folders()
+
+    def scan_watch_folders(self, is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        return self._local_file_service.scan_watch_folders(is_cancelled)
 
     def clear_local_studies(self):
         self._local_file_service.clear_local_studies()
@@ -90,7 +165,7 @@ class HybridPacsService(IPacsService):
         return False
 
     def get_local_studies_count(self) -> int:
-        return len(self._local_file_service.get_all_local_studies())
+        return self._local_file_service.get_local_studies_count()
 
     def add_examination_result_to_study(self, study_id: str, examination_result: str):
         if self._is_local_study(study_id):
@@ -100,19 +175,7 @@ class HybridPacsService(IPacsService):
         if self._is_local_study(study_id):
             return self._local_file_service.get_examination_result_from_local_study(study_id)
         else:
-            # For PACS studies, try to get from first instance
-            try:
-                instances = self.get_study_instances(study_id)
-                for instance in instances:
-                    instance_id = instance.get("ID")
-                    if instance_id:
-                        result = self._pacs_service.get_examination_result_from_dicom(instance_id)
-                        if result:
-                            return result
-            except Exception as e:
-                print(f"Error getting examination result from PACS study {study_id}: {e}")
-
-            return ""
+            return self._pacs_service.get_examination_result_from_study(study_id)
 
     def _is_local_study(self, study_id: str) -> bool:
         return study_id.startswith("local_")
@@ -121,9 +184,4 @@ class HybridPacsService(IPacsService):
         return instance_id.startswith("local_")
 
     def _get_study_id_for_local_instance(self, instance_id: str) -> Optional[str]:
-        for study_id in self._local_file_service.get_all_local_studies():
-            instances = self._local_file_service.get_local_study_instances(study_id)
-            for instance in instances:
-                if instance.get("ID") == instance_id:
-                    return study_id
-        return None
\ No newline at end of file
+        return self._local_file_service.get_study_id_for_instance(instance_id) or None
\ No newline at end of file
@@ -1,192 +1,377 @@
 import os
+import re
+import mmap
+import time
 import json
 import uuid
-import requests
-from io import BytesIO
-from typing import List, Dict, Any, Tuple
-from datetime import datetime
-from requests.auth import HTTPBasicAuth
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Tuple, Optional, Set, Callable, BinaryIO, Iterator
 import pydicom
 
 from app.core.interfaces.local_file_interface import ILocalFileService
 from app.core.exceptions.pacs_exceptions import PacsDataError
+from app.config.settings import Settings
+from app.core.entities.transfer import InstanceTransferResult, InstanceFingerprint
+from app.services.study_transfer_service import StudyTransferService
+from app.services.dicom_transform_pipeline import DicomTransformPipeline, ExaminationResultTransform
+from app.services.dicom_ingest import (
+    parse_dicom_header, parse_dicomdir, find_dicomdir, extract_study_metadata, format_dicom_date, local_resource_id
+)
+from app.services.dicom_archive import (
+    is_dicom_archive, iter_archive_headers, open_archive_member, split_archive_member_path, archive_member_range
+)
 
 
 class LocalFileService(ILocalFileService):
+    _LEGACY_ID_PATTERN = re.compile(r"^local_\d{1,6}$")
 
     def __init__(self, cache_dir: str = "local_studies_cache"):
         self.cache_dir = cache_dir
-        self.local_studies: Dict[str, Dict[str, Any]] = {}  # study_id -> study_data
-        self.study_instances: Dict[str, List[Dict[str, Any]]] = {}  # study_id -> instances
-        self.instance_files: Dict[str, str] = {}  # instance_id -> file_path
-        self.examination_results: Dict[str, str] = {}  # study_id -> examination_result
-
-        os.makedirs(cache_dir, exist_ok=True)
 
         from app.di.container import Container
         self._anonymizer = Container.get_dicom_anonymizer_service()
+        self._http_client = Container.get_http_client()
+        self._transfer_service = Container.get_study_transfer_service()
+        self._store = Container.get_local_study_store()
+
+        # Fisierele din folderele urmarite care inca se scriu: cale -> (dimensiune, mtime) la scanarea anterioara
+        self._watch_pending: Dict[str, Tuple[int, int]] = {}
 
-        self._load_cache()
+        self._migrate_json_cache()
+        self._migrate_legacy_ids()
 
     def load_dicom_file(self, file_path: str) -> Dict[str, Any]:
         try:
             if not os.path.exists(file_path):
                 raise FileNotFoundError(f"File not found: {file_path}")
 
-            dataset = pydicom.dcmread(file_path)
-            metadata = self._extract_metadata_from_dataset(dataset)
-            study_instance_uid = getattr(dataset, 'StudyInstanceUID', str(uuid.uuid4()))
-            study_id = f"local_{abs(hash(study_instance_uid)) % 1000000}"
-            instance_id = f"local_{abs(hash(getattr(dataset, 'SOPInstanceUID', str(uuid.uuid4())))) % 1000000}"
-
-            self.local_studies[study_id] = metadata
-            self.instance_files[instance_id] = file_path
-
-            if study_id not in self.study_instances:
-                self.study_instances[study_id] = []
-
-            instance_data = {
-                "ID": instance_id,
-                "StudyID": study_id,
-                "FilePath": file_path,
-                "SOPInstanceUID": getattr(dataset, 'SOPInstanceUID', instance_id),
-                "SeriesInstanceUID": getattr(dataset, 'SeriesInstanceUID', str(uuid.uuid4())),
-                "InstanceNumber": getattr(dataset, 'InstanceNumber', 1)
-            }
-
-            if not any(inst["ID"] == instance_id for inst in self.study_instances[study_id]):
-                self.study_instances[study_id].append(instance_data)
+            file_path = self._normalize_path(file_path)
+            fingerprint = self._get_file_fingerprint(file_path)
+            parsed = parse_dicom_header(file_path)
+            if parsed is None:
+                raise PacsDataError("Not a valid DICOM file")
 
-            self._save_cache()
-
-            return {
-                "study_id": study_id,
-                "metadata": metadata,
-                "instance_id": instance_id
-            }
+            studies, instances = {}, []
+            result = self._merge_parsed_instance(parsed, studies, instances)
+            files = [(file_path, *fingerprint, result["instance_id"])] if fingerprint else []
+            self._store.add_instances(studies, instances, files)
+            return result
 
         except Exception as e:
             raise PacsDataError(f"Error loading DICOM file {file_path}: {e}")
 
-    def load_dicom_folder(self, folder_path: str) -> List[Dict[str, Any]]:
+    def load_dicom_folder(self, folder_path: str,
+                          progress_callback: Optional[Callable[[int, int], None]] = None,
+                          is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
         if not os.path.exists(folder_path):
             raise PacsDataError(f"Folder not found: {folder_path}")
 
-        loaded_studies = []
-        study_files = {}  # study_id -> list of files
+        folder_path = self._normalize_path(folder_path)
+        loaded_studies: Dict[str, Dict[str, Any]] = {}
+        file_paths = []
+        indexed_paths = []
 
         for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                file_path = os.path.join(root, file)
+            dicomdir_path = find_dicomdir(root, files)
+            parsed_instances = parse_dicomdir(dicomdir_path) if dicomdir_path else None
+            if parsed_instances is None:
+                file_paths.extend(os.path.join(root, file) for file in files)
+                continue
+
+            # Folderul este descris complet de DICOMDIR; celelalte fisiere (viewer, autorun) nu sunt citite
+            dirs[:] = []
+            for parsed in parsed_instances:
+                parsed["file_path"] = self._normalize_path(parsed["file_path"])
+            fingerprints = {parsed["file_path"]: self._get_file_fingerprint(parsed["file_path"])
+                            for parsed in parsed_instances}
+            self._store_parsed_instances(
+                [(parsed["file_path"], parsed) for parsed in parsed_instances if fingerprints[parsed["file_path"]]],
+                fingerprints, loaded_studies
+            )
+            indexed_paths.extend(fingerprints)
+            indexed_paths.append(dicomdir_path)
+
+        self._merge_loaded_studies(loaded_studies, self.load_dicom_files(file_paths, progress_callback, is_cancelled))
+
+        # Fisierele sterse de pe disc de la importul anterior sunt scoase din index
+        if not (is_cancelled and is_cancelled()):
+            self.remove_missing_files(folder_path, file_paths + indexed_paths)
+
+        return list(loaded_studies.values())
+
+    def get_changed_files(self, file_paths: List[str]) -> Dict[str, Optional[Tuple[int, int]]]:
+        changed, _ = self._split_changed_files(
+            [self._normalize_path(file_path) for file_path in file_paths], skip_ignored=True
+        )
+        return changed
+
+    def remove_missing_files(self, folder_path: str, file_paths: List[str]) -> int:
+        removed = self._store.remove_missing_files(
+            self._normalize_path(folder_path), {self._normalize_path(file_path) for file_path in file_paths}
+        )
+        if removed:
+            print(f"Removed {removed} deleted files from the local index")
+        return removed
+
+    def load_dicom_files(self, file_paths: List[str],
+                         progress_callback: Optional[Callable[[int, int], None]] = None,
+                         is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        loaded_studies: Dict[str, Dict[str, Any]] = {}
+        file_paths = [self._normalize_path(file_path) for file_path in file_paths]
+        total = len(file_paths)
+
+        # Arhivele sunt citite membru cu membru, fara extragere pe disc
+        archive_paths = [file_path for file_path in file_paths if is_dicom_archive(file_path)]
+        file_paths = [file_path for file_path in file_paths if not is_dicom_archive(file_path)]
+
+        fingerprints, unchanged_study_ids = self._split_changed_files(file_paths)
+        changed_paths = list(fingerprints)
+        for study_id in unchanged_study_ids:
+            self._count_loaded_file(loaded_studies, study_id, None)
+
+        processed = len(file_paths) - len(changed_paths)
+        if progress_callback and processed:
+            progress_callback(processed, total)
+
+        for batch in self._parse_dicom_headers(changed_paths, is_cancelled):
+            self._store_parsed_instances(batch, fingerprints, loaded_studies)
+
+            processed += len(batch)
+            if progress_callback:
+                progress_callback(processed, total)
+
+        for archive_path in archive_paths:
+            if is_cancelled and is_cancelled():
+                break
+
+            try:
+                self._merge_loaded_studies(loaded_studies, self.load_dicom_archive(archive_path, is_cancelled))
+            except PacsDataError as e:
+                print(f"Warning: {e}")
+
+            processed += 1
+            if progress_callback:
+                progress_callback(processed, total)
+
+        return list(loaded_studies.values())
+
+    def load_dicom_archive(self, archive_path: str,
+                           is_cancelled: Optional[Callable[[], bool]] = None) -> List[Dict[str, Any]]:
+        if not os.path.isfile(archive_path):
+            raise PacsDataError(f"Archive not found: {archive_path}")
+
+        archive_path = self._normalize_path(archive_path)
+        loaded_studies: Dict[str, Dict[str, Any]] = {}
+
+        # O arhiva nemodificata de la importul anterior nu mai este parcursa
+        fingerprint = self._get_file_fingerprint(archive_path)
+        known = self._store.get_files([archive_path]).get(archive_path)
+        if known is not None and (known["file_size"], known["mtime_ns"]) == fingerprint:
+            study_ids = self._store.get_archive_study_ids(archive_path)
+            if all(study_ids):
+                for study_id in study_ids:
+                    self._count_loaded_file(loaded_studies, study_id, None)
+                return list(loaded_studies.values())
+
+        batch_size = max(1, Settings.INGEST_BATCH_SIZE)
+        member_paths = set()
+        locations: Dict[str, Optional[Tuple[int, int]]] = {}
+        batch = []
 
-                if self._is_dicom_file(file_path):
-                    try:
-                        result = self.load_dicom_file(file_path)
-                        study_id = result["study_id"]
+        try:
+            for member_path, parsed, location in iter_archive_headers(archive_path, is_cancelled):
+                if parsed is None:
+                    continue
 
-                        if study_id not in study_files:
-                            study_files[study_id] = []
-                            loaded_studies.append({
-                                "study_id": study_id,
-                                "metadata": result["metadata"],
-                                "file_count": 0
-                            })
+                member_paths.add(member_path)
+                locations[member_path] = location
+                batch.append((member_path, parsed))
+                if len(batch) >= batch_size:
+                    self._store_parsed_instances(batch, {}, loaded_studies, (archive_path, locations))
+                    batch = []
+        except Exception as e:
+            raise PacsDataError(f"Error reading archive {archive_path}: {e}")
+        finally:
+            if batch:
+                self._store_parsed_instances(batch, {}, loaded_studies, (archive_path, locations))
 
-                        study_files[study_id].append(file_path)
+        # Amprenta arhivei este retinuta doar dupa o citire completa
+        if not (is_cancelled and is_cancelled()):
+            self._store.remove_archive_members(archive_path, member_paths)
+            if fingerprint:
+                self._store.add_instances({}, [], [(archive_path, *fingerprint, None)])
 
-                    except Exception as e:
-                        print(f"Warning: Could not load {file_path}: {e}")
-                        continue
+        return list(loaded_studies.values())
 
-        for study_data in loaded_studies:
-            study_id = study_data["study_id"]
-            study_data["file_count"] = len(study_files.get(study_id, []))
+    def get_watch_folders(self) -> List[str]:
+        return self._store.get_watch_folders()
 
-        return loaded_studies
+    def add_watch_folder(self, folder_path: str) -> str:
+        if not os.path.isdir(folder_path):
+            raise PacsDataError(f"Folder not found: {folder_path}")
+
+        folder_path = self._normalize_path(folder_path)
+        self._store.add_watch_folder(folder_path)
+        return folder_path
+
+    def remove_watch_folder(self, folder_path: str):
+        self._store.remove_watch_folder(self._normalize_path(folder_path))
+
+    def scan_watch_folders(self, is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        known_study_ids = set(self._store.get_study_ids())
+        touched_studies: Dict[str, Dict[str, Any]] = {}
+        directories = []
+        pending = {}
+        now_ns = time.time_ns()
+        stable_ns = Settings.WATCH_FOLDER_STABLE_SECONDS * 1_000_000_000
+
+        for folder_path in self.get_watch_folders():
+            # Un share de retea deconectat nu trebuie sa stearga studiile din index
+            if not os.path.isdir(folder_path):
+                continue
+
+            file_paths = []
+            for root, dirs, files in os.walk(folder_path):
+                directories.append(root)
+                file_paths.extend(os.path.join(root, file) for file in files)
+
+            # Un fisier este importat doar daca nu s-a modificat de la scanarea anterioara sau de cateva secunde
+            stable_paths = []
+            for file_path, fingerprint in self.get_changed_files(file_paths).items():
+                if fingerprint is None:
+                    continue
+                if self._watch_pending.get(file_path) == fingerprint or now_ns - fingerprint[1] >= stable_ns:
+                    stable_paths.append(file_path)
+                else:
+                    pending[file_path] = fingerprint
+
+            if stable_paths:
+                for study in self.load_dicom_files(stable_paths, is_cancelled=is_cancelled):
+                    touched_studies[study["study_id"]] = study
+
+            if is_cancelled and is_cancelled():
+                break
+
+            self.remove_missing_files(folder_path, file_paths)
+
+        self._watch_pending = pending
+        current_study_ids = set(self._store.get_study_ids())
+
+        return {
+            "new": [study for study_id, study in touched_studies.items() if study_id not in known_study_ids],
+            "updated": [study for study_id, study in touched_studies.items()
+                        if study_id in known_study_ids and study_id in current_study_ids],
+            "deleted": list(known_study_ids - current_study_ids),
+            "directories": directories,
+            "pending": len(pending)
+        }
 
     def get_study_metadata_from_file(self, file_path: str) -> Dict[str, Any]:
         result = self.load_dicom_file(file_path)
         return result["metadata"]
 
     def get_local_study_instances(self, study_id: str) -> List[Dict[str, Any]]:
-        return self.study_instances.get(study_id, [])
+        return self._store.get_instances(study_id)
 
     def get_local_dicom_file(self, instance_id: str) -> bytes:
-        file_path = self.instance_files.get(instance_id)
-        if not file_path or not os.path.exists(file_path):
+        dicom_file = self.open_local_dicom_file(instance_id)
+        try:
+            with dicom_file:
+                return dicom_file.read()
+        except Exception as e:
+            raise PacsDataError(f"Error reading local DICOM file: {e}")
+
+    def map_local_dicom_file(self, instance_id: str) -> memoryview:
+        # Paginile fisierului sunt citite de sistemul de operare la acces, fara copie in memoria procesului
+        file_path = self._store.get_instance_file(instance_id)
+        if not file_path or not self._local_file_exists(file_path):
             raise PacsDataError(f"Local DICOM file not found for instance {instance_id}")
 
         try:
-            with open(file_path, 'rb') as f:
-                return f.read()
+            file_range = self._get_local_file_range(file_path)
+            if file_range is None:
+                # Membrii comprimati din arhive nu pot fi mapati; sunt decomprimati in memorie
+                with self.open_local_dicom_file(instance_id) as dicom_file:
+                    return memoryview(dicom_file.read())
+            return self._map_file_range(*file_range)
+        except PacsDataError:
+            raise
+        except Exception as e:
+            raise PacsDataError(f"Error reading local DICOM file: {e}")
+
+    def open_local_dicom_file(self, instance_id: str) -> BinaryIO:
+        file_path = self._store.get_instance_file(instance_id)
+        if not file_path or not self._local_file_exists(file_path):
+            raise PacsDataError(f"Local DICOM file not found for instance {instance_id}")
+
+        try:
+            # Instantele din arhive sunt citite direct din membrul arhivei
+            archive_member = self._store.get_archive_member(file_path)
+            if archive_member is not None:
+                location = None if archive_member["data_offset"] is None else \
+                    (archive_member["data_offset"], archive_member["data_size"])
+                return open_archive_member(file_path, location)
+
+            return open(file_path, 'rb')
         except Exception as e:
             raise PacsDataError(f"Error reading local DICOM file: {e}")
 
     def add_examination_result_to_local_study(self, study_id: str, examination_result: str) -> bool:
         try:
-            self.examination_results[study_id] = examination_result
-            self._save_cache()
+            self._store.set_examination_result(study_id, examination_result)
             return True
         except Exception as e:
             print(f"Error saving examination result: {e}")
             return False
 
     def get_examination_result_from_local_study(self, study_id: str) -> str:
-        return self.examination_results.get(study_id, "")
+        return self._store.get_examination_result(study_id) or ""
 
     def send_local_study_to_pacs(self, study_id: str, target_url: str, target_auth: Tuple[str, str],
-                                 examination_result: str = None, dicom_modifier_callback=None) -> bool:
+                                 examination_result: str = None, dicom_modifier_callback=None,
+                                 skip_instance_ids: Optional[Set[str]] = None,
+                                 on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                                 is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
         try:
             print(f"LocalFileService: Sending local study {study_id} to {target_url}")
 
-            if study_id not in self.local_studies:
+            if self._store.get_study_metadata(study_id) is None:
                 raise PacsDataError(f"Local study {study_id} not found")
 
-            # Check for existing study in target PACS
-            existing_study_id = self._find_existing_study_in_target(study_id, target_url, target_auth)
-
-            if existing_study_id:
-                print(f"Local study exists in target PACS (ID: {existing_study_id}) - UPDATING")
-                if not self._delete_existing_study(existing_study_id, target_url, target_auth):
-                    print(f"Failed to delete existing study, aborting update")
-                    return False
-                print(f"Recreating local study with new examination result...")
-
-            return self._create_new_local_study(study_id, target_url, target_auth, examination_result)
+            # The transfer journal decides which instances are missing or changed in the target PACS
+            return self._upload_local_study(study_id, target_url, target_auth, examination_result,
+                                            skip_instance_ids, on_instance_done, is_cancelled)
 
         except Exception as e:
             print(f"LocalFileService: Error sending local study {study_id}: {e}")
             return False
 
     def get_all_local_studies(self) -> List[str]:
-        return list(self.local_studies.keys())
+        return self._store.get_study_ids()
+
+    def get_local_studies_page(self, offset: int, limit: int) -> List[Dict[str, Any]]:
+        return self._store.get_studies_page(offset, limit)
+
+    def get_local_studies_count(self) -> int:
+        return self._store.count_studies()
 
     def get_local_study_metadata(self, study_id: str) -> Dict[str, Any]:
-        if study_id not in self.local_studies:
+        metadata = self._store.get_study_metadata(study_id)
+        if metadata is None:
             raise PacsDataError(f"Local study {study_id} not found")
-        return self.local_studies[study_id]
+        return metadata
+
+    def get_study_id_for_instance(self, instance_id: str) -> str:
+        return self._store.get_study_id_for_instance(instance_id) or ""
 
     def clear_local_studies(self):
-        self.local_studies.clear()
-        self.study_instances.clear()
-        self.instance_files.clear()
-        self.examination_results.clear()
-        self._save_cache()
+        self._store.clear()
 
     def remove_local_study(self, study_id: str) -> bool:
         try:
-            if study_id in self.local_studies:
-                del self.local_studies[study_id]
-            if study_id in self.study_instances:
-                for instance in self.study_instances[study_id]:
-                    instance_id = instance.get("ID")
-                    if instance_id in self.instance_files:
-                        del self.instance_files[instance_id]
-                del self.study_instances[study_id]
-            if study_id in self.examination_results:
-                del self.examination_results[study_id]
-
-            self._save_cache()
+            self._store.remove_study(study_id)
             return True
         except Exception as e:
             print(f"Error removing local study: {e}")
@@ -194,14 +379,13 @@ class LocalFileService(ILocalFileService):
 
     def get_examination_result_from_local_dicom_file(self, instance_id: str) -> str:
         try:
-            file_path = self.instance_files.get(instance_id)
-            if not file_path or not os.path.exists(file_path):
-                return self.examination_results.get(self._get_study_id_for_instance(instance_id), "")
-
-            with open(file_path, 'rb') as f:
-                dicom_data = f.read()
+            file_path = self._store.get_instance_file(instance_id)
+            if not file_path or not self._local_file_exists(file_path):
+                return self.get_examination_result_from_local_study(self.get_study_id_for_instance(instance_id))
 
-            dicom_dataset = pydicom.dcmread(BytesIO(dicom_data))
+            # Rezultatul este in tag-uri de text, nu avem nevoie de pixel data
+            with self.open_local_dicom_file(instance_id) as dicom_file:
+                dicom_dataset = pydicom.dcmread(dicom_file, stop_before_pixels=True)
 
             # Check private tags first
             if (0x7777, 0x0010) in dicom_dataset:
@@ -230,206 +414,260 @@ class LocalFileService(ILocalFileService):
             if hasattr(dicom_dataset, 'ImageComments'):
                 return str(dicom_dataset.ImageComments)
 
-            # Cache fallback
-            study_id = self._get_study_id_for_instance(instance_id)
-            return self.examination_results.get(study_id, "")
+            # Index fallback
+            return self.get_examination_result_from_local_study(self.get_study_id_for_instance(instance_id))
 
         except Exception as e:
             print(f"Error reading examination result from local DICOM: {e}")
-            study_id = self._get_study_id_for_instance(instance_id)
-            return self.examination_results.get(study_id, "")
+            return self.get_examination_result_from_local_study(self.get_study_id_for_instance(instance_id))
 
-    def _find_existing_study_in_target(self, source_study_id: str, target_url: str, target_auth: Tuple[str, str]) -> str:
+    def _upload_local_study(self, study_id: str, target_url: str, target_auth: Tuple[str, str], examination_result: str,
+                                skip_instance_ids: Optional[Set[str]] = None,
+                                on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                                is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
         try:
-            source_metadata = self.get_local_study_metadata(source_study_id)
-            study_instance_uid = source_metadata.get("Study Instance UID")
-
-            if not study_instance_uid:
-                return None
-
-            print(f"Looking for local study with UID: {study_instance_uid}")
+            instances = self.get_local_study_instances(study_id)
+            if not instances:
+                raise PacsDataError(f"No instances found in local study {study_id}")
 
-            response = requests.get(f"{target_url}/studies", auth=HTTPBasicAuth(*target_auth), timeout=30)
-            target_studies = response.json()
+            skip_instance_ids = skip_instance_ids or set()
+            instance_ids = [instance.get("ID") for instance in instances
+                            if instance.get("ID") and instance.get("ID") not in skip_instance_ids]
+            if not instance_ids:
+                return True
 
-            for target_study_id in target_studies:
-                try:
-                    response = requests.get(f"{target_url}/studies/{target_study_id}", auth=HTTPBasicAuth(*target_auth), timeout=30)
-                    target_metadata = response.json()
-                    target_uid = target_metadata.get('MainDicomTags', {}).get('StudyInstanceUID')
+            # Anonymize, then add examination result if provided - one parse, one write per instance
+            pipeline = DicomTransformPipeline([self._anonymizer.anonymize_dataset])
+            if examination_result:
+                pipeline.add(ExaminationResultTransform(examination_result, add_study_comments=False))
+
+            def open_instance(instance_id: str) -> BinaryIO:
+                return pipeline.apply_file(self.open_local_dicom_file(instance_id), Settings.get_transfer_spool_size())
+
+            sop_instance_uids = {instance.get("ID"): instance.get("SOPInstanceUID") for instance in instances}
+
+            def fingerprint(instance_id: str) -> Optional[InstanceFingerprint]:
+                sop_instance_uid = sop_instance_uids.get(instance_id)
+                file_md5 = self._get_local_file_md5(instance_id)
+                if not sop_instance_uid or not file_md5:
+                    return None
+                return InstanceFingerprint(
+                    sop_instance_uid,
+                    StudyTransferService.content_hash(file_md5, True, examination_result or "")
+                )
+
+            result = self._transfer_service.upload_instances(
+                study_id, instance_ids, open_instance, target_url, target_auth, on_instance_done, fingerprint,
+                is_cancelled
+            )
 
-                    if target_uid == study_instance_uid:
-                        print(f"✅ Found existing local study: {target_study_id}")
-                        return target_study_id
-                except:
-                    continue
+            print(f"Final result: {result.sent_count}/{len(instance_ids)} local instances sent "
+                  f"({result.skipped_count} already up to date)")
+            return result.is_complete() and result.sent_count == len(instance_ids)
 
-            return None
         except Exception as e:
-            print(f"Error searching for existing local study: {e}")
+            print(f"Error creating new local study: {e}")
+            return False
+
+    def _get_local_file_md5(self, instance_id: str) -> Optional[str]:
+        file_path = self._store.get_instance_file(instance_id)
+        if not file_path or not self._local_file_exists(file_path):
             return None
 
-    def _delete_existing_study(self, target_study_id: str, target_url: str, target_auth: Tuple[str, str]) -> bool:
         try:
-            print(f"Deleting existing study {target_study_id}...")
-            delete_response = requests.delete(
-                f"{target_url}/studies/{target_study_id}",
-                auth=HTTPBasicAuth(*target_auth),
-                timeout=30
-            )
-
-            if delete_response.status_code == 200:
-                print(f"Existing study deleted successfully")
-                return True
-            else:
-                print(f"Failed to delete existing study: {delete_response.status_code}")
-                return False
-        except Exception as e:
-            print(f"Error deleting existing study: {e}")
-            return False
+            file_range = self._get_local_file_range(file_path)
+            if file_range is not None:
+                with self._map_file_range(*file_range) as view:
+                    return hashlib.md5(view).hexdigest()
 
-    def _create_new_local_study(self, study_id: str, target_url: str, target_auth: Tuple[str, str], examination_result: str) -> bool:
-        try:
-            instances = self.get_local_study_instances(study_id)
-            if not instances:
-                raise PacsDataError(f"No instances found in local study {study_id}")
+            dicom_file = self.open_local_dicom_file(instance_id)
+        except (OSError, PacsDataError):
+            return None
 
-            success_count = 0
-            total_instances = len(instances)
+        md5 = hashlib.md5()
+        with dicom_file as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                md5.update(chunk)
+        return md5.hexdigest()
 
-            for i, instance in enumerate(instances):
-                instance_id = instance.get("ID")
-                if not instance_id:
-                    continue
+    def _add_examination_result_to_dicom(self, dicom_data: bytes, examination_result: str) -> bytes:
+        try:
+            transform = ExaminationResultTransform(examination_result, add_study_comments=False)
+            return DicomTransformPipeline([transform]).apply(dicom_data)
+        except Exception as e:
+            print(f"Error adding examination result to local DICOM: {e}")
+            return dicom_data
 
+    def _merge_parsed_instance(self, parsed: Dict[str, Any], studies: Dict[str, Dict[str, Any]],
+                               instances: List[Dict[str, Any]]) -> Dict[str, Any]:
+        study_instance_uid = parsed["study_instance_uid"] or str(uuid.uuid4())
+        sop_instance_uid = parsed["sop_instance_uid"] or str(uuid.uuid4())
+        study_id = local_resource_id(study_instance_uid)
+        instance_id = local_resource_id(sop_instance_uid)
+
+        studies[study_id] = parsed["metadata"]
+        instances.append({
+            "ID": instance_id,
+            "StudyID": study_id,
+            "FilePath": parsed["file_path"],
+            "SOPInstanceUID": parsed["sop_instance_uid"] or instance_id,
+            "SeriesInstanceUID": parsed["series_instance_uid"] or str(uuid.uuid4()),
+            "InstanceNumber": parsed["instance_number"]
+        })
+
+        return {
+            "study_id": study_id,
+            "metadata": parsed["metadata"],
+            "instance_id": instance_id
+        }
+
+    def _parse_dicom_headers(self, file_paths: List[str],
+                             is_cancelled: Optional[Callable[[], bool]] = None
+                             ) -> Iterator[List[Tuple[str, Optional[Dict[str, Any]]]]]:
+        batch_size = max(1, Settings.INGEST_BATCH_SIZE)
+        batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+        max_workers = max(1, Settings.INGEST_MAX_WORKERS)
+
+        # Pentru putine fisiere pornirea proceselor costa mai mult decat citirea header-elor
+        if len(batches) <= 1 or max_workers == 1:
+            for batch in batches:
+                if is_cancelled and is_cancelled():
+                    return
+                yield [(file_path, parse_dicom_header(file_path)) for file_path in batch]
+            return
+
+        chunksize = max(1, batch_size // (max_workers * 4))
+        # "spawn" si pe Linux: fork dintr-un proces Qt cu mai multe thread-uri poate copia lock-uri blocate
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            next_results = executor.map(parse_dicom_header, batches[0], chunksize=chunksize)
+
+            for index in range(len(batches)):
+                results = list(next_results)
+
+                if is_cancelled and is_cancelled():
+                    return
+
+                # Lotul urmator este citit de procese cat timp lotul curent este adaugat in index
+                if index + 1 < len(batches):
+                    next_results = executor.map(parse_dicom_header, batches[index + 1], chunksize=chunksize)
+
+                yield list(zip(batches[index], results))
+
+    def _store_parsed_instances(self, batch: List[Tuple[str, Optional[Dict[str, Any]]]],
+                                fingerprints: Dict[str, Optional[Tuple[int, int]]],
+                                loaded_studies: Dict[str, Dict[str, Any]],
+                                archive: Optional[Tuple[str, Dict[str, Optional[Tuple[int, int]]]]] = None):
+        batch_studies: Dict[str, Dict[str, Any]] = {}
+        batch_instances: List[Dict[str, Any]] = []
+        batch_files = []
+        batch_archive_members = []
+
+        for file_path, parsed in batch:
+            instance_id = None
+            if parsed is not None:
                 try:
-
-                    # Read local DICOM file
-                    dicom_data = self.get_local_dicom_file(instance_id)
-
-                    # Anonymize
-                    dicom_data = self._anonymizer.anonymize_dicom(dicom_data)
-
-                    # Add examination result if provided
-                    if examination_result:
-                        dicom_data = self._add_examination_result_to_dicom(dicom_data, examination_result)
-
-                    # Send to target PACS
-                    response = requests.post(
-                        f"{target_url}/instances",
-                        data=dicom_data,
-                        auth=HTTPBasicAuth(*target_auth),
-                        headers={"Content-Type": "application/dicom"},
-                        timeout=30
-                    )
-
-                    if response.status_code == 200:
-                        success_count += 1
-                    else:
-                        print(f"Failed to send local instance: {response.status_code}")
-
+                    result = self._merge_parsed_instance(parsed, batch_studies, batch_instances)
+                    instance_id = result["instance_id"]
+                    self._count_loaded_file(loaded_studies, result["study_id"], result["metadata"])
+
+                    if archive is not None:
+                        archive_path, locations = archive
+                        offset, size = locations.get(file_path) or (None, None)
+                        batch_archive_members.append((file_path, archive_path, offset, size))
                 except Exception as e:
-                    continue
-
-            print(f"Final result: {success_count}/{total_instances} local instances sent")
-            return success_count == total_instances
+                    print(f"Warning: Could not load {file_path}: {e}")
 
-        except Exception as e:
-            print(f"Error creating new local study: {e}")
-            return False
+            # Si fisierele care nu sunt DICOM sunt retinute, ca sa nu fie citite din nou la rescanare
+            if fingerprints.get(file_path) is not None:
+                batch_files.append((file_path, *fingerprints[file_path], instance_id))
 
-    def _add_examination_result_to_dicom(self, dicom_data: bytes, examination_result: str) -> bytes:
-        try:
-            dicom_dataset = pydicom.dcmread(BytesIO(dicom_data))
+        # Indexul este scris o singura data pe lot, intr-o singura tranzactie
+        self._store.add_instances(batch_studies, batch_instances, batch_files, batch_archive_members)
 
-            # Image Comments (primary method)
-            if len(examination_result) <= 10240:
-                dicom_dataset.ImageComments = examination_result
+    def _merge_loaded_studies(self, loaded_studies: Dict[str, Dict[str, Any]], studies: List[Dict[str, Any]]):
+        for study in studies:
+            if study["study_id"] in loaded_studies:
+                loaded_studies[study["study_id"]]["file_count"] += study["file_count"]
             else:
-                truncated_text = examination_result[:10200] + "\n\n[TRUNCATED - See private tags]"
-                dicom_dataset.ImageComments = truncated_text
+                loaded_studies[study["study_id"]] = study
 
-            # Private tags
-            dicom_dataset.add_new(0x77770010, 'LO', 'MEDICAL_APP_RESULT')
+    def _count_loaded_file(self, loaded_studies: Dict[str, Dict[str, Any]], study_id: str,
+                           metadata: Optional[Dict[str, Any]]):
+        if study_id not in loaded_studies:
+            loaded_studies[study_id] = {
+                "study_id": study_id,
+                "metadata": metadata if metadata is not None else self._store.get_study_metadata(study_id),
+                "file_count": 0
+            }
+        loaded_studies[study_id]["file_count"] += 1
+
+    def _split_changed_files(self, file_paths: List[str], skip_ignored: bool = False
+                             ) -> Tuple[Dict[str, Optional[Tuple[int, int]]], List[str]]:
+        # Fisierele cu aceeasi dimensiune si data modificarii ca la importul anterior nu mai sunt citite
+        known_files = self._store.get_files(file_paths)
+        changed = {}
+        unchanged_study_ids = []
+
+        for file_path in file_paths:
+            fingerprint = self._get_file_fingerprint(file_path)
+            known = known_files.get(file_path)
+
+            # Studiile sterse de utilizator nu sunt reimportate din folderele urmarite cat timp fisierul nu se schimba
+            if skip_ignored and known is not None and known["ignored"] and \
+                    (known["file_size"], known["mtime_ns"]) == fingerprint:
+                continue
+
+            # O instanta scoasa din lista intre timp trebuie citita din nou
+            if known is None or fingerprint is None or (known["file_size"], known["mtime_ns"]) != fingerprint or \
+                    (known["instance_id"] and not known["study_id"]):
+                changed[file_path] = fingerprint
+            elif known["study_id"]:
+                unchanged_study_ids.append(known["study_id"])
+
+        return changed, unchanged_study_ids
+
+    def _get_file_fingerprint(self, file_path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(file_path)
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
 
-            if len(examination_result) <= 65534:
-                dicom_dataset.add_new(0x77771001, 'LT', examination_result)
-            else:
-                # Split into chunks
-                chunk_size = 65000
-                chunks = [examination_result[i:i + chunk_size] for i in range(0, len(examination_result), chunk_size)]
+    def _get_local_file_range(self, file_path: str) -> Optional[Tuple[str, int, int]]:
+        archive_member = self._store.get_archive_member(file_path)
+        if archive_member is None:
+            return file_path, 0, os.path.getsize(file_path)
 
-                for i, chunk in enumerate(chunks[:10]):
-                    tag_element = 0x1001 + i
-                    dicom_dataset.add_new(0x7777, tag_element, 'LT', chunk)
+        location = None if archive_member["data_offset"] is None else \
+            (archive_member["data_offset"], archive_member["data_size"])
+        return archive_member_range(file_path, location)
 
-                dicom_dataset.add_new(0x77770020, 'IS', str(len(chunks)))
+    def _map_file_range(self, file_path: str, offset: int, size: int) -> memoryview:
+        if size == 0:
+            return memoryview(b"")
 
-            # Save
-            output_buffer = BytesIO()
-            dicom_dataset.save_as(output_buffer, write_like_original=False)
-            return output_buffer.getvalue()
+        # Maparea ramane valida dupa inchiderea fisierului si este eliberata odata cu ultimul memoryview
+        with open(file_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped)[offset:offset + size]
 
-        except Exception as e:
-            print(f"Error adding examination result to local DICOM: {e}")
-            return dicom_data
+    def _local_file_exists(self, file_path: str) -> bool:
+        archive_path, _ = split_archive_member_path(file_path)
+        return os.path.exists(archive_path)
 
-    def _get_study_id_for_instance(self, instance_id: str) -> str:
-        for study_id, instances in self.study_instances.items():
-            for instance in instances:
-                if instance.get("ID") == instance_id:
-                    return study_id
-        return ""
+    def _normalize_path(self, file_path: str) -> str:
+        return os.path.normpath(os.path.abspath(file_path))
 
     def _extract_metadata_from_dataset(self, dataset) -> Dict[str, Any]:
-        try:
-            return {
-                "Patient Name": str(getattr(dataset, 'PatientName', 'N/A')),
-                "CNP": str(getattr(dataset, 'PatientID', 'N/A')),
-                "Patient Birth Date": self._format_date(getattr(dataset, 'PatientBirthDate', '')),
-                "Patient Sex": str(getattr(dataset, 'PatientSex', 'N/A')),
-                "Patient Age": str(getattr(dataset, 'PatientAge', 'N/A')),
-                "Study Date": self._format_date(getattr(dataset, 'StudyDate', '')),
-                "Study Instance UID": str(getattr(dataset, 'StudyInstanceUID', 'N/A')),
-                "Accession Number": str(getattr(dataset, 'AccessionNumber', 'N/A')),
-                "Referring Physician Name": str(getattr(dataset, 'ReferringPhysicianName', 'N/A')),
-                "Description": str(getattr(dataset, 'StudyDescription', 'Local DICOM Study')),
-                "Series Status": "LOCAL",
-                "Source": "Local File"
-            }
-        except Exception as e:
-            print(f"Warning: Error extracting metadata: {e}")
-            return {
-                "Patient Name": "N/A",
-                "Patient Birth Date": "N/A",
-                "Patient Sex": "N/A",
-                "Patient Age": "N/A",
-                "Study Date": datetime.now().strftime("%Y-%m-%d"),
-                "Study Instance UID": "N/A",
-                "Description": "Local DICOM Study",
-                "Series Status": "LOCAL",
-                "Source": "Local File"
-            }
+        return extract_study_metadata(dataset)
 
     def _format_date(self, date_str: str) -> str:
-        if not date_str or len(date_str) < 8:
-            return "Unknown"
-
-        try:
-            if len(date_str) >= 8:
-                year = date_str[:4]
-                month = date_str[4:6]
-                day = date_str[6:8]
-                return f"{year}-{month}-{day}"
-        except:
-            pass
-
-        return date_str
+        return format_dicom_date(date_str)
 
     def _is_dicom_file(self, file_path: str) -> bool:
         try:
             ext = os.path.splitext(file_path)[1].lower()
-            if ext in ['.dcm', '.dicom']:
+            if ext in ['.dcm', '.dicom'] or is_dicom_archive(file_path):
                 return True
 
             with open(file_path, 'rb') as f:
@@ -449,38 +687,61 @@ class LocalFileService(ILocalFileService):
 
         return False
 
-    def _save_cache(self):
+    def _migrate_json_cache(self):
+        # Cache-ul JSON din versiunile anterioare este importat o singura data in indexul SQLite
+        cache_file = os.path.join(self.cache_dir, "local_studies_cache.json")
+        if not os.path.exists(cache_file):
+            return
+
         try:
-            cache_file = os.path.join(self.cache_dir, "local_studies_cache.json")
-            cache_data = {
-                "local_studies": self.local_studies,
-                "study_instances": self.study_instances,
-                "instance_files": self.instance_files,
-                "examination_results": self.examination_results,
-                "last_updated": datetime.now().isoformat()
-            }
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache_data = json.load(f)
 
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, indent=2, ensure_ascii=False)
+            studies = cache_data.get("local_studies", {})
+            instances = [
+                instance
+                for study_id, study_instances in cache_data.get("study_instances", {}).items() if study_id in studies
+                for instance in study_instances if instance.get("ID") and instance.get("FilePath")
+            ]
+            self._store.add_instances(studies, instances)
+
+            for study_id, examination_result in cache_data.get("examination_results", {}).items():
+                self._store.set_examination_result(study_id, examination_result)
+
+            os.replace(cache_file, cache_file + ".migrated")
+            print(f"Migrated {len(studies)} local studies to the SQLite index")
 
         except Exception as e:
-            print(f"Warning: Could not save cache: {e}")
+            print(f"Warning: Could not migrate local studies cache: {e}")
+
+    def _migrate_legacy_ids(self):
+        # ID-urile vechi (local_<hash() % 10^6>) nu sunt stabile intre sesiuni; le recalculam din UID-uri
+        study_ids: Dict[str, str] = {}
+        instance_ids: Dict[str, str] = {}
 
-    def _load_cache(self):
         try:
-            cache_file = os.path.join(self.cache_dir, "local_studies_cache.json")
-            if os.path.exists(cache_file):
-                with open(cache_file, 'r', encoding='utf-8') as f:
-                    cache_data = json.load(f)
+            for study_id in self._store.get_study_ids():
+                if not self._LEGACY_ID_PATTERN.match(study_id):
+                    continue
+
+                study_instance_uid = self._store.get_study_metadata(study_id).get("Study Instance UID")
+                if study_instance_uid and study_instance_uid != "N/A":
+                    study_ids[study_id] = local_resource_id(study_instance_uid)
+
+                for instance in self._store.get_instances(study_id):
+                    if self._LEGACY_ID_PATTERN.match(instance["ID"]) and instance.get("SOPInstanceUID"):
+                        instance_ids[instance["ID"]] = local_resource_id(instance["SOPInstanceUID"])
+
+            if not study_ids and not instance_ids:
+                return
+
+            self._store.rename_ids(study_ids, instance_ids)
+
+            # Studiile locale aflate in coada de trimitere trebuie sa pastreze legatura cu indexul
+            from app.di.container import Container
+            Container.get_send_queue_store().rename_ids(study_ids, instance_ids)
 
-                self.local_studies = cache_data.get("local_studies", {})
-                self.study_instances = cache_data.get("study_instances", {})
-                self.instance_files = cache_data.get("instance_files", {})
-                self.examination_results = cache_data.get("examination_results", {})
+            print(f"Migrated {len(study_ids)} local studies and {len(instance_ids)} instances to stable IDs")
 
         except Exception as e:
-            print(f"Warning: Could not load cache: {e}")
-            self.local_studies = {}
-            self.study_instances = {}
-            self.instance_files = {}
-            self.examination_results = {}
\ No newline at end of file
+            print(f"Warning: Could not migrate local study IDs: {e}")
@@ -1,13 +1,29 @@
-from io import BytesIO
-
+import json
+import shutil
+import tempfile
 import pydicom
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Set, Callable, BinaryIO, Tuple
 from app.core.interfaces.pacs_interface import IPacsService
 from app.infrastructure.http_client import HttpClient
+from app.config.settings import Settings
+from app.core.entities.transfer import InstanceTransferResult, InstanceFingerprint
+from app.services.study_transfer_service import StudyTransferService
+from app.services.dicom_transform_pipeline import DicomTransformPipeline, ExaminationResultTransform
 from app.core.exceptions.pacs_exceptions import PacsConnectionError, PacsDataError
 
 
 class PacsService(IPacsService):
+    # Daca lipsesc putine studii din cache le cerem individual, altfel o singura cerere expandata
+    _INDIVIDUAL_FETCH_LIMIT = 20
+
+    _STUDY_CHANGE_TYPES = {
+        "NewStudy": "new",
+        "StableStudy": "updated",
+        "ModifiedStudy": "updated",
+        "Deleted": "deleted",
+    }
+
     def __init__(self, http_client: HttpClient, pacs_url: str, pacs_auth: tuple):
         self._http_client = http_client
 
@@ -15,11 +31,13 @@ class PacsService(IPacsService):
             self._pacs_url = pacs_url
             self._pacs_auth = pacs_auth
         else:
-            from app.config.settings import Settings
             self._pacs_url, self._pacs_auth = Settings.get_pacs_config()
 
         from app.di.container import Container
         self._anonymizer = Container.get_dicom_anonymizer_service()
+        self._metadata_store = Container.get_study_metadata_store()
+        self._transfer_service = Container.get_study_transfer_service()
+        self._instance_cache = Container.get_instance_file_cache()
 
     def get_all_studies(self) -> List[str]:
         try:
@@ -28,44 +46,204 @@ class PacsService(IPacsService):
         except Exception as e:
             raise PacsConnectionError(f"Nu am putut incarca studiile: {e}")
 
-    def get_study_metadata(self, study_id: str) -> Dict[str, Any]:
+    def get_all_studies_with_metadata(self) -> List[Dict[str, Any]]:
         try:
-            response = self._http_client.get(f"{self._pacs_url}/studies/{study_id}", auth=self._pacs_auth)
-            data = response.json()
+            self.sync_study_changes()
+            study_ids = self.get_all_studies()
+            return self._get_studies_with_metadata(study_ids, f"{self._pacs_url}/studies?expand")
+        except Exception as e:
+            raise PacsConnectionError(f"Nu am putut incarca studiile: {e}")
+
+    def get_studies_page(self, since: int, limit: int) -> Dict[str, Any]:
+        try:
+            if since == 0:
+                self.sync_study_changes()
+
+            response = self._http_client.get(
+                f"{self._pacs_url}/studies?since={since}&limit={limit}", auth=self._pacs_auth
+            )
+            study_ids = response.json()
 
+            # Pagina urmatoare porneste dupa ID-urile primite, chiar daca metadatele unora nu au putut fi citite
             return {
-                # Date Pacient - ESENȚIALE
-                "Patient Name": data.get('PatientMainDicomTags', {}).get('PatientName', 'N/A'),
-                "CNP": data.get('PatientMainDicomTags', {}).get('PatientID', 'N/A'),
-                "Patient Birth Date": data.get('PatientMainDicomTags', {}).get('PatientBirthDate', 'N/A'),
-                "Patient Sex": data.get('PatientMainDicomTags', {}).get('PatientSex', 'N/A'),
-                "Patient Age": data.get('PatientMainDicomTags', {}).get('PatientAge', 'N/A'),
-
-                # Date Studiu - CRITICE
-                "Study Date": data.get('MainDicomTags', {}).get('StudyDate', 'N/A'),
-                "Study Time": data.get('MainDicomTags', {}).get('StudyTime', 'N/A'),
-                "Description": data.get('MainDicomTags', {}).get('StudyDescription', 'N/A'),
-                "Study Instance UID": data.get('MainDicomTags', {}).get('StudyInstanceUID', 'N/A'),
-                "Referring Physician": data.get('MainDicomTags', {}).get('ReferringPhysicianName', 'N/A'),
-                "Study ID": data.get('MainDicomTags', {}).get('StudyID', 'N/A'),
-                "Accession Number": data.get('MainDicomTags', {}).get('AccessionNumber', 'N/A'),
-                "Referring Physician Name": data.get('MainDicomTags', {}).get('ReferringPhysicianName', 'N/A'),
-                "Radipharmaceutical"
-
-                # Date Echipament
-                "Institution Name": data.get('MainDicomTags', {}).get('InstitutionName', 'N/A'),
-                "Modality": data.get('MainDicomTags', {}).get('Modality', 'N/A'),
-
-                # Date Serie (primul disponibil)
-                "Series Description": data.get('SeriesMainDicomTags', {}).get('SeriesDescription', 'N/A'),
-                "Body Part Examined": data.get('SeriesMainDicomTags', {}).get('BodyPartExamined', 'N/A'),
-
-                # Status
-                "Series Status": data.get('SeriesMainDicomTags', {}).get('Status', 'Available')
+                "studies": self._get_studies_with_metadata(
+                    study_ids, f"{self._pacs_url}/studies?expand&since={since}&limit={limit}"
+                ),
+                "next_since": since + len(study_ids),
+                "has_more": len(study_ids) >= limit
             }
+        except Exception as e:
+            raise PacsConnectionError(f"Nu am putut incarca studiile: {e}")
+
+    def get_study_metadata(self, study_id: str) -> Dict[str, Any]:
+        try:
+            data = self._metadata_store.get(self._pacs_url, study_id)
+            if data is None:
+                data = self._fetch_study_data(study_id)
+                self._metadata_store.put_many(self._pacs_url, [(study_id, data)])
+
+            return self._format_study_metadata(data)
         except Exception as e:
             raise PacsDataError(f"Nu am putut incarca metadatele din studiul {study_id}: {e}")
 
+    def get_study_changes(self) -> Dict[str, Any]:
+        try:
+            changes, last_seq = self._poll_study_changes()
+
+            # Doar studiile modificate sunt descarcate; last_seq avanseaza abia dupa ce metadatele lor au sosit,
+            # altfel modificarile s-ar pierde daca descarcarea esueaza
+            studies_data = self._fetch_studies_data(changes["new"] + changes["updated"])
+            self._commit_study_changes(changes, last_seq, studies_data)
+            studies = {
+                study_id: {"study_id": study_id, "metadata": self._format_study_metadata(data)}
+                for study_id, data in studies_data.items()
+            }
+
+            return {
+                "new": [studies[study_id] for study_id in changes["new"] if study_id in studies],
+                "updated": [studies[study_id] for study_id in changes["updated"] if study_id in studies],
+                "deleted": changes["deleted"]
+            }
+        except Exception as e:
+            raise PacsConnectionError(f"Nu am putut incarca modificarile studiilor: {e}")
+
+    def sync_study_changes(self) -> Dict[str, List[str]]:
+        try:
+            changes, last_seq = self._poll_study_changes()
+            self._commit_study_changes(changes, last_seq)
+            return changes
+        except Exception as e:
+            print(f"Warning: Could not sync changes from {self._pacs_url}: {e}")
+            return {"new": [], "updated": [], "deleted": []}
+
+    def _poll_study_changes(self) -> Tuple[Dict[str, List[str]], int]:
+        # Modificarile de dupa last_seq si noul last_seq; acesta este salvat de _commit_study_changes
+        changes = {"new": [], "updated": [], "deleted": []}
+        last_seq = self._metadata_store.get_last_seq(self._pacs_url)
+
+        if last_seq is None:
+            # Prima sincronizare cu acest PACS: nu stim ce s-a schimbat inainte, pornim de la zero
+            response = self._http_client.get(f"{self._pacs_url}/changes?last", auth=self._pacs_auth)
+            self._metadata_store.clear(self._pacs_url)
+            return changes, response.json().get("Last", 0)
+
+        study_changes = {}
+        done = False
+
+        while not done:
+            response = self._http_client.get(
+                f"{self._pacs_url}/changes?since={last_seq}&limit={Settings.PACS_CHANGES_PAGE_SIZE}",
+                auth=self._pacs_auth
+            )
+            data = response.json()
+
+            for change in data.get("Changes", []):
+                if change.get("ResourceType") != "Study":
+                    continue
+
+                kind = self._STUDY_CHANGE_TYPES.get(change.get("ChangeType"))
+                study_id = change.get("ID")
+                if not kind or not study_id:
+                    continue
+
+                # Un studiu nou care devine stabil ramane "nou" pentru lista de studii
+                if kind == "updated" and study_changes.get(study_id) == "new":
+                    continue
+                study_changes[study_id] = kind
+
+            last_seq = data.get("Last", last_seq)
+            done = data.get("Done", True)
+
+        for study_id, kind in study_changes.items():
+            changes[kind].append(study_id)
+
+        return changes, last_seq
+
+    def _commit_study_changes(self, changes: Dict[str, List[str]], last_seq: int,
+                              studies_data: Optional[Dict[str, Dict[str, Any]]] = None):
+        self._metadata_store.delete_many(self._pacs_url, changes["new"] + changes["updated"] + changes["deleted"])
+        if studies_data:
+            self._metadata_store.put_many(self._pacs_url, studies_data.items())
+        self._metadata_store.set_last_seq(self._pacs_url, last_seq)
+
+    def _fetch_studies_data(self, study_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        def fetch(study_id: str) -> Optional[Dict[str, Any]]:
+            try:
+                return self._fetch_study_data(study_id)
+            except FileNotFoundError:
+                # Studiul a fost sters intre timp; stergerea apare in urmatoarele modificari
+                return None
+
+        # Cereri paralele, cel mult PACS_METADATA_FETCH_WORKERS odata; orice alta eroare opreste sincronizarea
+        with ThreadPoolExecutor(max_workers=Settings.PACS_METADATA_FETCH_WORKERS) as executor:
+            results = list(executor.map(fetch, study_ids))
+
+        return {study_id: data for study_id, data in zip(study_ids, results) if data is not None}
+
+    def _get_studies_with_metadata(self, study_ids: List[str], expanded_url: str) -> List[Dict[str, Any]]:
+        studies_data = self._metadata_store.get_many(self._pacs_url, study_ids)
+        missing_ids = [study_id for study_id in study_ids if study_id not in studies_data]
+
+        if missing_ids:
+            if len(missing_ids) <= self._INDIVIDUAL_FETCH_LIMIT:
+                for study_id in missing_ids:
+                    try:
+                        studies_data[study_id] = self._fetch_study_data(study_id)
+                    except Exception as e:
+                        print(f"Warning: Could not load study {study_id}: {e}")
+            else:
+                response = self._http_client.get(expanded_url, auth=self._pacs_auth)
+                for data in response.json():
+                    if data.get("ID"):
+                        studies_data[data["ID"]] = data
+
+            self._metadata_store.put_many(
+                self._pacs_url,
+                [(study_id, studies_data[study_id]) for study_id in missing_ids if study_id in studies_data]
+            )
+
+        return [
+            {"study_id": study_id, "metadata": self._format_study_metadata(studies_data[study_id])}
+            for study_id in study_ids
+            if study_id in studies_data
+        ]
+
+    def _fetch_study_data(self, study_id: str) -> Dict[str, Any]:
+        response = self._http_client.get(f"{self._pacs_url}/studies/{study_id}", auth=self._pacs_auth)
+        return response.json()
+
+    def _format_study_metadata(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            # Date Pacient - ESENȚIALE
+            "Patient Name": data.get('PatientMainDicomTags', {}).get('PatientName', 'N/A'),
+            "CNP": data.get('PatientMainDicomTags', {}).get('PatientID', 'N/A'),
+            "Patient Birth Date": data.get('PatientMainDicomTags', {}).get('PatientBirthDate', 'N/A'),
+            "Patient Sex": data.get('PatientMainDicomTags', {}).get('PatientSex', 'N/A'),
+            "Patient Age": data.get('PatientMainDicomTags', {}).get('PatientAge', 'N/A'),
+
+            # Date Studiu - CRITICE
+            "Study Date": data.get('MainDicomTags', {}).get('StudyDate', 'N/A'),
+            "Study Time": data.get('MainDicomTags', {}).get('StudyTime', 'N/A'),
+            "Description": data.get('MainDicomTags', {}).get('StudyDescription', 'N/A'),
+            "Study Instance UID": data.get('MainDicomTags', {}).get('StudyInstanceUID', 'N/A'),
+            "Referring Physician": data.get('MainDicomTags', {}).get('ReferringPhysicianName', 'N/A'),
+            "Study ID": data.get('MainDicomTags', {}).get('StudyID', 'N/A'),
+            "Accession Number": data.get('MainDicomTags', {}).get('AccessionNumber', 'N/A'),
+            "Referring Physician Name": data.get('MainDicomTags', {}).get('ReferringPhysicianName', 'N/A'),
+            "Radipharmaceutical"
+
+            # Date Echipament
+            "Institution Name": data.get('MainDicomTags', {}).get('InstitutionName', 'N/A'),
+            "Modality": data.get('MainDicomTags', {}).get('Modality', 'N/A'),
+
+            # Date Serie (primul disponibil)
+            "Series Description": data.get('SeriesMainDicomTags', {}).get('SeriesDescription', 'N/A'),
+            "Body Part Examined": data.get('SeriesMainDicomTags', {}).get('BodyPartExamined', 'N/A'),
+
+            # Status
+            "Series Status": data.get('SeriesMainDicomTags', {}).get('Status', 'Available')
+        }
+
     def get_study_instances(self, study_id: str) -> List[Dict[str, Any]]:
         try:
             response = self._http_client.get(f"{self._pacs_url}/studies/{study_id}/instances", auth=self._pacs_auth)
@@ -74,14 +252,85 @@ class PacsService(IPacsService):
             raise PacsDataError(f"Nu am putut accesa instantele studiului {study_id}: {e}")
 
     def get_dicom_file(self, instance_id: str) -> bytes:
+        if self._instance_cache.is_enabled():
+            with self.open_dicom_file(instance_id) as dicom_file:
+                return dicom_file.read()
+
         try:
             response = self._http_client.get(f"{self._pacs_url}/instances/{instance_id}/file", auth=self._pacs_auth)
             return response.content
         except Exception as e:
             raise PacsDataError(f"Nu am putut accesa fisierul DICOM pentru instanta {instance_id}: {e}")
 
+    def open_dicom_file(self, instance_id: str) -> BinaryIO:
+        if self._instance_cache.is_enabled():
+            return self._open_cached_dicom_file(instance_id)
+
+        # Descarcare pe bucati intr-un fisier temporar, in memorie doar pana la limita configurata
+        dicom_file = tempfile.SpooledTemporaryFile(max_size=Settings.get_transfer_spool_size())
+        try:
+            self._http_client.download_to(
+                f"{self._pacs_url}/instances/{instance_id}/file", dicom_file, auth=self._pacs_auth
+            )
+            return dicom_file
+        except Exception as e:
+            dicom_file.close()
+            raise PacsDataError(f"Nu am putut accesa fisierul DICOM pentru instanta {instance_id}: {e}")
+
+    def _open_cached_dicom_file(self, instance_id: str) -> BinaryIO:
+        # MD5-ul din PACS confirma ca fisierul din cache este inca aceeasi versiune a instantei;
+        # este cerut doar daca instanta este in cache
+        if self._instance_cache.contains(self._pacs_url, instance_id):
+            cached_file = self._instance_cache.open(self._pacs_url, instance_id, self._get_instance_md5(instance_id))
+            if cached_file is not None:
+                return cached_file
+
+        try:
+            return self._instance_cache.store(
+                self._pacs_url, instance_id,
+                lambda destination: self._http_client.download_to(
+                    f"{self._pacs_url}/instances/{instance_id}/file", destination, auth=self._pacs_auth
+                )
+            )
+        except Exception as e:
+            raise PacsDataError(f"Nu am putut accesa fisierul DICOM pentru instanta {instance_id}: {e}")
+
+    def open_dicom_stream(self, instance_id: str) -> BinaryIO:
+        # O instanta aflata deja in cache este citita de pe disc
+        cache_enabled = self._instance_cache.is_enabled()
+        if cache_enabled and self._instance_cache.contains(self._pacs_url, instance_id):
+            return self.open_dicom_file(instance_id)
+
+        try:
+            stream = self._http_client.open_stream(
+                f"{self._pacs_url}/instances/{instance_id}/file", auth=self._pacs_auth
+            )
+        except Exception as e:
+            raise PacsDataError(f"Nu am putut accesa fisierul DICOM pentru instanta {instance_id}: {e}")
+
+        if stream.length is not None:
+            if not cache_enabled:
+                return stream
+
+            # Instanta trece direct spre tinta si este copiata in cache pe masura ce este trimisa
+            try:
+                return self._instance_cache.open_relay(self._pacs_url, instance_id, stream)
+            except OSError as e:
+                print(f"Warning: Could not cache instance {instance_id}: {e}")
+                return stream
+
+        # Fara Content-Length fluxul nu poate fi retransmis direct; il trecem prin fisierul temporar
+        with stream:
+            dicom_file = tempfile.SpooledTemporaryFile(max_size=Settings.get_transfer_spool_size())
+            shutil.copyfileobj(stream, dicom_file)
+        dicom_file.seek(0)
+        return dicom_file
+
     def send_study_to_pacs(self, study_id: str, target_url: str, target_auth: tuple,
-                           examination_result: str = None, anonymize: bool = False) -> bool:
+                           examination_result: str = None, anonymize: bool = False,
+                           skip_instance_ids: Optional[Set[str]] = None,
+                           on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                           is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
 
         try:
             instances = self.get_study_instances(study_id)
@@ -89,211 +338,358 @@ class PacsService(IPacsService):
             if not instances:
                 raise PacsDataError(f"No instances found in study {study_id}")
 
-            existing_study_id = self._find_existing_study_in_target(study_id, target_url, target_auth)
-
-            if existing_study_id:
+            if Settings.TRANSFER_MODE == "server" and Settings.TARGET_PEER_NAME:
+                modification = self._build_study_modification(study_id, examination_result, anonymize)
+                if modification is None or self._modifies_patient_id(study_id, modification):
+                    return self._send_study_server_side(study_id, instances, target_url, target_auth, modification,
+                                                        skip_instance_ids, on_instance_done, is_cancelled)
 
-                delete_success = self._delete_existing_study(existing_study_id, target_url, target_auth)
+                # Cu acelasi PatientID si aceleasi UID-uri copia ar avea ID-urile Orthanc ale studiului sursa
+                # si l-ar suprascrie; instantele sunt transformate local
+                print(f"Study {study_id}: PatientID unchanged, transforming instances locally")
 
-                if not delete_success:
-                    print(f"Failed to delete existing study, aborting update")
-                    return False
-
-                return self._create_new_study(study_id, target_url, target_auth, examination_result, anonymize)
-            else:
-                return self._create_new_study(study_id, target_url, target_auth, examination_result, anonymize)
+            # Jurnalul de transfer decide ce instante lipsesc sau s-au modificat in PACS-ul tinta
+            return self._upload_study(study_id, instances, target_url, target_auth, examination_result, anonymize,
+                                      skip_instance_ids, on_instance_done, is_cancelled)
 
         except Exception as e:
             raise PacsConnectionError(f"Nu am putut procesa studiul în PACS: {e}")
 
-    def _find_existing_study_in_target(self, source_study_id: str, target_url: str, target_auth: tuple) -> str:
+    def _send_study_server_side(self, study_id: str, instances: List[Dict[str, Any]], target_url: str,
+                                target_auth: tuple, modification: Optional[Dict[str, Any]] = None,
+                                skip_instance_ids: Optional[Set[str]] = None,
+                                on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                                is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        skip_instance_ids = skip_instance_ids or set()
+        modified_study_id = self._modify_study(study_id, modification, is_cancelled) if modification else study_id
 
         try:
-            # Get Study Instance UID from source
-            source_metadata = self.get_study_metadata(source_study_id)
-            study_instance_uid = source_metadata.get("Study Instance UID")
-
-            if not study_instance_uid:
-                return None
+            # Copia are alte ID-uri Orthanc; queue-ul retine instantele sursei, asociate prin SOPInstanceUID
+            source_ids = {instance.get("MainDicomTags", {}).get("SOPInstanceUID"): instance.get("ID")
+                          for instance in instances}
+            instance_ids = {}
+            for instance in self.get_study_instances(modified_study_id):
+                source_id = source_ids.get(instance.get("MainDicomTags", {}).get("SOPInstanceUID"), instance.get("ID"))
+                if instance.get("ID") and source_id not in skip_instance_ids:
+                    instance_ids[instance["ID"]] = source_id
+
+            def report(copy_ids: List[str], success: bool = True, error: Optional[str] = None,
+                       skipped: bool = False):
+                if on_instance_done:
+                    for copy_id in copy_ids:
+                        on_instance_done(InstanceTransferResult(instance_ids[copy_id], success, error, skipped))
+
+            missing_ids, stale_ids = self._transfer_service.find_changed_instances(
+                list(instance_ids), self._pacs_url, self._pacs_auth, target_url, target_auth
+            )
+            report([copy_id for copy_id in instance_ids if copy_id not in missing_ids and copy_id not in stale_ids],
+                   skipped=True)
+
+            # Versiunile vechi din tinta nu sunt sterse inainte de trimitere: un job esuat le-ar pierde.
+            # Sunt inlocuite doar de un PACS tinta cu OverwriteInstances activat
+            store_ids = missing_ids + stale_ids if Settings.TARGET_OVERWRITES_INSTANCES else missing_ids
+            if store_ids:
+                self._transfer_service.store_via_peer(
+                    self._pacs_url, self._pacs_auth, Settings.TARGET_PEER_NAME, store_ids, is_cancelled
+                )
+                report(store_ids)
+
+            print(f"Study {study_id}: {len(store_ids)}/{len(instance_ids)} instances stored "
+                  f"via peer {Settings.TARGET_PEER_NAME}")
+
+            if not Settings.TARGET_OVERWRITES_INSTANCES and stale_ids:
+                error = "Instanta difera in PACS-ul tinta, care nu are OverwriteInstances activat"
+                report(stale_ids, False, error)
+                print(f"Study {study_id}: {len(stale_ids)} instances differ in the target and were not replaced")
+                return False
 
-            # Search in target PACS
-            response = self._http_client.get(f"{target_url}/studies", auth=target_auth)
-            target_studies = response.json()
+            return True
 
-            for target_study_id in target_studies:
+        finally:
+            # Copia modificata este temporara si este stearsa dupa ce joburile care o citesc s-au terminat
+            if modified_study_id != study_id:
                 try:
-                    response = self._http_client.get(f"{target_url}/studies/{target_study_id}", auth=target_auth)
-                    target_metadata = response.json()
-
-                    target_uid = target_metadata.get('MainDicomTags', {}).get('StudyInstanceUID')
-
-                    if target_uid == study_instance_uid:
-                        return target_study_id
-
+                    self._http_client.delete(f"{self._pacs_url}/studies/{modified_study_id}", auth=self._pacs_auth)
                 except Exception as e:
-                    continue
+                    print(f"Warning: Could not delete temporary study {modified_study_id}: {e}")
 
+    def _build_study_modification(self, study_id: str, examination_result: str = None,
+                                  anonymize: bool = False) -> Optional[Dict[str, Any]]:
+        if not anonymize and not examination_result:
             return None
 
-        except Exception as e:
-            return None
+        modification = {"Replace": {}, "Remove": []}
+
+        if anonymize:
+            data = self._fetch_study_data(study_id)
+            tags = {**data.get('PatientMainDicomTags', {}), **data.get('MainDicomTags', {})}
+            modification = self._anonymizer.build_orthanc_modification(tags)
+
+        if examination_result:
+            transform = ExaminationResultTransform(examination_result)
+            modification["Replace"].update(transform.orthanc_replacements())
+            modification["PrivateCreator"] = ExaminationResultTransform.PRIVATE_CREATOR
+
+        # UID-urile raman aceleasi, ca studiul sa poata fi actualizat in PACS-ul tinta
+        modification["Keep"] = ["StudyInstanceUID", "SeriesInstanceUID", "SOPInstanceUID"]
+        modification["Force"] = True
+        return modification
+
+    def _modifies_patient_id(self, study_id: str, modification: Dict[str, Any]) -> bool:
+        patient_id = self._fetch_study_data(study_id).get('PatientMainDicomTags', {}).get('PatientID', '')
+        return modification["Replace"].get("PatientID", patient_id) != patient_id
+
+    def _modify_study(self, study_id: str, modification: Dict[str, Any],
+                      is_cancelled: Optional[Callable[[], bool]] = None) -> str:
+        response = self._http_client.post(
+            f"{self._pacs_url}/studies/{study_id}/modify",
+            data=json.dumps({**modification, "Asynchronous": True}),
+            auth=self._pacs_auth,
+            headers={"Content-Type": "application/json"}
+        )
+        job = self._transfer_service.wait_for_job(response.json()["ID"], self._pacs_url, self._pacs_auth, is_cancelled)
+        modified_study_id = job.get("Content", {}).get("ID")
+        if not modified_study_id:
+            raise PacsDataError(f"Modification job for study {study_id} did not report the new study")
+        return modified_study_id
 
-    def _create_new_study(self, study_id: str, target_url: str, target_auth: tuple, examination_result: str, anonymize: bool = False) -> bool:
+    def _find_existing_study_in_target(self, source_study_id: str, target_url: str, target_auth: tuple) -> str:
 
         try:
-            instances = self.get_study_instances(study_id)
-            success_count = 0
-            total_instances = len(instances)
-
-            for instance in instances:
-                instance_id = instance.get("ID")
-                if not instance_id:
-                    continue
-
-                try:
+            # Get Study Instance UID from source
+            source_metadata = self.get_study_metadata(source_study_id)
+            study_instance_uid = source_metadata.get("Study Instance UID")
 
-                    # Get original DICOM
-                    dicom_data = self.get_dicom_file(instance_id)
+            if not study_instance_uid or study_instance_uid == 'N/A':
+                return None
 
-                    if anonymize:
-                        dicom_data = self._anonymizer.anonymize_dicom(dicom_data)
+            # Indexed lookup in target PACS
+            return self._transfer_service.find_study_by_uid(study_instance_uid, target_url, target_auth)
 
-                    # Add examination result if provided
-                    if examination_result:
-                        modified_dicom_data = self.add_examination_result_to_dicom(
-                            dicom_data, examination_result
-                        )
-                    else:
-                        modified_dicom_data = dicom_data
+        except Exception as e:
+            return None
 
-                    # Send to target PACS
-                    response = self._http_client.post(
-                        f"{target_url}/instances",
-                        data=modified_dicom_data,
-                        auth=target_auth,
-                        headers={"Content-Type": "application/dicom"}
-                    )
+    def _upload_study(self, study_id: str, instances: List[Dict[str, Any]], target_url: str, target_auth: tuple,
+                      examination_result: str, anonymize: bool = False, skip_instance_ids: Optional[Set[str]] = None,
+                      on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                      is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
 
-                    if hasattr(response, 'text') and response.text:
-                        print(f"Response text: {response.text[:200]}...")
+        try:
+            skip_instance_ids = skip_instance_ids or set()
+            instance_ids = [instance.get("ID") for instance in instances
+                            if instance.get("ID") and instance.get("ID") not in skip_instance_ids]
+            sop_instance_uids = {
+                instance.get("ID"): instance.get("MainDicomTags", {}).get("SOPInstanceUID")
+                for instance in instances
+            }
 
-                    if response.status_code == 200:
-                        success_count += 1
+            pipeline = self._build_transform_pipeline(examination_result, anonymize)
+
+            def open_instance(instance_id: str) -> BinaryIO:
+                # Fara transformari (ex. redirectionare simpla) instanta trece direct de la sursa la tinta
+                if pipeline.is_empty():
+                    return self.open_dicom_stream(instance_id)
+                return pipeline.apply_file(self.open_dicom_file(instance_id), Settings.get_transfer_spool_size())
+
+            def fingerprint(instance_id: str) -> Optional[InstanceFingerprint]:
+                sop_instance_uid = sop_instance_uids.get(instance_id)
+                source_md5 = self._get_instance_md5(instance_id)
+                if not sop_instance_uid or not source_md5:
+                    return None
+                return InstanceFingerprint(
+                    sop_instance_uid,
+                    StudyTransferService.content_hash(source_md5, anonymize, examination_result or "")
+                )
+
+            if self._should_use_archive(study_id, instance_ids, skip_instance_ids, target_url, target_auth):
+                return self._upload_study_archive(
+                    study_id, instance_ids, pipeline, target_url, target_auth, on_instance_done, fingerprint,
+                    is_cancelled
+                )
+
+            if not instance_ids:
+                return True
 
-                except Exception as e:
-                    import traceback
-                    traceback.print_exc()
-                    continue
+            result = self._transfer_service.upload_instances(
+                study_id, instance_ids, open_instance, target_url, target_auth, on_instance_done, fingerprint,
+                is_cancelled
+            )
 
-            return success_count == total_instances
+            print(f"Study {study_id}: {result.sent_count}/{len(instance_ids)} instances sent "
+                  f"({result.skipped_count} already up to date)")
+            return result.is_complete() and result.sent_count == len(instance_ids)
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return False
 
-    def _delete_existing_study(self, target_study_id: str, target_url: str, target_auth: tuple) -> bool:
-
-        try:
-            delete_response = self._http_client.delete(f"{target_url}/studies/{target_study_id}", auth=target_auth)
-
-            if delete_response.status_code == 200:
-                return True
-            else:
-                return False
-
-        except Exception as e:
-            print(f"Error deleting existing study: {e}")
+    def _should_use_archive(self, study_id: str, instance_ids: List[str], skip_instance_ids: Set[str],
+                            target_url: str, target_auth: tuple) -> bool:
+        # Arhiva trimite totul; se foloseste doar pentru studii mari, absente din PACS-ul tinta
+        if skip_instance_ids or len(instance_ids) < Settings.ARCHIVE_TRANSFER_MIN_INSTANCES:
             return False
+        return not self._find_existing_study_in_target(study_id, target_url, target_auth)
+
+    def _upload_study_archive(self, study_id: str, instance_ids: List[str], pipeline: DicomTransformPipeline,
+                              target_url: str, target_auth: tuple,
+                              on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                              fingerprint: Optional[Callable[[str], Optional[InstanceFingerprint]]] = None,
+                              is_cancelled: Optional[Callable[[], bool]] = None) -> bool:
+        with tempfile.SpooledTemporaryFile(max_size=Settings.ARCHIVE_SPOOL_MAX_MEMORY) as archive:
+            # Orthanc construieste arhiva inainte sa trimita primul octet
+            self._http_client.download_to(f"{self._pacs_url}/studies/{study_id}/archive", archive,
+                                          auth=self._pacs_auth, read_timeout=Settings.HTTP_ARCHIVE_READ_TIMEOUT)
+            if is_cancelled and is_cancelled():
+                return False
 
-    def add_examination_result_to_dicom(self, dicom_data: bytes, examination_result: str) -> bytes:
-        try:
-            dicom_dataset = pydicom.dcmread(BytesIO(dicom_data))
-
-            # PRINCIPAL: Image Comments (0020,4000)
-            if len(examination_result) <= 10240:
-                dicom_dataset.ImageComments = examination_result
-            else:
-                # Pentru texte lungi, trunchiază și adaugă notificare
-                truncated_text = examination_result[:10200] + "\n\n[TRUNCATED - See private tags]"
-                dicom_dataset.ImageComments = truncated_text
-
-            dicom_dataset.add_new(0x77770010, 'LO', 'MEDICAL_APP_RESULT')
+            transformed = pipeline.apply_archive(archive, Settings.ARCHIVE_SPOOL_MAX_MEMORY)
+            try:
+                result = self._transfer_service.upload_archive(
+                    study_id, instance_ids, transformed, target_url, target_auth, on_instance_done, fingerprint
+                )
+            finally:
+                if transformed is not archive:
+                    transformed.close()
 
-            if len(examination_result) <= 65534:
-                dicom_dataset.add_new(0x77771001, 'LT', examination_result)
-            else:
-                chunk_size = 65000
-                chunks = [examination_result[i:i + chunk_size] for i in range(0, len(examination_result), chunk_size)]
+        print(f"Study {study_id}: {result.sent_count}/{len(instance_ids)} instances sent as archive")
+        return result.is_complete()
 
-                for i, chunk in enumerate(chunks[:10]):  # Maxim 10 chunks
-                    tag_element = 0x1001 + i  # 0x77771001, 0x77771002, etc.
-                    dicom_dataset.add_new(0x7777, tag_element, 'LT', chunk)
+    def _build_transform_pipeline(self, examination_result: str, anonymize: bool) -> DicomTransformPipeline:
+        pipeline = DicomTransformPipeline()
 
-                dicom_dataset.add_new(0x77770020, 'IS', str(len(chunks)))
+        if anonymize:
+            pipeline.add(self._anonymizer.anonymize_dataset)
 
-            try:
-                if not hasattr(dicom_dataset, 'StudyComments'):
-                    study_comment = f"EXAMINATION RESULT: {examination_result[:200]}"
-                    dicom_dataset.add_new(0x0032, 0x4000, 'LT', study_comment)
-            except:
-                pass
+        # Add examination result if provided
+        if examination_result:
+            pipeline.add(ExaminationResultTransform(examination_result))
 
-            output_buffer = BytesIO()
-            dicom_dataset.save_as(output_buffer, write_like_original=False)
+        return pipeline
 
-            final_size = len(output_buffer.getvalue())
+    def _get_instance_md5(self, instance_id: str) -> Optional[str]:
+        try:
+            response = self._http_client.get(
+                f"{self._pacs_url}/instances/{instance_id}/attachments/dicom/md5", auth=self._pacs_auth
+            )
+            return response.text.strip()
+        except Exception:
+            # Fara MD5 instanta este trimisa integral
+            return None
 
-            return output_buffer.getvalue()
+    def begin_transfer_session(self):
+        self._transfer_service.begin_session()
 
+    def add_examination_result_to_dicom(self, dicom_data: bytes, examination_result: str) -> bytes:
+        try:
+            return DicomTransformPipeline([ExaminationResultTransform(examination_result)]).apply(dicom_data)
         except Exception as e:
             print(f"Error adding examination result to DICOM: {e}")
-            import traceback
-            traceback.print_exc()
             return dicom_data
 
     def get_examination_result_from_dicom(self, instance_id: str) -> str:
-        try:
-            dicom_data = self.get_dicom_file(instance_id)
-            dicom_dataset = pydicom.dcmread(BytesIO(dicom_data))
+        # O instanta aflata deja in cache este citita de pe disc, fara cereri pentru fiecare tag
+        cached_result = self._get_examination_result_from_cache(instance_id)
+        if cached_result is not None:
+            return cached_result
 
-            if (0x7777, 0x0010) in dicom_dataset:
-
-                if (0x7777, 0x0020) in dicom_dataset:
-                    try:
-                        num_chunks = int(str(dicom_dataset[0x7777, 0x0020].value))
-
-                        result_parts = []
-                        for i in range(num_chunks):
-                            tag_element = 0x1001 + i
-                            if (0x7777, tag_element) in dicom_dataset:
-                                chunk = str(dicom_dataset[0x7777, tag_element].value)
-                                result_parts.append(chunk)
-
-                        if result_parts:
-                            complete_result = ''.join(result_parts)
-                            return complete_result
-                    except:
-                        pass
-
-                if (0x7777, 0x1001) in dicom_dataset:
-                    private_result = str(dicom_dataset[0x7777, 0x1001].value)
-                    return private_result
-
-            if hasattr(dicom_dataset, 'ImageComments'):
-                image_comments = str(dicom_dataset.ImageComments)
+        # Citim doar tag-urile necesare, fara sa descarcam fisierul DICOM (pixel data inclus)
+        try:
+            chunk_count = self._get_instance_tag(instance_id, "7777-0020")
+            if chunk_count:
+                try:
+                    result_parts = []
+                    for i in range(int(chunk_count)):
+                        chunk = self._get_instance_tag(instance_id, f"7777-{0x1001 + i:04X}")
+                        if chunk:
+                            result_parts.append(chunk)
+
+                    if result_parts:
+                        return ''.join(result_parts)
+                except ValueError:
+                    pass
+
+            private_result = self._get_instance_tag(instance_id, "7777-1001")
+            if private_result:
+                return private_result
+
+            image_comments = self._get_instance_tag(instance_id, "0020-4000")
+            if image_comments:
                 return image_comments
 
-            if (0x0032, 0x4000) in dicom_dataset:
-                study_comments = str(dicom_dataset[0x0032, 0x4000].value)
-                if "EXAMINATION RESULT:" in study_comments:
-                    result = study_comments.replace("EXAMINATION RESULT: ", "")
-                    print(f"Found StudyComments result: {len(result)} chars")
-                    return result
+            study_comments = self._get_instance_tag(instance_id, "0032-4000")
+            if study_comments and "EXAMINATION RESULT:" in study_comments:
+                return study_comments.replace("EXAMINATION RESULT: ", "")
 
             return ""
 
-        except ImportError:
+        except Exception as e:
             return ""
+
+    def _get_examination_result_from_cache(self, instance_id: str) -> Optional[str]:
+        # MD5-ul este cerut din PACS doar pentru instantele aflate deja in cache
+        if not self._instance_cache.is_enabled() or not self._instance_cache.contains(self._pacs_url, instance_id):
+            return None
+
+        try:
+            cached_file = self._instance_cache.open(self._pacs_url, instance_id, self._get_instance_md5(instance_id))
+            if cached_file is None:
+                return None
+            with cached_file:
+                dataset = pydicom.dcmread(cached_file, stop_before_pixels=True)
+        except Exception as e:
+            print(f"Warning: Could not read cached instance {instance_id}: {e}")
+            return None
+
+        # Aceeasi ordine ca la citirea prin tag-uri
+        try:
+            if (0x7777, 0x0020) in dataset:
+                result_parts = [str(dataset[0x7777, 0x1001 + i].value)
+                                for i in range(int(str(dataset[0x7777, 0x0020].value)))
+                                if (0x7777, 0x1001 + i) in dataset]
+                if result_parts:
+                    return ''.join(result_parts)
+        except ValueError:
+            pass
+
+        if (0x7777, 0x1001) in dataset:
+            return str(dataset[0x7777, 0x1001].value)
+
+        if dataset.get('ImageComments'):
+            return str(dataset.ImageComments)
+
+        study_comments = str(dataset.get('StudyComments', ''))
+        if "EXAMINATION RESULT:" in study_comments:
+            return study_comments.replace("EXAMINATION RESULT: ", "")
+
+        return ""
+
+    def get_examination_result_from_study(self, study_id: str) -> str:
+        # Rezultatul este scris in toate instantele, e suficienta prima instanta din fiecare serie
+        try:
+            response = self._http_client.get(f"{self._pacs_url}/studies/{study_id}/series", auth=self._pacs_auth)
+            for series in response.json():
+                instance_ids = series.get("Instances", [])
+                if instance_ids:
+                    result = self.get_examination_result_from_dicom(instance_ids[0])
+                    if result:
+                        return result
         except Exception as e:
-            return ""
\ No newline at end of file
+            print(f"Error getting examination result from PACS study {study_id}: {e}")
+
+        return ""
+
+    def _get_instance_tag(self, instance_id: str, tag: str) -> Optional[str]:
+        try:
+            response = self._http_client.get(
+                f"{self._pacs_url}/instances/{instance_id}/content/{tag}", auth=self._pacs_auth
+            )
+        except FileNotFoundError:
+            return None
+
+        try:
+            value = response.content.decode("utf-8")
+        except UnicodeDecodeError:
+            value = response.content.decode("latin-1")
+
+        return value.rstrip("\x00 ")
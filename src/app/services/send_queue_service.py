@@ -0,0 +1,80 @@
+from typing import List, Optional, Set
+
+from app.core.entities.transfer import QueuedStudy, QueueState, InstanceTransferResult
+from app.infrastructure.send_queue_store import SendQueueStore
+
+
+class SendQueueService:
+    # Studiile aflate in aceste stari sunt inca in queue
+    _ACTIVE_STATES = (QueueState.STAGED, QueueState.PENDING, QueueState.SENDING, QueueState.FAILED)
+
+    def __init__(self, store: SendQueueStore):
+        self._store = store
+
+    def enqueue(self, study_id: str, display_text: str, examination_result: str,
+                patient_name: str, study_date: str, description: str) -> Optional[QueuedStudy]:
+        if self.is_queued(study_id):
+            return None
+
+        queue_id = self._store.add_study(
+            study_id, display_text, examination_result, patient_name, study_date, description, QueueState.STAGED
+        )
+        return QueuedStudy(study_id, display_text, examination_result, patient_name, study_date, description,
+                           queue_id, QueueState.STAGED)
+
+    def get_queued_studies(self) -> List[QueuedStudy]:
+        return [self._to_queued_study(row) for row in self._store.get_studies(self._ACTIVE_STATES)]
+
+    def is_queued(self, study_id: str) -> bool:
+        return self._store.find_study(study_id, self._ACTIVE_STATES) is not None
+
+    def remove(self, study_id: str):
+        # Un studiu in curs de trimitere ramane in queue pana la finalizare
+        self._store.remove_studies(study_id, (QueueState.STAGED, QueueState.PENDING, QueueState.FAILED))
+
+    def clear(self):
+        self._store.remove_studies(states=(QueueState.STAGED, QueueState.PENDING, QueueState.FAILED))
+
+    def submit(self) -> int:
+        return self._store.move_state((QueueState.STAGED, QueueState.FAILED), QueueState.PENDING)
+
+    def pending_count(self) -> int:
+        return len(self._store.get_studies((QueueState.PENDING,)))
+
+    def recover_interrupted(self) -> int:
+        # Trimiterile intrerupte (inchiderea aplicatiei, crash) sunt reluate de la instantele ramase
+        return self._store.move_state((QueueState.SENDING,), QueueState.PENDING)
+
+    def claim_next(self) -> Optional[QueuedStudy]:
+        row = self._store.claim_next(QueueState.PENDING, QueueState.SENDING)
+        return self._to_queued_study(row) if row else None
+
+    def release(self, queue_id: int):
+        self._store.set_state(queue_id, QueueState.PENDING)
+
+    def mark_sent(self, queue_id: int):
+        self._store.set_state(queue_id, QueueState.SENT)
+        self._store.remove_studies(states=(QueueState.SENT,))
+
+    def mark_failed(self, queue_id: int, error: str):
+        self._store.set_state(queue_id, QueueState.FAILED, error)
+
+    def record_instance(self, queue_id: int, result: InstanceTransferResult):
+        state = QueueState.SENT if result.success else QueueState.FAILED
+        self._store.record_instance(queue_id, result.instance_id, state, result.error)
+
+    def get_sent_instance_ids(self, queue_id: int) -> Set[str]:
+        return self._store.get_instance_ids(queue_id, QueueState.SENT)
+
+    def _to_queued_study(self, row) -> QueuedStudy:
+        return QueuedStudy(
+            study_id=row["study_id"],
+            display_text=row["display_text"],
+            examination_result=row["examination_result"],
+            patient_name=row["patient_name"],
+            study_date=row["study_date"],
+            description=row["description"],
+            queue_id=row["queue_id"],
+            state=row["state"],
+            error=row["error"]
+        )
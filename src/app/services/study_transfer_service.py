@@ -0,0 +1,344 @@
+import hashlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Callable, Dict, Tuple, Optional, Any, BinaryIO
+
+from app.core.entities.transfer import InstanceTransferResult, StudyTransferResult, InstanceFingerprint
+from app.core.exceptions.pacs_exceptions import PacsConnectionError, PacsDataError
+from app.infrastructure.http_client import HttpClient
+from app.infrastructure.transfer_journal_store import TransferJournalStore
+
+
+class _HashingBody:
+    def __init__(self, source: BinaryIO):
+        self._source = source
+        self._md5 = hashlib.md5()
+
+        # requests trimite Content-Length din __len__, fara sa citeasca fisierul in memorie
+        self._length = getattr(source, "length", None)
+        if self._length is None:
+            source.seek(0, 2)
+            self._length = source.tell()
+        if source.seekable():
+            source.seek(0)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._source.read(size)
+        self._md5.update(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._md5.hexdigest()
+
+
+class StudyTransferService:
+    def __init__(self, http_client: HttpClient, journal: TransferJournalStore, max_workers: int = 4,
+                 job_poll_interval: float = 1, job_timeout: float = 3600, archive_timeout: Optional[float] = None):
+        self._http_client = http_client
+        self._journal = journal
+        self._max_workers = max(1, max_workers)
+        self._job_poll_interval = job_poll_interval
+        self._job_timeout = job_timeout
+        self._archive_timeout = archive_timeout
+
+        # (target_url, StudyInstanceUID) -> ID-ul studiului in PACS-ul tinta, valabil pe durata unei trimiteri
+        self._target_study_ids: Dict[Tuple[str, str], str] = {}
+        self._target_study_ids_lock = threading.Lock()
+
+    def begin_session(self):
+        with self._target_study_ids_lock:
+            self._target_study_ids.clear()
+
+    def find_study_by_uid(self, study_instance_uid: str, target_url: str, target_auth: tuple) -> Optional[str]:
+        key = (target_url, study_instance_uid)
+        with self._target_study_ids_lock:
+            if key in self._target_study_ids:
+                return self._target_study_ids[key]
+
+        response = self._http_client.post(
+            f"{target_url}/tools/lookup",
+            data=study_instance_uid,
+            auth=tuple(target_auth)
+        )
+        target_study_id = next(
+            (match.get("ID") for match in response.json() if match.get("Type") == "Study"),
+            None
+        )
+
+        # Retinem doar studiile gasite; un studiu absent apare dupa trimitere si trebuie cautat din nou
+        if target_study_id:
+            with self._target_study_ids_lock:
+                self._target_study_ids[key] = target_study_id
+
+        return target_study_id
+
+    def upload_instances(self, study_id: str, instance_ids: List[str], open_instance: Callable[[str], BinaryIO],
+                         target_url: str, target_auth: tuple,
+                         on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                         fingerprint: Optional[Callable[[str], Optional[InstanceFingerprint]]] = None,
+                         is_cancelled: Optional[Callable[[], bool]] = None
+                         ) -> StudyTransferResult:
+        result = StudyTransferResult(study_id)
+
+        def collect(done):
+            for future in done:
+                instance_result = future.result()
+                result.instances.append(instance_result)
+                if on_instance_done:
+                    on_instance_done(instance_result)
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            pending = set()
+
+            for instance_id in instance_ids:
+                # La oprire nu mai pornim instante noi; cele aflate in upload se termina
+                if is_cancelled and is_cancelled():
+                    break
+
+                # Nu punem in coada mai mult decat pot procesa workerii, ca sa nu tinem instantele in memorie
+                if len(pending) >= self._max_workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+
+                pending.add(executor.submit(
+                    self._upload_instance, instance_id, open_instance, target_url, target_auth, fingerprint
+                ))
+
+            done, _ = wait(pending)
+            collect(done)
+
+        return result
+
+    def upload_archive(self, study_id: str, instance_ids: List[str], archive: BinaryIO,
+                       target_url: str, target_auth: tuple,
+                       on_instance_done: Optional[Callable[[InstanceTransferResult], None]] = None,
+                       fingerprint: Optional[Callable[[str], Optional[InstanceFingerprint]]] = None
+                       ) -> StudyTransferResult:
+        # Orthanc accepta o arhiva ZIP la POST /instances si raspunde cu statusul fiecarei instante,
+        # abia dupa ce a stocat toata arhiva
+        error = None
+        try:
+            response = self._http_client.post(
+                f"{target_url}/instances",
+                data=archive,
+                auth=tuple(target_auth),
+                headers={"Content-Type": "application/zip"},
+                read_timeout=self._archive_timeout
+            )
+            stored = response.json()
+            if isinstance(stored, dict):
+                stored = [stored]
+
+            stored = [item for item in stored if item.get("Status") in ("Success", "AlreadyStored")]
+            success = len(stored) >= len(instance_ids)
+            if not success:
+                error = f"Doar {len(stored)}/{len(instance_ids)} instante au fost stocate din arhiva"
+
+            if fingerprint:
+                self._record_archive_instances(instance_ids, stored, target_url, target_auth, fingerprint)
+
+        except Exception as e:
+            print(f"Failed to send archive for study {study_id}: {e}")
+            success = False
+            error = str(e)
+
+        # Arhiva este trimisa intr-o singura cerere, deci rezultatul este acelasi pentru toate instantele
+        result = StudyTransferResult(study_id)
+        for instance_id in instance_ids:
+            instance_result = InstanceTransferResult(instance_id, success, error)
+            result.instances.append(instance_result)
+            if on_instance_done:
+                on_instance_done(instance_result)
+
+        return result
+
+    def _record_archive_instances(self, instance_ids: List[str], stored: List[Dict[str, Any]],
+                                  target_url: str, target_auth: tuple,
+                                  fingerprint: Callable[[str], Optional[InstanceFingerprint]]):
+        try:
+            # Raspunsul la arhiva contine doar ID-urile din tinta; SOPInstanceUID-ul lor vine din lista instantelor
+            stored_ids = {item.get("ID") for item in stored}
+            target_ids = {}
+            for target_study_id in {item.get("ParentStudy") for item in stored if item.get("ParentStudy")}:
+                response = self._http_client.get(
+                    f"{target_url}/studies/{target_study_id}/instances", auth=tuple(target_auth)
+                )
+                for instance in response.json():
+                    if instance.get("ID") in stored_ids:
+                        target_ids[instance.get("MainDicomTags", {}).get("SOPInstanceUID")] = instance["ID"]
+        except Exception as e:
+            print(f"Warning: Could not record archive transfer in journal: {e}")
+            return
+
+        def record(instance_id: str):
+            instance_fingerprint = fingerprint(instance_id)
+            if not instance_fingerprint:
+                return
+            target_instance_id = target_ids.get(instance_fingerprint.sop_instance_uid)
+            target_md5 = self.get_instance_md5(target_instance_id, target_url, target_auth)
+            if target_md5:
+                self._journal.record(
+                    target_url,
+                    instance_fingerprint.sop_instance_uid,
+                    instance_fingerprint.content_hash,
+                    target_instance_id,
+                    target_md5
+                )
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            list(executor.map(record, instance_ids))
+
+    def find_changed_instances(self, instance_ids: List[str], source_url: str, source_auth: tuple,
+                               target_url: str, target_auth: tuple) -> Tuple[List[str], List[str]]:
+        # (instante absente din tinta, instante cu alt continut in tinta)
+        # Orthanc calculeaza ID-urile din UID-uri + PatientID, deci aceeasi instanta are acelasi ID in ambele PACS-uri
+        def get_state(instance_id: str) -> str:
+            target_md5 = self.get_instance_md5(instance_id, target_url, target_auth)
+            if target_md5 is None:
+                return "missing"
+            if target_md5 == self.get_instance_md5(instance_id, source_url, source_auth):
+                return "unchanged"
+            return "stale"
+
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            states = list(executor.map(get_state, instance_ids))
+
+        missing_ids = [instance_id for instance_id, state in zip(instance_ids, states) if state == "missing"]
+        stale_ids = [instance_id for instance_id, state in zip(instance_ids, states) if state == "stale"]
+        return missing_ids, stale_ids
+
+    def store_via_peer(self, source_url: str, source_auth: tuple, peer_name: str, resource_ids: List[str],
+                       is_cancelled: Optional[Callable[[], bool]] = None):
+        # Transferul se face direct intre PACS-uri, fara sa treaca prin statia de lucru
+        response = self._http_client.post(
+            f"{source_url}/peers/{peer_name}/store",
+            data=json.dumps({"Resources": resource_ids, "Asynchronous": True}),
+            auth=tuple(source_auth),
+            headers={"Content-Type": "application/json"}
+        )
+        self.wait_for_job(response.json()["ID"], source_url, source_auth, is_cancelled)
+
+    def wait_for_job(self, job_id: str, pacs_url: str, pacs_auth: tuple,
+                     is_cancelled: Optional[Callable[[], bool]] = None) -> Dict[str, Any]:
+        # Un job Orthanc continua si dupa ce cererea HTTP expira; asteptam starea lui finala
+        deadline = time.monotonic() + self._job_timeout
+        while True:
+            job = self._http_client.get(f"{pacs_url}/jobs/{job_id}", auth=tuple(pacs_auth)).json()
+            state = job.get("State")
+            if state == "Success":
+                return job
+            if state == "Failure":
+                raise PacsDataError(f"Job {job_id} failed: {job.get('ErrorDescription') or job.get('ErrorCode')}")
+
+            # Jobul este oprit, ca resursele folosite de el sa poata fi sterse
+            if is_cancelled and is_cancelled():
+                self._cancel_job(job_id, pacs_url, pacs_auth)
+                raise InterruptedError(f"Job {job_id} was cancelled")
+            if time.monotonic() >= deadline:
+                self._cancel_job(job_id, pacs_url, pacs_auth)
+                raise PacsConnectionError(f"Job {job_id} did not finish in {self._job_timeout} s (state: {state})")
+
+            time.sleep(self._job_poll_interval)
+
+    def _cancel_job(self, job_id: str, pacs_url: str, pacs_auth: tuple):
+        try:
+            self._http_client.post(f"{pacs_url}/jobs/{job_id}/cancel", auth=tuple(pacs_auth))
+        except Exception as e:
+            print(f"Warning: Could not cancel job {job_id}: {e}")
+
+    @staticmethod
+    def content_hash(source_digest: str, *transform_params: Any) -> str:
+        # Hash-ul descrie intrarea (fisierul sursa + transformarile aplicate), nu fisierul rezultat
+        key = "|".join([source_digest] + [str(param) for param in transform_params])
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _upload_instance(self, instance_id: str, open_instance: Callable[[str], BinaryIO],
+                         target_url: str, target_auth: tuple,
+                         fingerprint: Optional[Callable[[str], Optional[InstanceFingerprint]]] = None
+                         ) -> InstanceTransferResult:
+        try:
+            instance_fingerprint = fingerprint(instance_id) if fingerprint else None
+            if instance_fingerprint and self._is_transferred(instance_fingerprint, target_url, target_auth):
+                return InstanceTransferResult(instance_id, True, skipped=True)
+
+            with open_instance(instance_id) as dicom_file:
+                stored, dicom_md5 = self._post_instance(dicom_file, target_url, target_auth)
+
+                # Orthanc nu suprascrie o instanta existenta; daca s-a modificat continutul o inlocuim
+                if stored.get("Status") == "AlreadyStored" and \
+                        self.get_instance_md5(stored.get("ID"), target_url, target_auth) != dicom_md5:
+                    self._delete_instance(stored.get("ID"), target_url, target_auth)
+
+                    if dicom_file.seekable():
+                        stored, dicom_md5 = self._post_instance(dicom_file, target_url, target_auth)
+                    else:
+                        # Un flux relay nu poate fi recitit; il deschidem din nou de la sursa
+                        with open_instance(instance_id) as reopened_file:
+                            stored, dicom_md5 = self._post_instance(reopened_file, target_url, target_auth)
+
+            if instance_fingerprint and stored.get("ID"):
+                self._journal.record(
+                    target_url,
+                    instance_fingerprint.sop_instance_uid,
+                    instance_fingerprint.content_hash,
+                    stored["ID"],
+                    dicom_md5
+                )
+
+            return InstanceTransferResult(instance_id, True)
+
+        except Exception as e:
+            print(f"Failed to send instance {instance_id}: {e}")
+            return InstanceTransferResult(instance_id, False, str(e))
+
+    def _is_transferred(self, instance_fingerprint: InstanceFingerprint, target_url: str, target_auth: tuple) -> bool:
+        entry = self._journal.get(target_url, instance_fingerprint.sop_instance_uid)
+        if entry is None or entry["content_hash"] != instance_fingerprint.content_hash:
+            return False
+
+        # Instanta poate fi stearsa sau inlocuita in PACS-ul tinta intre doua trimiteri
+        target_md5 = self.get_instance_md5(entry["target_instance_id"], target_url, target_auth)
+        if target_md5 != entry["target_md5"]:
+            self._journal.forget(target_url, instance_fingerprint.sop_instance_uid)
+            return False
+
+        return True
+
+    def _post_instance(self, dicom_file: BinaryIO, target_url: str, target_auth: tuple) -> Tuple[Dict[str, Any], str]:
+        # Corpul cererii este citit pe bucati din fisier; MD5-ul se calculeaza pe masura ce datele sunt trimise
+        body = _HashingBody(dicom_file)
+        response = self._http_client.post(
+            f"{target_url}/instances",
+            data=body,
+            auth=tuple(target_auth),
+            headers={"Content-Type": "application/dicom"}
+        )
+        try:
+            return response.json(), body.hexdigest()
+        except ValueError:
+            return {}, body.hexdigest()
+
+    def get_instance_md5(self, instance_id: Optional[str], pacs_url: str, pacs_auth: tuple) -> Optional[str]:
+        if not instance_id:
+            return None
+
+        try:
+            response = self._http_client.get(
+                f"{pacs_url}/instances/{instance_id}/attachments/dicom/md5",
+                auth=tuple(pacs_auth)
+            )
+            return response.text.strip()
+        except Exception:
+            # Instanta lipseste sau PACS-ul nu retine MD5 pentru atasamente
+            return None
+
+    def _delete_instance(self, target_instance_id: str, target_url: str, target_auth: tuple):
+        try:
+            self._http_client.delete(f"{target_url}/instances/{target_instance_id}", auth=tuple(target_auth))
+        except FileNotFoundError:
+            pass